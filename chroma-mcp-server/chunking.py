@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Document chunking for the MCP Chroma Server.
+Splits long documents into overlapping character or token windows, preferring
+sentence boundaries, and collapses chunk-level query hits back to their parents.
+Chunks are produced lazily so a huge document never becomes a full chunk list.
+A document that fits in one chunk keeps its own ID; longer ones are stored as
+<id>#chunk-N rows that all carry the document's ID as their parent_id.
+"""
+
+import re
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+# Metadata keys written on every chunk
+PARENT_ID_KEY = "parent_id"
+CHUNK_INDEX_KEY = "chunk_index"
+CHUNK_START_KEY = "chunk_start"
+CHUNK_END_KEY = "chunk_end"
+CHUNK_KEYS = (PARENT_ID_KEY, CHUNK_INDEX_KEY, CHUNK_START_KEY, CHUNK_END_KEY)
+
+_SENTENCE_END_RE = re.compile(r"[.!?。]+[\"')\]]*(?=\s)|\n")
+_WHITESPACE_RE = re.compile(r"\s")
+_TOKEN_RE = re.compile(r"\S+")
+
+class ChunkingConfig(BaseModel):
+    """How documents are split on ingestion"""
+    size: int = 1000
+    overlap: int = 200
+    unit: str = "char"  # "char" or "token" (whitespace-delimited words)
+    sentence_aware: bool = True
+
+def _last_boundary(text: str, lo: int, hi: int, pattern: re.Pattern) -> Optional[int]:
+    """Offset just past the last pattern match in text[lo:hi], if any"""
+    last = None
+    for match in pattern.finditer(text, lo, hi):
+        last = match.end()
+    return last
+
+def _char_spans(text: str, config: ChunkingConfig) -> Iterator[Tuple[int, int]]:
+    length = len(text)
+    start = 0
+    while start < length:
+        end = min(start + config.size, length)
+        if end < length:
+            # Never cut in the first half of a window, so chunks stay close to the configured size
+            floor = start + config.size // 2
+            cut = None
+            if config.sentence_aware:
+                cut = _last_boundary(text, floor, end, _SENTENCE_END_RE)
+            if cut is None:
+                cut = _last_boundary(text, floor, end, _WHITESPACE_RE)
+            if cut is not None and cut > start:
+                end = cut
+        yield start, end
+        if end >= length:
+            return
+        next_start = max(end - config.overlap, start + 1)
+        if config.overlap and not text[next_start - 1].isspace():
+            # Start the overlap on a word boundary rather than mid-word
+            space = text.find(" ", next_start, end)
+            if space != -1:
+                next_start = space + 1
+        while next_start < length and text[next_start].isspace():
+            next_start += 1
+        start = next_start
+
+def _token_spans(text: str, config: ChunkingConfig) -> Iterator[Tuple[int, int]]:
+    window: List[Tuple[int, int]] = []
+    emitted_end = 0
+    for match in _TOKEN_RE.finditer(text):
+        window.append(match.span())
+        if len(window) < config.size:
+            continue
+        cut = len(window)
+        if config.sentence_aware:
+            for k in range(len(window) - 1, config.size // 2 - 1, -1):
+                if text[window[k][1] - 1] in ".!?。":
+                    cut = k + 1
+                    break
+        yield window[0][0], window[cut - 1][1]
+        emitted_end = window[cut - 1][1]
+        window = window[max(cut - config.overlap, 1):]
+    if window and window[-1][1] > emitted_end:
+        yield window[0][0], window[-1][1]
+
+def iter_chunks(text: str, config: ChunkingConfig) -> Iterator[Tuple[int, int, str]]:
+    """Yield (start, end, chunk_text) windows over a document"""
+    if config.size <= 0:
+        raise ValueError("Chunk size must be positive")
+    if not 0 <= config.overlap < config.size:
+        raise ValueError("Chunk overlap must be non-negative and smaller than the chunk size")
+    if config.unit == "char":
+        spans = _char_spans(text, config)
+    elif config.unit == "token":
+        spans = _token_spans(text, config)
+    else:
+        raise ValueError(f"Unknown chunk unit: {config.unit}")
+    for start, end in spans:
+        yield start, end, text[start:end]
+
+def iter_document_chunks(documents: List[str], ids: List[str],
+                         metadatas: Optional[List[Optional[Dict[str, Any]]]],
+                         config: ChunkingConfig) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """Yield (chunk_id, chunk_text, metadata) for every chunk of every document"""
+    for k, document in enumerate(documents):
+        parent_id = ids[k]
+        base = dict(metadatas[k] or {}) if metadatas else {}
+        chunks = iter_chunks(document, config)
+        first = next(chunks, None)
+        if first is None:
+            # Empty or blank documents are still stored, as a single chunk
+            first = (0, len(document), document)
+        second = next(chunks, None)
+        if second is None:
+            spans = [first]
+        else:
+            spans = chain([first, second], chunks)
+        for index, (start, end, chunk) in enumerate(spans):
+            metadata = dict(base)
+            metadata[PARENT_ID_KEY] = parent_id
+            metadata[CHUNK_INDEX_KEY] = index
+            metadata[CHUNK_START_KEY] = start
+            metadata[CHUNK_END_KEY] = end
+            yield (parent_id if second is None else f"{parent_id}#chunk-{index}"), chunk, metadata
+
+def strip_chunk_keys(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """A chunk's metadata without the keys chunking added"""
+    return {key: value for key, value in (metadata or {}).items() if key not in CHUNK_KEYS}
+
+def group_chunk_rows(ids: List[str], stored_ids: Iterable[str],
+                     chunk_rows: Iterable[Tuple[str, Optional[Dict[str, Any]]]]) -> Dict[str, List[str]]:
+    """Map each requested ID to its stored rows: the row with that ID, or else the chunks
+    whose parent it is, in chunk order. IDs with no rows are left out."""
+    requested = set(ids)
+    chunks: Dict[str, List[Tuple[int, str]]] = {}
+    for row_id, metadata in chunk_rows:
+        parent_id = (metadata or {}).get(PARENT_ID_KEY)
+        if parent_id in requested:
+            chunks.setdefault(parent_id, []).append(((metadata or {}).get(CHUNK_INDEX_KEY) or 0, row_id))
+    stored = set(stored_ids)
+    rows: Dict[str, List[str]] = {}
+    for doc_id in ids:
+        if doc_id in rows:
+            continue
+        if doc_id in stored:
+            rows[doc_id] = [doc_id]
+        elif doc_id in chunks:
+            rows[doc_id] = [row_id for _, row_id in sorted(chunks[doc_id])]
+    return rows
+
+def collapse_chunk_hits(results: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+    """Keep the best-ranked chunk per parent document (results are ordered best first)"""
+    collapsed: List[Dict[str, Any]] = []
+    by_parent: Dict[str, Dict[str, Any]] = {}
+    for item in results:
+        metadata = item.get("metadata") or {}
+        parent_id = metadata.get(PARENT_ID_KEY)
+        if parent_id is None:
+            collapsed.append(item)
+        elif parent_id in by_parent:
+            by_parent[parent_id]["matched_chunks"] += 1
+            continue
+        else:
+            item = dict(item, parent_id=parent_id, chunk_index=metadata.get(CHUNK_INDEX_KEY), matched_chunks=1)
+            by_parent[parent_id] = item
+            collapsed.append(item)
+    return collapsed[:n_results]
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+In-process BM25 inverted index for the MCP Chroma Server.
+Each collection gets its own index, maintained incrementally as documents are
+added, updated and deleted, and persisted as a snapshot plus an append-only log.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Container, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Whole identifiers, email addresses, paths and code symbols are kept as one token...
+_WORD_RE = re.compile(r"[\w@.+\-/:#]+", re.UNICODE)
+# ...and also split into their alphanumeric parts so partial matches still score
+_PART_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens: every compound word plus its alphanumeric parts"""
+    tokens: List[str] = []
+    for match in _WORD_RE.finditer(text.lower()):
+        word = match.group().strip(".:-/")
+        parts = _PART_RE.findall(word)
+        if not parts:
+            # Bare punctuation such as "@" or "--" is not a term
+            continue
+        tokens.append(word)
+        if len(parts) > 1 or parts[0] != word:
+            tokens.extend(parts)
+    return tokens
+
+# Quotes, brackets and sentence punctuation around a query are not part of the term
+_SURROUNDING_PUNCTUATION = "\"'`()[]{}<>.,;:!?"
+# Identifiers join alphanumeric parts with a separator (user@host, module.func, snake_case, a/b)...
+_JOINED_RE = re.compile(r"[^\W_][@._\-/:#+]+[^\W_]", re.UNICODE)
+# ...or are camelCase, or mix letters and digits (v2, sha256)
+_CAMEL_RE = re.compile(r"[a-z][A-Z]")
+
+def is_exact_term(query: str) -> bool:
+    """Whether a query is a single identifier-like token (email, symbol, ID)"""
+    term = query.strip().strip(_SURROUNDING_PUNCTUATION)
+    if not term or any(c.isspace() for c in term) or not any(c.isalpha() for c in term):
+        return False
+    if _JOINED_RE.search(term) or _CAMEL_RE.search(term):
+        return True
+    return term.isalnum() and any(c.isdigit() for c in term)
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists; each list contributes 1 / (k + rank) per document"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """Okapi BM25 over one collection's documents"""
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_len = 0
+    
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+    
+    def add(self, doc_id: str, text: Optional[str]):
+        """Index a document, replacing any previous version"""
+        with self.lock:
+            self.remove(doc_id)
+            terms = dict(Counter(tokenize(text or "")))
+            self._insert(doc_id, terms)
+    
+    def _insert(self, doc_id: str, terms: Dict[str, int]):
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        for term, freq in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = freq
+    
+    def remove(self, doc_id: str):
+        """Drop a document from the index (no-op if absent)"""
+        with self.lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            self._total_len -= self._doc_len.pop(doc_id)
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is not None:
+                    posting.pop(doc_id, None)
+                    if not posting:
+                        del self._postings[term]
+    
+    def has_term(self, term: str) -> bool:
+        return term.lower() in self._postings
+    
+    def terms(self, doc_id: str) -> Dict[str, int]:
+        """Term frequencies of an indexed document"""
+        return self._doc_terms.get(doc_id, {})
+    
+    def search(self, query: str, limit: int = 10,
+               allowed: Optional[Container[str]] = None) -> List[Tuple[str, float]]:
+        """Top documents by BM25 score for a free-text query, among allowed IDs if given"""
+        with self.lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1.0 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, freq in posting.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = freq + self.k1 * (1.0 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1.0) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            return dict(self._doc_terms)
+    
+    @classmethod
+    def from_dict(cls, doc_terms: Dict[str, Dict[str, int]]) -> "BM25Index":
+        index = cls()
+        for doc_id, terms in doc_terms.items():
+            index._insert(doc_id, terms)
+        return index
+
+class LexicalIndexStore:
+    """Loads, maintains and persists one BM25 index per collection (keyed by collection ID)"""
+    
+    def __init__(self, directory: str, compact_after: int = 10000):
+        self.directory = directory
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, BM25Index] = {}
+        self._log_ops: Dict[str, int] = {}
+        # Collections whose index was loaded from disk but not yet checked against Chroma
+        self._unchecked: Set[str] = set()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _snapshot_path(self, collection_id: str) -> str:
+        return os.path.join(self.directory, f"{collection_id}.json")
+    
+    def _log_path(self, collection_id: str) -> str:
+        return os.path.join(self.directory, f"{collection_id}.log")
+    
+    def get(self, collection_id: str, count: Optional[Callable[[], int]] = None) -> Optional[BM25Index]:
+        """Return the collection's index, loading it from disk if needed (None if it must be rebuilt)"""
+        with self._lock:
+            index = self._indexes.get(collection_id)
+            if index is None:
+                if not os.path.exists(self._snapshot_path(collection_id)):
+                    return None
+                index = self._load(collection_id)
+                self._indexes[collection_id] = index
+                self._unchecked.add(collection_id)
+            if count is None or collection_id not in self._unchecked:
+                return index
+            # Adding to Chroma and appending to the log are not atomic: a crash between them leaves
+            # the index short of (or ahead of) the collection, so check it once against count().
+            # Only once: later this process's own writes race with count(). Writes made by other
+            # processes while the index is loaded are therefore not noticed.
+            self._unchecked.discard(collection_id)
+            expected = count()
+            if len(index) != expected:
+                logger.warning(f"Lexical index for collection {collection_id} has {len(index)} documents "
+                               f"but the collection has {expected}; rebuilding it")
+                del self._indexes[collection_id]
+                return None
+            return index
+    
+    def build(self, collection_id: str, documents: Iterable[Tuple[str, Optional[str]]]) -> BM25Index:
+        """Build an index from (id, document) pairs and persist it"""
+        index = BM25Index()
+        for doc_id, text in documents:
+            index.add(doc_id, text)
+        with self._lock:
+            self._indexes[collection_id] = index
+            self._compact(collection_id, index)
+        logger.info(f"Built lexical index for collection {collection_id} with {len(index)} documents")
+        return index
+    
+    def upsert(self, collection_id: str, ids: List[str], documents: List[Optional[str]]):
+        """Index new or changed documents, if the collection has an index"""
+        index = self.get(collection_id)
+        if index is None:
+            return
+        with index.lock:
+            for doc_id, text in zip(ids, documents):
+                index.add(doc_id, text)
+            self._append(collection_id, index, [
+                {"op": "add", "id": doc_id, "terms": index.terms(doc_id)} for doc_id in ids
+            ])
+    
+    def remove(self, collection_id: str, ids: List[str]):
+        """Drop documents from the collection's index, if it has one"""
+        index = self.get(collection_id)
+        if index is None:
+            return
+        with index.lock:
+            for doc_id in ids:
+                index.remove(doc_id)
+            self._append(collection_id, index, [{"op": "remove", "id": doc_id} for doc_id in ids])
+    
+    def rename(self, old_id: str, new_id: str):
+        """Carry a collection's index over to its new ID (after a rebuild)"""
+        with self._lock:
+            index = self._indexes.pop(old_id, None)
+            if index is not None:
+                self._indexes[new_id] = index
+            self._log_ops[new_id] = self._log_ops.pop(old_id, 0)
+            if old_id in self._unchecked:
+                self._unchecked.discard(old_id)
+                self._unchecked.add(new_id)
+            for old_path, new_path in ((self._snapshot_path(old_id), self._snapshot_path(new_id)),
+                                       (self._log_path(old_id), self._log_path(new_id))):
+                if os.path.exists(old_path):
+                    os.replace(old_path, new_path)
+    
+    def drop(self, collection_id: str):
+        """Forget a deleted collection's index and its files"""
+        with self._lock:
+            self._indexes.pop(collection_id, None)
+            self._log_ops.pop(collection_id, None)
+            self._unchecked.discard(collection_id)
+            for path in (self._snapshot_path(collection_id), self._log_path(collection_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def _load(self, collection_id: str) -> BM25Index:
+        with open(self._snapshot_path(collection_id)) as f:
+            index = BM25Index.from_dict(json.load(f))
+        ops = 0
+        log_path = self._log_path(collection_id)
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final write; everything before it is intact
+                        logger.warning(f"Ignoring truncated lexical index log entry for {collection_id}")
+                        break
+                    index.remove(entry["id"])
+                    if entry["op"] == "add":
+                        index._insert(entry["id"], entry["terms"])
+                    ops += 1
+        self._log_ops[collection_id] = ops
+        return index
+    
+    def _append(self, collection_id: str, index: BM25Index, entries: List[dict]):
+        """Persist a mutation as log entries, compacting once the log outgrows the snapshot"""
+        with open(self._log_path(collection_id), "a") as f:
+            f.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries))
+        ops = self._log_ops.get(collection_id, 0) + len(entries)
+        self._log_ops[collection_id] = ops
+        if ops >= max(self.compact_after, len(index)):
+            self._compact(collection_id, index)
+    
+    def _compact(self, collection_id: str, index: BM25Index):
+        """Rewrite the snapshot and truncate the log"""
+        snapshot_path = self._snapshot_path(collection_id)
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp_path, snapshot_path)
+        log_path = self._log_path(collection_id)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        self._log_ops[collection_id] = 0
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Storage maintenance for the MCP Chroma Server.
+Rebuilds HNSW indexes that are mostly deleted elements, removes segment
+directories no collection references any more and vacuums chroma.sqlite3,
+reporting the bytes reclaimed and the time taken by each step. Rebuilds
+only run offline, with no server using the persist directory.
+"""
+
+import logging
+import shutil
+import sqlite3
+import struct
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SQLITE_FILE = "chroma.sqlite3"
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+# Big-endian magic numbers a SQLite WAL file starts with
+_WAL_MAGIC = (0x377F0682, 0x377F0683)
+HNSW_HEADER_FILE = "header.bin"
+# Collections are copied into "<name>.rebuild" and renamed back once the original is dropped
+REBUILD_SUFFIX = ".rebuild"
+# hnswlib header: format version, then offsetLevel0, max_elements, cur_element_count, ...
+_HNSW_HEADER = struct.Struct("<I4Q")
+
+def directory_size(path: Path) -> int:
+    """Total size of the files under a directory"""
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+def hnsw_element_count(segment_dir: Path) -> Optional[int]:
+    """Elements in a persisted HNSW index, deleted ones included (None if unreadable)"""
+    try:
+        with open(segment_dir / HNSW_HEADER_FILE, "rb") as f:
+            header = f.read(_HNSW_HEADER.size)
+        return _HNSW_HEADER.unpack(header)[3]
+    except (OSError, struct.error):
+        return None
+
+def _segments(db_path: Path) -> Dict[str, Optional[str]]:
+    """Segment ID -> collection ID for vector segments; other segments map to None"""
+    with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as db:
+        rows = db.execute("SELECT id, scope, collection FROM segments").fetchall()
+    return {segment_id: (collection_id if scope == "VECTOR" else None) for segment_id, scope, collection_id in rows}
+
+def find_orphaned_segments(persist_directory: str) -> List[Path]:
+    """UUID-named segment directories that no segment in the sysdb refers to"""
+    root = Path(persist_directory)
+    # List the directories before reading the sysdb: a segment's row is committed before its directory
+    # is created, so a collection created meanwhile is never mistaken for an orphan
+    entries = [entry for entry in root.iterdir() if entry.is_dir()]
+    known: Set[str] = set(_segments(root / SQLITE_FILE))
+    orphans = []
+    for entry in entries:
+        if entry.name in known:
+            continue
+        try:
+            uuid.UUID(entry.name)
+        except ValueError:
+            continue
+        # Only directories that look like segments, so nothing else in the directory is ever touched
+        if all(f.suffix in (".bin", ".pickle") for f in entry.iterdir()):
+            orphans.append(entry)
+    return orphans
+
+def _sqlite_file_problems(db_path: Path) -> List[str]:
+    """Problems visible in the database and WAL headers, without reading any pages"""
+    with open(db_path, "rb") as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(_SQLITE_MAGIC):
+        return [f"{SQLITE_FILE}: not a SQLite database"]
+    problems = []
+    page_size = int.from_bytes(header[16:18], "big")
+    page_size = 65536 if page_size == 1 else page_size
+    if page_size < 512 or page_size & (page_size - 1):
+        problems.append(f"{SQLITE_FILE}: invalid page size {page_size}")
+    # The page count in the header is only current when its version matches the change counter
+    pages = int.from_bytes(header[28:32], "big")
+    if pages and header[24:28] == header[92:96] and db_path.stat().st_size < pages * page_size:
+        problems.append(f"{SQLITE_FILE}: truncated, {pages} pages expected")
+    wal_path = db_path.with_name(SQLITE_FILE + "-wal")
+    if wal_path.exists() and wal_path.stat().st_size > 0:
+        with open(wal_path, "rb") as f:
+            magic = f.read(4)
+        # SQLite would silently ignore a WAL with a bad header, losing the transactions in it
+        if int.from_bytes(magic, "big") not in _WAL_MAGIC:
+            problems.append(f"{SQLITE_FILE}-wal: bad header")
+    return problems
+
+def check_integrity(persist_directory: str, thorough: bool = False) -> List[str]:
+    """Check chroma.sqlite3 and the persisted HNSW headers; returns the problems found.
+    The default check only reads file headers and is cheap enough for every open; thorough
+    also runs SQLite's quick_check, which reads the whole database."""
+    root = Path(persist_directory)
+    db_path = root / SQLITE_FILE
+    if not db_path.exists():
+        return []
+    problems = _sqlite_file_problems(db_path)
+    if problems:
+        return problems
+    if thorough:
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as db:
+            rows = [row[0] for row in db.execute("PRAGMA quick_check").fetchall()]
+        problems = [f"{SQLITE_FILE}: {row}" for row in rows if row != "ok"]
+    for segment_id, collection_id in _segments(db_path).items():
+        segment_dir = root / segment_id
+        # A segment without a header has not been flushed yet, which is normal
+        if collection_id is not None and (segment_dir / HNSW_HEADER_FILE).exists() and hnsw_element_count(segment_dir) is None:
+            problems.append(f"segment {segment_id}: unreadable {HNSW_HEADER_FILE}")
+    return problems
+
+def vacuum_sqlite(persist_directory: str) -> Dict[str, Any]:
+    """Rewrite chroma.sqlite3 without its free pages"""
+    db_path = Path(persist_directory) / SQLITE_FILE
+    before = db_path.stat().st_size
+    started = time.perf_counter()
+    with sqlite3.connect(db_path, timeout=30.0) as db:
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.execute("VACUUM")
+    after = db_path.stat().st_size
+    return {
+        "bytes_before": before,
+        "bytes_after": after,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def _copy_collection(client, source, target_name: str, batch_size: int):
+    """Copy every row (with its stored embedding) into a new collection with the same metadata and configuration"""
+    create_kwargs = {"name": target_name, "metadata": source.metadata or None}
+    # chromadb 1.x keeps HNSW parameters and the embedding function in the configuration, not the metadata
+    configuration = getattr(source, "configuration", None)
+    if configuration:
+        create_kwargs["configuration"] = configuration
+    target = client.create_collection(**create_kwargs)
+    total = source.count()
+    offset = 0
+    while offset < total:
+        page = source.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        target.add(
+            ids=page["ids"],
+            embeddings=page["embeddings"],
+            documents=page["documents"],
+            metadatas=page["metadatas"]
+        )
+        offset += len(page["ids"])
+    return target
+
+def rebuild_collection(client, name: str, batch_size: int = 1000):
+    """Rebuild a collection's HNSW index from its live rows; the collection gets a new ID"""
+    source = client.get_collection(name)
+    temporary = name + REBUILD_SUFFIX
+    target = _copy_collection(client, source, temporary, batch_size)
+    client.delete_collection(name)
+    target.modify(name=name)
+    return target
+
+def recover_interrupted_rebuilds(client) -> List[str]:
+    """Finish or discard rebuilds cut short by a crash"""
+    names = {collection.name for collection in client.list_collections()}
+    recovered = []
+    for temporary in sorted(n for n in names if n.endswith(REBUILD_SUFFIX)):
+        name = temporary[:-len(REBUILD_SUFFIX)]
+        if name in names:
+            # The copy never finished; the original is intact
+            client.delete_collection(temporary)
+            logger.warning(f"Discarded incomplete rebuild copy of '{name}'")
+        else:
+            # The original was dropped after a complete copy
+            client.get_collection(temporary).modify(name=name)
+            logger.warning(f"Completed interrupted rebuild of '{name}'")
+        recovered.append(name)
+    return recovered
+
+def maintain(client, persist_directory: str, rebuild_threshold: float = 0.2,
+             batch_size: int = 1000, dry_run: bool = False, rebuild: bool = True) -> Dict[str, Any]:
+    """Rebuild fragmented indexes, remove orphaned segments and vacuum SQLite for one persist directory.
+    Rebuilding drops writes made while a collection is copied, so it needs exclusive use of the directory;
+    with rebuild=False fragmented collections are only reported."""
+    root = Path(persist_directory)
+    started = time.perf_counter()
+    bytes_before = directory_size(root)
+    report: Dict[str, Any] = {"persist_directory": str(root), "dry_run": dry_run}
+    rebuild = rebuild and not dry_run
+    
+    report["recovered"] = recover_interrupted_rebuilds(client) if rebuild else []
+    
+    # HNSW indexes only mark deleted elements, so a collection with heavy churn keeps paying for them
+    step = time.perf_counter()
+    segments = _segments(root / SQLITE_FILE)
+    collections = {str(collection.id): collection for collection in client.list_collections()}
+    fragmented = []
+    rebuilt = []
+    for segment_id, collection_id in segments.items():
+        if collection_id is None or not (root / segment_id).is_dir():
+            continue
+        elements = hnsw_element_count(root / segment_id)
+        collection = collections.get(collection_id)
+        if not elements or collection is None:
+            continue
+        live = collection.count()
+        fragmentation = (elements - live) / elements
+        if fragmentation < rebuild_threshold or elements <= live:
+            continue
+        entry = {
+            "collection": collection.name,
+            "old_id": collection_id,
+            "hnsw_elements": elements,
+            "live_rows": live,
+            "fragmentation": round(fragmentation, 3)
+        }
+        fragmented.append(entry)
+        if rebuild:
+            rebuilt.append(dict(entry, new_id=str(rebuild_collection(client, collection.name, batch_size).id)))
+            logger.info(f"Rebuilt '{collection.name}': {elements} HNSW elements for {live} live rows")
+    report["fragmented"] = fragmented
+    report["rebuilt"] = rebuilt
+    report["rebuild_seconds"] = round(time.perf_counter() - step, 3)
+    
+    # Dropped collections (including the originals just rebuilt) leave their segment directories behind
+    step = time.perf_counter()
+    orphans = []
+    for path in find_orphaned_segments(persist_directory):
+        size = directory_size(path)
+        if not dry_run:
+            shutil.rmtree(path)
+        orphans.append({"segment": path.name, "bytes": size})
+    report["orphaned_segments"] = orphans
+    report["orphan_seconds"] = round(time.perf_counter() - step, 3)
+    
+    if not dry_run:
+        try:
+            report["vacuum"] = vacuum_sqlite(persist_directory)
+        except sqlite3.OperationalError as e:
+            # Another connection holds a write lock; the rest of the run still counts
+            report["vacuum"] = {"error": str(e)}
+    
+    bytes_after = directory_size(root)
+    report["bytes_before"] = bytes_before
+    report["bytes_after"] = bytes_after
+    report["reclaimed_bytes"] = bytes_before - bytes_after
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
@@ -9,91 +9,534 @@ import asyncio
 import json
 import logging
 import os
+import signal
 import sys
-from typing import Any, Dict, List, Optional
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
 from pydantic import BaseModel
 
+from chunking import (CHUNK_KEYS, PARENT_ID_KEY, ChunkingConfig, collapse_chunk_hits, group_chunk_rows,
+                      iter_document_chunks, strip_chunk_keys)
+from tenancy import TenantLimitError, TenantLimits, TenantRegistry, current_tenant
+from lexical_index import LexicalIndexStore, is_exact_term, reciprocal_rank_fusion, tokenize
+from maintenance import check_integrity, maintain, recover_interrupted_rebuilds
+from quantization import COMPRESSION_KEYS, CompressedCollection, CompressionConfig, ProjectionStore
+from reranker import DEFAULT_RERANK_MODEL, CrossEncoderReranker
+from serialization import get_serializer
+from sharding import SHARD_COUNT_KEY, ShardedCollection
+from single_flight import SingleFlight
+from snapshot import export_collection, import_collection, open_embedding_file, read_manifest
+from stdio_transport import StdioTransport
+from streaming import ResponseStream, batched, is_streamed, partial_message
+from worker_pool import WorkerPool, serve_worker
+from write_queue import (DURABILITY_COMMITTED, DURABILITY_MODES, DURABILITY_QUEUED, WriteCoalescer, WriteJournal,
+                         recover_journals)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Read-only methods whose identical in-flight requests can share one execution
+COALESCED_METHODS = frozenset({"query_collection", "hybrid_query", "list_collections", "get_collection_info", "get_documents"})
+
+def encode_response(serializer, response: Any) -> bytes:
+    """Serialize a response; one that cannot be encoded becomes an error, so the writer never stops"""
+    try:
+        return serializer.dumps(response)
+    except Exception as e:
+        logger.error(f"Could not serialize response: {e}")
+        return serializer.dumps({"error": f"Could not serialize response: {type(e).__name__}"})
+
+@contextmanager
+def _directory_lock(path: str):
+    """Serialize opening, recovering and maintaining a persist directory across processes (worker mode)"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(path, ".mcp-open.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 class ChromaConfig(BaseModel):
     """Configuration for Chroma Server"""
     persist_directory: str = "./chroma_db"
     host: str = "localhost"
     port: int = 8000
     collection_name: str = "default_collection"
+    json_backend: str = "auto"
+    max_flush_batch: int = 64
+    # Requests run in arrival order unless this is raised; only independent requests should be pipelined then
+    max_concurrent_requests: int = 1
+    # Write-behind queue for add_documents; a window of 0 disables coalescing
+    write_batch_window_ms: int = 0
+    write_batch_max_docs: int = 256
+    write_durability: str = "committed"
+    # Upper bound on rows per get/update/delete call against Chroma
+    batch_size: int = 1000
+    # Root directory for export_collection / import_collection paths
+    export_directory: str = "./exports"
+    # BM25 indexes for hybrid_query live next to the Chroma data
+    lexical_index_directory: str = "./lexical_index"
+    rrf_k: int = 60
+    # Split documents into overlapping windows on ingestion; a chunk size of 0 disables chunking
+    chunk_size: int = 0
+    chunk_overlap: int = 200
+    chunk_unit: str = "char"
+    chunk_sentence_aware: bool = True
+    # Queries over chunked collections fetch this many times n_results before collapsing to parents
+    chunk_overfetch: int = 3
+    # Requests carrying a "tenant" get their own persist directory under tenants_directory
+    tenants_directory: str = "./tenants"
+    tenant_max_concurrent: int = 4
+    tenant_rate_limit: float = 0.0
+    tenant_burst: int = 20
+    tenant_cache_bytes: int = 0
+    tenant_idle_seconds: float = 600.0
+    # Extra persist directories (ideally on separate disks) for sharded collections; shard 0 is persist_directory
+    shard_directories: List[str] = []
+    # PCA projections of compressed collections
+    compression_directory: str = "./compression"
+    # Cross-encoder rerank stage for query_collection
+    rerank: bool = False
+    rerank_model: str = DEFAULT_RERANK_MODEL
+    rerank_candidates: int = 50
+    rerank_batch_size: int = 32
+    # Queries that would exceed this budget return vector order instead; 0 disables the budget
+    rerank_budget_ms: int = 500
+    # maintain rebuilds an HNSW index once this fraction of its elements are deleted
+    rebuild_threshold: float = 0.2
+    # Worker processes behind the stdio front-end; 0 handles requests in this process
+    workers: int = 0
+    # Replace a worker after this many requests; 0 never recycles
+    worker_max_requests: int = 0
+    # Identical read requests in flight at the same time share one execution
+    coalesce_requests: bool = True
+    # Hits or rows per partial message of a streamed response
+    stream_batch_size: int = 100
+    # On SIGTERM, how long to wait for in-flight requests and again for queued writes
+    shutdown_timeout: float = 30.0
+    # Check chroma.sqlite3 and HNSW headers before opening a persist directory
+    startup_check: bool = True
+    # Also run SQLite's quick_check on the persist and shard directories when the server starts
+    startup_quick_check: bool = False
 
 class MCPChromaServer:
     """MCP Chroma Server implementation"""
     
-    def __init__(self, config: ChromaConfig):
+    def __init__(self, config: ChromaConfig, exclusive: bool = False):
         self.config = config
-        self.client = None
+        # Exclusive use of the persist directories (offline maintenance); servers share them
+        self.exclusive = exclusive
+        self._held_directories: List[Any] = []
+        self.default_client = None
         self.collection = None
+        self.default_write_queue: Optional[WriteCoalescer] = None
+        self.default_lexical_index: Optional[LexicalIndexStore] = None
+        self.default_projections: Optional[ProjectionStore] = None
+        self.tenants: Optional[TenantRegistry] = None
+        self.shard_clients: List[Any] = []
+        self.shard_executor: Optional[ThreadPoolExecutor] = None
+        self.worker_pool: Optional[WorkerPool] = None
+        self.single_flight = SingleFlight()
+        self.reranker = CrossEncoderReranker(config.rerank_model, config.rerank_batch_size)
+    
+    @property
+    def client(self):
+        """Chroma client of the tenant whose request is being handled"""
+        tenant = current_tenant.get()
+        return tenant.client if tenant is not None else self.default_client
+    
+    @property
+    def write_queue(self) -> Optional[WriteCoalescer]:
+        """Write-behind queue of the tenant whose request is being handled"""
+        tenant = current_tenant.get()
+        return tenant.write_queue if tenant is not None else self.default_write_queue
+    
+    @property
+    def lexical_index(self) -> Optional[LexicalIndexStore]:
+        """BM25 index store of the tenant whose request is being handled"""
+        tenant = current_tenant.get()
+        return tenant.lexical_index if tenant is not None else self.default_lexical_index
+    
+    @property
+    def projections(self) -> Optional[ProjectionStore]:
+        """Projection store of the tenant whose request is being handled"""
+        tenant = current_tenant.get()
+        return tenant.projections if tenant is not None else self.default_projections
+    
+    def _open_client(self, path: str, cache_bytes: int = 0):
+        """Open a persistent Chroma client, optionally with a bounded segment cache"""
+        os.makedirs(path, exist_ok=True)
+        settings = {"anonymized_telemetry": False, "allow_reset": True}
+        if cache_bytes > 0:
+            settings["chroma_segment_cache_policy"] = "LRU"
+            settings["chroma_memory_limit_bytes"] = cache_bytes
+        # Two workers creating the same fresh database would both run its schema migrations
+        with _directory_lock(path):
+            if self.config.startup_check:
+                problems = check_integrity(path)
+                if problems:
+                    raise RuntimeError(f"Integrity check failed for {path}: {'; '.join(problems[:5])}")
+            return chromadb.PersistentClient(path=path, settings=Settings(**settings))
+    
+    def _quick_check(self):
+        """Run SQLite's quick_check over the persist and shard directories, once per server start"""
+        for path in [self.config.persist_directory] + self.config.shard_directories:
+            problems = check_integrity(path, thorough=True)
+            if problems:
+                raise RuntimeError(f"Integrity check failed for {path}: {'; '.join(problems[:5])}")
+    
+    def _hold_directory(self, path: str):
+        """Mark a persist directory as in use by this process until close()"""
+        os.makedirs(path, exist_ok=True)
+        if fcntl is None:
+            return
+        lock_file = open(os.path.join(path, ".mcp-server.lock"), "w")
+        mode = fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+        except OSError:
+            if self.exclusive:
+                lock_file.close()
+                raise RuntimeError(f"A server is using {path}; stop it before rebuilding collections")
+            logger.info(f"Waiting for offline maintenance of {path} to finish")
+            fcntl.flock(lock_file, mode)
+        self._held_directories.append(lock_file)
+    
+    def _recover_directory(self, client, path: str, lexical_index: Optional[LexicalIndexStore] = None,
+                           projections: Optional[ProjectionStore] = None):
+        """Finish work cut short by the last shutdown: interrupted rebuilds and uncommitted queued adds"""
+        with _directory_lock(path):
+            recover_interrupted_rebuilds(client)
+            recover_journals(path, lambda *add: self._replay_add(client, *add, lexical_index=lexical_index, projections=projections))
+    
+    def _replay_add(self, client, collection_name: str, documents: List[str],
+                    metadatas: Optional[List[Dict[str, Any]]], ids: List[str],
+                    lexical_index: Optional[LexicalIndexStore] = None,
+                    projections: Optional[ProjectionStore] = None):
+        """Add the journaled documents that never reached the collection"""
+        collection = self._wrap_collection(client.get_collection(collection_name), projections)
+        existing = set(collection.get(ids=ids, include=[])["ids"])
+        missing = [k for k, doc_id in enumerate(ids) if doc_id not in existing]
+        if not missing:
+            return
+        add_kwargs = {
+            "documents": [documents[k] for k in missing],
+            "ids": [ids[k] for k in missing]
+        }
+        if metadatas and any(metadatas[k] is not None for k in missing):
+            add_kwargs["metadatas"] = [metadatas[k] for k in missing]
+        collection.add(**add_kwargs)
+        self._index_documents(collection, add_kwargs["ids"], add_kwargs["documents"], lexical_index)
+    
+    def _open_write_queue(self, client, path: str, lexical_index: Optional[LexicalIndexStore] = None,
+                          projections: Optional[ProjectionStore] = None) -> Optional[WriteCoalescer]:
+        """Create a client's write-behind queue if coalescing is enabled"""
+        if self.config.write_batch_window_ms <= 0:
+            return None
+        # Batches commit on the queue's own thread, outside any request's tenant
+        return WriteCoalescer(
+            lambda name: self._wrap_collection(client.get_collection(name), projections),
+            window_ms=self.config.write_batch_window_ms,
+            max_batch_docs=self.config.write_batch_max_docs,
+            on_commit=lambda collection, ids, documents: self._index_documents(collection, ids, documents, lexical_index),
+            journal=WriteJournal(path),
+            max_waiters=self.config.max_concurrent_requests
+        )
+    
+    def _open_tenant(self, tenant_id: str, path: str, limits: TenantLimits) -> Dict[str, Any]:
+        """Open a tenant's client and write queue, with a lexical index and projections of its own"""
+        lexical_index = LexicalIndexStore(os.path.join(self.config.lexical_index_directory, tenant_id))
+        projections = ProjectionStore(os.path.join(self.config.compression_directory, tenant_id))
+        client = self._open_client(path, limits.cache_bytes)
+        self._recover_directory(client, path, lexical_index, projections)
+        return {
+            "client": client,
+            "write_queue": self._open_write_queue(client, path, lexical_index, projections),
+            "lexical_index": lexical_index,
+            "projections": projections
+        }
+    
+    def _release_client(self, client):
+        """Close a client; chromadb 1.x then stops its System once no other client of the path holds it"""
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
     
     async def initialize_chroma(self):
         """Initialize Chroma client"""
         try:
-            # Create persist directory if it doesn't exist
-            os.makedirs(self.config.persist_directory, exist_ok=True)
-            
-            # Initialize Chroma client
-            self.client = chromadb.PersistentClient(
-                path=self.config.persist_directory,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
-            )
+            # Initialize Chroma client (creates the persist directory if it doesn't exist)
+            for directory in [self.config.persist_directory] + self.config.shard_directories:
+                self._hold_directory(directory)
+            self.default_client = self._open_client(self.config.persist_directory)
             logger.info(f"Chroma client initialized with persist directory: {self.config.persist_directory}")
+            
+            self.default_lexical_index = LexicalIndexStore(self.config.lexical_index_directory)
+            self.default_projections = ProjectionStore(self.config.compression_directory)
+            self.tenants = TenantRegistry(
+                self.config.tenants_directory,
+                self._open_tenant,
+                self._release_client,
+                TenantLimits(
+                    max_concurrent=self.config.tenant_max_concurrent,
+                    rate_per_second=self.config.tenant_rate_limit,
+                    burst=self.config.tenant_burst,
+                    cache_bytes=self.config.tenant_cache_bytes
+                ),
+                idle_seconds=self.config.tenant_idle_seconds
+            )
+            
+            self.shard_clients = [self.default_client] + [
+                self._open_client(directory) for directory in self.config.shard_directories
+            ]
+            if len(self.shard_clients) > 1:
+                self.shard_executor = ThreadPoolExecutor(
+                    max_workers=len(self.shard_clients) * 2,
+                    thread_name_prefix="chroma-shard"
+                )
+                logger.info(f"Sharding available across {len(self.shard_clients)} persist directories")
+            
+            for client, directory in zip(self.shard_clients, [self.config.persist_directory] + self.config.shard_directories):
+                self._recover_directory(client, directory)
+            
+            self.default_write_queue = self._open_write_queue(self.default_client, self.config.persist_directory)
+            if self.default_write_queue is not None:
+                logger.info(f"Coalescing adds within {self.config.write_batch_window_ms}ms windows")
         except Exception as e:
             logger.error(f"Failed to initialize Chroma client: {e}")
             raise
     
-    def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle MCP-style requests"""
+    def warm_up(self):
+        """Load the embedding model before the first request needs it"""
+        try:
+            DefaultEmbeddingFunction()(["warm up"])
+            if self.config.rerank:
+                self.reranker.load()
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {e}")
+    
+    def close(self, timeout: Optional[float] = None):
+        """Flush queued writes (waiting up to timeout for each queue) and close every client"""
+        if self.default_write_queue is not None:
+            self.default_write_queue.close(timeout)
+        if self.tenants is not None:
+            self.tenants.close_all(timeout)
+        if self.shard_executor is not None:
+            self.shard_executor.shutdown(wait=False)
+        for client in self.shard_clients:
+            try:
+                self._release_client(client)
+            except Exception as e:
+                logger.warning(f"Error closing Chroma client: {e}")
+        for lock_file in self._held_directories:
+            lock_file.close()
+        self._held_directories.clear()
+    
+    def handle_request(self, request: Dict[str, Any],
+                       emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Handle MCP-style requests; emit receives the partial messages of a streamed response"""
         try:
             method = request.get("method")
             params = request.get("params", {})
             
-            if method == "create_collection":
-                return self.create_collection_sync(params.get("name"), params.get("metadata"))
-            elif method == "add_documents":
-                return self.add_documents_sync(
-                    params.get("collection_name"),
-                    params.get("documents", []),
-                    params.get("metadatas"),
-                    params.get("ids")
-                )
-            elif method == "query_collection":
-                return self.query_collection_sync(
-                    params.get("collection_name"),
-                    params.get("query_texts", []),
-                    params.get("n_results", 10),
-                    params.get("where")
-                )
-            elif method == "list_collections":
-                return self.list_collections_sync()
-            elif method == "delete_collection":
-                return self.delete_collection_sync(params.get("collection_name"))
-            elif method == "get_collection_info":
-                return self.get_collection_info_sync(params.get("collection_name"))
-            else:
-                return {"error": f"Unknown method: {method}"}
+            # Requests without a tenant use the server's own persist directory
+            tenant_id = request.get("tenant") or params.get("tenant")
+            if not tenant_id:
+                return self._dispatch(method, params, emit)
+            
+            tenant = self.tenants.get(tenant_id)
+            with tenant.slot():
+                token = current_tenant.set(tenant)
+                try:
+                    return self._dispatch(method, params, emit)
+                finally:
+                    current_tenant.reset(token)
+        except TenantLimitError as e:
+            return {
+                "success": False,
+                "message": str(e),
+                "retry_after": e.retry_after
+            }
         except Exception as e:
             return {"error": str(e)}
     
-    def create_collection_sync(self, name: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+    def _dispatch(self, method: str, params: Dict[str, Any],
+                  emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Route a request to the matching tool"""
+        if method == "create_collection":
+            return self.create_collection_sync(
+                params.get("name"),
+                params.get("metadata"),
+                params.get("shards"),
+                params.get("compression")
+            )
+        elif method == "add_documents":
+            return self.add_documents_sync(
+                params.get("collection_name"),
+                params.get("documents", []),
+                params.get("metadatas"),
+                params.get("ids"),
+                params.get("durability"),
+                params.get("embeddings"),
+                params.get("embeddings_path"),
+                params.get("embeddings_dim"),
+                params.get("embeddings_offset", 0),
+                params.get("chunking")
+            )
+        elif method == "query_collection":
+            return self.query_collection_sync(
+                params.get("collection_name"),
+                params.get("query_texts", []),
+                params.get("n_results", 10),
+                params.get("where"),
+                params.get("collapse_chunks"),
+                params.get("rerank"),
+                params.get("rerank_candidates"),
+                emit
+            )
+        elif method == "hybrid_query":
+            return self.hybrid_query_sync(
+                params.get("collection_name"),
+                params.get("query_texts", []),
+                params.get("n_results", 10),
+                params.get("where"),
+                params.get("mode", "hybrid"),
+                params.get("collapse_chunks")
+            )
+        elif method == "list_collections":
+            return self.list_collections_sync()
+        elif method == "delete_collection":
+            return self.delete_collection_sync(params.get("collection_name"))
+        elif method == "get_collection_info":
+            return self.get_collection_info_sync(params.get("collection_name"))
+        elif method == "get_documents":
+            return self.get_documents_sync(
+                params.get("collection_name"),
+                params.get("ids"),
+                params.get("where"),
+                params.get("limit"),
+                params.get("offset"),
+                params.get("include_embeddings", False),
+                emit
+            )
+        elif method == "update_documents":
+            return self.update_documents_sync(
+                params.get("collection_name"),
+                params.get("ids"),
+                params.get("documents"),
+                params.get("metadatas"),
+                params.get("where"),
+                params.get("metadata")
+            )
+        elif method == "delete_documents":
+            return self.delete_documents_sync(
+                params.get("collection_name"),
+                params.get("ids"),
+                params.get("where")
+            )
+        elif method == "export_collection":
+            return self.export_collection_sync(
+                params.get("collection_name"),
+                params.get("path"),
+                params.get("include_embeddings", True)
+            )
+        elif method == "import_collection":
+            return self.import_collection_sync(
+                params.get("path"),
+                params.get("collection_name")
+            )
+        elif method == "maintain":
+            return self.maintain_sync(
+                params.get("rebuild_threshold"),
+                params.get("dry_run", False)
+            )
+        else:
+            return {"error": f"Unknown method: {method}"}
+    
+    def _wrap_collection(self, collection, projections: Optional[ProjectionStore] = None):
+        """Return a sharded or compressed view of the collection if its metadata asks for one"""
+        compression = CompressionConfig.from_metadata(collection.metadata)
+        if compression is not None:
+            return CompressedCollection(collection, compression, projections or self.projections)
+        shards = (collection.metadata or {}).get(SHARD_COUNT_KEY)
+        if not shards or shards <= 1:
+            return collection
+        if shards > len(self.shard_clients):
+            raise ValueError(f"Collection '{collection.name}' has {shards} shards but only {len(self.shard_clients)} shard directories are configured")
+        # chromadb 1.x records the embedding function in the configuration; older versions get the default
+        # this server creates every collection with
+        configuration = getattr(collection, "configuration", None) or {}
+        return ShardedCollection(
+            [collection] + [client.get_collection(collection.name) for client in self.shard_clients[1:shards]],
+            self.shard_executor,
+            configuration.get("embedding_function") or DefaultEmbeddingFunction()
+        )
+    
+    def _get_collection(self, collection_name: str):
+        """Look up a collection by name, resolving sharded collections"""
+        return self._wrap_collection(self.client.get_collection(collection_name))
+    
+    def _create_sharded_collection(self, name: str, metadata: Dict[str, Any], shards: int):
+        """Create a collection of the same name in each of the first `shards` shard directories"""
+        if current_tenant.get() is not None:
+            raise ValueError("Sharded collections are not available to tenants")
+        if shards > len(self.shard_clients):
+            raise ValueError(f"Requested {shards} shards but only {len(self.shard_clients)} shard directories are configured")
+        
+        metadata = dict(metadata, **{SHARD_COUNT_KEY: shards})
+        created = []
+        try:
+            for client in self.shard_clients[:shards]:
+                created.append((client, client.create_collection(name=name, metadata=metadata)))
+        except Exception:
+            # Don't leave a partial set of shards behind
+            for client, _ in created:
+                client.delete_collection(name)
+            raise
+        return self._wrap_collection(created[0][1])
+    
+    def create_collection_sync(self, name: str, metadata: Dict[str, Any] = None,
+                               shards: int = None, compression: Dict[str, Any] = None) -> Dict[str, Any]:
         """Create a new collection (synchronous)"""
         try:
             if not metadata:
                 metadata = {"created_by": "chroma_mcp_server"}
             
+            if compression:
+                if shards and shards > 1:
+                    return {"success": False, "message": "Error creating collection: a collection cannot be both sharded and compressed"}
+                compression_config = CompressionConfig(**compression)
+                compression_config.validate_settings()
+                metadata = dict(metadata, **compression_config.to_metadata())
+            
+            if shards and shards > 1:
+                collection = self._create_sharded_collection(name, metadata, shards)
+                return {
+                    "success": True,
+                    "message": f"Successfully created collection '{name}' with {shards} shards",
+                    "collection_id": str(collection.id),
+                    "count": collection.count()
+                }
+            
             collection = self.client.create_collection(
                 name=name,
                 metadata=metadata
@@ -112,10 +555,26 @@ class MCPChromaServer:
     
     def add_documents_sync(self, collection_name: str, documents: List[str], 
                           metadatas: List[Dict[str, Any]] = None, 
-                          ids: List[str] = None) -> Dict[str, Any]:
+                          ids: List[str] = None, durability: str = None,
+                          embeddings: List[List[float]] = None, embeddings_path: str = None,
+                          embeddings_dim: int = None, embeddings_offset: int = 0,
+                          chunking: Any = None) -> Dict[str, Any]:
         """Add documents to a collection (synchronous)"""
         try:
-            collection = self.client.get_collection(collection_name)
+            chunk_config = self._chunking_config(chunking)
+            if chunk_config is not None:
+                if embeddings is not None or embeddings_path:
+                    return {"success": False, "message": "Error adding documents: precomputed embeddings cannot be chunked"}
+                return self._add_chunked(collection_name, documents, metadatas, ids, chunk_config)
+            if embeddings is not None or embeddings_path:
+                return self._add_precomputed(
+                    collection_name, documents, metadatas, ids,
+                    embeddings, embeddings_path, embeddings_dim, embeddings_offset
+                )
+            if self.write_queue is not None:
+                return self._add_documents_queued(collection_name, documents, metadatas, ids, durability)
+            
+            collection = self._get_collection(collection_name)
             
             # Prepare arguments for add
             add_kwargs = {"documents": documents}
@@ -125,6 +584,7 @@ class MCPChromaServer:
                 add_kwargs["ids"] = ids
             
             result = collection.add(**add_kwargs)
+            self._index_documents(collection, ids, documents)
             return {
                 "success": True,
                 "message": f"Successfully added {len(documents)} documents to collection '{collection_name}'"
@@ -135,38 +595,371 @@ class MCPChromaServer:
                 "message": f"Error adding documents: {str(e)}"
             }
     
+    def _chunking_config(self, chunking: Any) -> Optional[ChunkingConfig]:
+        """Resolve a request's chunking option (None, bool or overrides) against the server defaults"""
+        if chunking is False or (chunking is None and self.config.chunk_size <= 0):
+            return None
+        defaults = ChunkingConfig()
+        if self.config.chunk_size > 0:
+            defaults = ChunkingConfig(
+                size=self.config.chunk_size,
+                overlap=self.config.chunk_overlap,
+                unit=self.config.chunk_unit,
+                sentence_aware=self.config.chunk_sentence_aware
+            )
+        if isinstance(chunking, dict):
+            return ChunkingConfig.model_validate({**defaults.model_dump(), **chunking})
+        return defaults
+    
+    def _add_chunked(self, collection_name: str, documents: List[str],
+                     metadatas: Optional[List[Dict[str, Any]]], ids: Optional[List[str]],
+                     chunk_config: ChunkingConfig) -> Dict[str, Any]:
+        """Split documents into chunks and add them in batches as they are produced"""
+        self._flush_pending_writes(collection_name)
+        collection = self._get_collection(collection_name)
+        if not ids:
+            ids = [str(uuid.uuid4()) for _ in documents]
+        
+        batch_size = self._batch_size()
+        batch_ids: List[str] = []
+        batch_docs: List[str] = []
+        batch_metas: List[Dict[str, Any]] = []
+        chunks = 0
+        
+        def add_batch():
+            collection.add(ids=batch_ids, documents=batch_docs, metadatas=batch_metas)
+            self._index_documents(collection, batch_ids, batch_docs)
+        
+        for chunk_id, chunk, metadata in iter_document_chunks(documents, ids, metadatas, chunk_config):
+            batch_ids.append(chunk_id)
+            batch_docs.append(chunk)
+            batch_metas.append(metadata)
+            chunks += 1
+            if len(batch_ids) >= batch_size:
+                add_batch()
+                batch_ids, batch_docs, batch_metas = [], [], []
+        if batch_ids:
+            add_batch()
+        
+        return {
+            "success": True,
+            "chunks": chunks,
+            "message": f"Successfully added {len(documents)} documents as {chunks} chunks to collection '{collection_name}'"
+        }
+    
+    def _collapse_chunks(self, collapse_chunks: Optional[bool]) -> bool:
+        """Whether query hits should be collapsed to parent documents (defaults to on when chunking is enabled)"""
+        if collapse_chunks is None:
+            return self.config.chunk_size > 0
+        return bool(collapse_chunks)
+    
+    def _add_precomputed(self, collection_name: str, documents: List[str],
+                         metadatas: Optional[List[Dict[str, Any]]], ids: Optional[List[str]],
+                         embeddings: Optional[List[List[float]]], embeddings_path: Optional[str],
+                         embeddings_dim: Optional[int], embeddings_offset: int) -> Dict[str, Any]:
+        """Add documents with caller-supplied embeddings, skipping the embedding function"""
+        if embeddings is not None and embeddings_path:
+            return {"success": False, "message": "Error adding documents: pass either embeddings or embeddings_path, not both"}
+        
+        if embeddings_path:
+            # Memory-mapped; each chunk below is a view, so only the rows being added are paged in
+            vectors = open_embedding_file(self._resolve_export_path(embeddings_path), embeddings_dim)
+        else:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if vectors.ndim != 2:
+                return {"success": False, "message": "Error adding documents: embeddings must be a list of equal-length vectors"}
+        
+        count = len(documents) if documents else len(ids or [])
+        if not count:
+            return {"success": False, "message": "Error adding documents: documents or ids are required"}
+        if embeddings_offset < 0 or embeddings_offset + count > len(vectors):
+            return {
+                "success": False,
+                "message": f"Error adding documents: {count} rows from offset {embeddings_offset} exceed the {len(vectors)} available embeddings"
+            }
+        
+        # Bypasses the write queue; a precomputed load is already a batch
+        self._flush_pending_writes(collection_name)
+        collection = self._get_collection(collection_name)
+        if not ids:
+            ids = [str(uuid.uuid4()) for _ in range(count)]
+        
+        batch_size = self._batch_size()
+        for start in range(0, count, batch_size):
+            end = min(start + batch_size, count)
+            add_kwargs = {
+                "ids": ids[start:end],
+                "embeddings": np.ascontiguousarray(
+                    vectors[embeddings_offset + start:embeddings_offset + end], dtype=np.float32
+                )
+            }
+            if documents:
+                add_kwargs["documents"] = documents[start:end]
+            if metadatas:
+                add_kwargs["metadatas"] = metadatas[start:end]
+            collection.add(**add_kwargs)
+            self._index_documents(collection, ids[start:end], documents[start:end] if documents else None)
+        
+        return {
+            "success": True,
+            "message": f"Successfully added {count} documents with precomputed embeddings to collection '{collection_name}'"
+        }
+    
+    def _add_documents_queued(self, collection_name: str, documents: List[str],
+                              metadatas: Optional[List[Dict[str, Any]]], ids: Optional[List[str]],
+                              durability: Optional[str]) -> Dict[str, Any]:
+        """Add documents through the write-behind queue"""
+        durability = durability or self.config.write_durability
+        if durability not in DURABILITY_MODES:
+            return {
+                "success": False,
+                "message": f"Unknown durability '{durability}', expected one of {', '.join(DURABILITY_MODES)}"
+            }
+        
+        # Resolve the collection up front so a bad name is reported to this caller
+        self._get_collection(collection_name)
+        # Adds acknowledged before they are written are journaled, so a crash cannot lose them
+        future = self.write_queue.submit(
+            collection_name, documents, metadatas, ids,
+            journaled=durability == DURABILITY_QUEUED,
+            wait=durability == DURABILITY_COMMITTED
+        )
+        if durability == DURABILITY_QUEUED:
+            return {
+                "success": True,
+                "durability": durability,
+                "message": f"Queued {len(documents)} documents for collection '{collection_name}'"
+            }
+        
+        future.result()
+        return {
+            "success": True,
+            "durability": durability,
+            "message": f"Successfully added {len(documents)} documents to collection '{collection_name}'"
+        }
+    
+    def _index_documents(self, collection, ids: Optional[List[str]], documents: Optional[List[str]],
+                         lexical_index: Optional[LexicalIndexStore] = None):
+        """Keep the collection's lexical index (if it has one) in step with added or changed text"""
+        lexical_index = lexical_index or self.lexical_index
+        if lexical_index is not None and ids:
+            # Rows added without text are indexed empty, so the index keeps the collection's row count
+            lexical_index.upsert(str(collection.id), ids, documents or [None] * len(ids))
+    
+    def _unindex_documents(self, collection, ids: List[str]):
+        """Remove deleted documents from the collection's lexical index"""
+        if self.lexical_index is not None and ids:
+            self.lexical_index.remove(str(collection.id), ids)
+    
+    def _flush_pending_writes(self, collection_name: str):
+        """Make queued adds visible before reading or dropping a collection"""
+        if self.write_queue is not None and self.write_queue.pending_count(collection_name):
+            self.write_queue.flush(collection_name)
+    
     def query_collection_sync(self, collection_name: str, query_texts: List[str], 
-                             n_results: int = 10, where: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Query a collection (synchronous)"""
+                             n_results: int = 10, where: Dict[str, Any] = None,
+                             collapse_chunks: bool = None, rerank: bool = None,
+                             rerank_candidates: int = None,
+                             emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Query a collection (synchronous); with emit, hits are streamed per query in batches"""
         try:
-            collection = self.client.get_collection(collection_name)
+            started = time.perf_counter()
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            collapse = self._collapse_chunks(collapse_chunks)
+            rerank = self.config.rerank if rerank is None else rerank
+            fetch = n_results * self.config.chunk_overfetch if collapse else n_results
+            if rerank:
+                # Fetch a wider candidate pool for the cross-encoder to choose from
+                fetch = max(fetch, rerank_candidates or self.config.rerank_candidates)
             
             # Prepare query arguments
             query_kwargs = {
                 "query_texts": query_texts,
-                "n_results": n_results
+                "n_results": fetch
             }
             if where:
                 query_kwargs["where"] = where
             
+            if emit is not None:
+                return self._stream_query_results(collection, query_texts, query_kwargs, n_results, collapse, rerank, started, emit)
+            
             results = collection.query(**query_kwargs)
             
             # Format results
+            formatted_results = [
+                self._format_query_result(query, results, i, n_results, collapse, rerank, started)
+                for i, query in enumerate(query_texts)
+            ]
+            
+            return {
+                "success": True,
+                "results": formatted_results
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error querying collection: {str(e)}"
+            }
+    
+    def _format_query_result(self, query: str, results: Dict[str, Any], i: int, n_results: int,
+                             collapse: bool, rerank: bool, started: float) -> Dict[str, Any]:
+        """Hits of the i-th query, reranked and collapsed to at most n_results"""
+        query_result = {
+            "query": query,
+            "results": []
+        }
+        if i < len(results['documents']):
+            for j, doc in enumerate(results['documents'][i]):
+                distance = results['distances'][i][j] if 'distances' in results else None
+                result_item = {
+                    "document": doc,
+                    "distance": distance,
+                    "metadata": results['metadatas'][i][j] if 'metadatas' in results and i < len(results['metadatas']) and j < len(results['metadatas'][i]) else None
+                }
+                query_result["results"].append(result_item)
+        if rerank:
+            query_result["results"], query_result["reranked"] = self._rerank(
+                query, query_result["results"], started
+            )
+        if collapse:
+            query_result["results"] = collapse_chunk_hits(query_result["results"], n_results)
+        else:
+            query_result["results"] = query_result["results"][:n_results]
+        return query_result
+    
+    def _stream_query_results(self, collection, query_texts: List[str], query_kwargs: Dict[str, Any],
+                              n_results: int, collapse: bool, rerank: bool, started: float,
+                              emit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """Run the queries one at a time, emitting each query's hits in batches as soon as they are ready"""
+        chunks = 0
+        hits = 0
+        for query in query_texts:
+            results = collection.query(**dict(query_kwargs, query_texts=[query]))
+            query_result = self._format_query_result(query, results, 0, n_results, collapse, rerank, started)
+            extra = {"reranked": query_result["reranked"]} if "reranked" in query_result else {}
+            for batch in batched(query_result["results"], self.config.stream_batch_size):
+                emit(partial_message(query=query, results=batch, **extra))
+                chunks += 1
+            hits += len(query_result["results"])
+        return {
+            "success": True,
+            "streamed": True,
+            "chunks": chunks,
+            "count": hits
+        }
+    
+    def _rerank(self, query: str, items: List[Dict[str, Any]], started: float):
+        """Order hits by cross-encoder score; keeps vector order if the latency budget runs out"""
+        deadline = started + self.config.rerank_budget_ms / 1000.0 if self.config.rerank_budget_ms > 0 else None
+        scores = self.reranker.score(query, [item["document"] for item in items], deadline)
+        if scores is None:
+            logger.info(f"Skipped reranking {len(items)} candidates: latency budget of {self.config.rerank_budget_ms}ms exceeded")
+            return items, False
+        for item, score in zip(items, scores):
+            item["rerank_score"] = score
+        return sorted(items, key=lambda item: item["rerank_score"], reverse=True), True
+    
+    def _lexical_index_for(self, collection):
+        """Load the collection's BM25 index, building it from the stored documents on first use"""
+        collection_id = str(collection.id)
+        index = self.lexical_index.get(collection_id, collection.count)
+        if index is not None:
+            return index
+        
+        def stored_documents():
+            size = self._batch_size()
+            offset = 0
+            while True:
+                page = collection.get(limit=size, offset=offset, include=["documents"])
+                yield from zip(page["ids"], page["documents"] or [None] * len(page["ids"]))
+                if len(page["ids"]) < size:
+                    return
+                offset += size
+        
+        return self.lexical_index.build(collection_id, stored_documents())
+    
+    def hybrid_query_sync(self, collection_name: str, query_texts: List[str], n_results: int = 10,
+                          where: Dict[str, Any] = None, mode: str = "hybrid",
+                          collapse_chunks: bool = None) -> Dict[str, Any]:
+        """Query a collection with BM25 and vector search fused by reciprocal rank (synchronous)"""
+        try:
+            if mode not in ("hybrid", "lexical"):
+                return {"success": False, "message": f"Error querying collection: unknown mode '{mode}'"}
+            
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            index = self._lexical_index_for(collection)
+            collapse = self._collapse_chunks(collapse_chunks)
+            limit = n_results * self.config.chunk_overfetch if collapse else n_results
+            pool = max(limit * 4, 20)
+            
+            # Filter before ranking: cutting to the top BM25 hits first would drop every match of a
+            # selective filter that happens to rank below the pool
+            allowed = set(self._matching_ids(collection, where)) if where else None
+            lexical_hits = [index.search(query, pool, allowed) for query in query_texts]
+            
+            # A single identifier-like token that occurs verbatim (email, symbol, ID) is answered
+            # from the inverted index alone, without embedding the query
+            exact = []
+            for i, query in enumerate(query_texts):
+                tokens = tokenize(query)
+                exact.append(is_exact_term(query) and bool(tokens) and index.has_term(tokens[0]) and bool(lexical_hits[i]))
+            
+            vector_ids: Dict[int, List[str]] = {}
+            distances: Dict[int, Dict[str, float]] = {}
+            vector_queries = [i for i, query in enumerate(query_texts) if mode == "hybrid" and not exact[i]]
+            if vector_queries:
+                query_kwargs = {
+                    "query_texts": [query_texts[i] for i in vector_queries],
+                    "n_results": pool,
+                    "include": ["distances"]
+                }
+                if where:
+                    query_kwargs["where"] = where
+                results = collection.query(**query_kwargs)
+                for k, i in enumerate(vector_queries):
+                    vector_ids[i] = results["ids"][k]
+                    distances[i] = dict(zip(results["ids"][k], results["distances"][k]))
+            
             formatted_results = []
             for i, query in enumerate(query_texts):
+                bm25_scores = dict(lexical_hits[i])
+                fused = reciprocal_rank_fusion(
+                    [[doc_id for doc_id, _ in lexical_hits[i]], vector_ids.get(i, [])],
+                    k=self.config.rrf_k
+                )
+                
+                fused_ids = [doc_id for doc_id, _ in fused]
+                rows = {}
+                if fused_ids:
+                    get_kwargs = {"ids": fused_ids, "include": ["documents", "metadatas"]}
+                    if where:
+                        get_kwargs["where"] = where
+                    page = collection.get(**get_kwargs)
+                    for k, doc_id in enumerate(page["ids"]):
+                        rows[doc_id] = (page["documents"][k], page["metadatas"][k])
+                
                 query_result = {
                     "query": query,
+                    "exact_match": exact[i],
                     "results": []
                 }
-                if i < len(results['documents']):
-                    for j, doc in enumerate(results['documents'][i]):
-                        distance = results['distances'][i][j] if 'distances' in results else None
-                        result_item = {
-                            "document": doc,
-                            "distance": distance,
-                            "metadata": results['metadatas'][i][j] if 'metadatas' in results and i < len(results['metadatas']) and j < len(results['metadatas'][i]) else None
-                        }
-                        query_result["results"].append(result_item)
+                for doc_id, score in fused:
+                    if doc_id not in rows:
+                        continue
+                    query_result["results"].append({
+                        "id": doc_id,
+                        "document": rows[doc_id][0],
+                        "metadata": rows[doc_id][1],
+                        "score": score,
+                        "bm25_score": bm25_scores.get(doc_id),
+                        "distance": distances.get(i, {}).get(doc_id)
+                    })
+                    if len(query_result["results"]) >= limit:
+                        break
+                if collapse:
+                    query_result["results"] = collapse_chunk_hits(query_result["results"], n_results)
                 formatted_results.append(query_result)
             
             return {
@@ -186,7 +979,7 @@ class MCPChromaServer:
             collection_info = []
             for collection in collections:
                 try:
-                    count = collection.count()
+                    count = self._wrap_collection(collection).count()
                     collection_info.append({
                         "name": collection.name,
                         "id": str(collection.id),
@@ -214,7 +1007,17 @@ class MCPChromaServer:
     def delete_collection_sync(self, collection_name: str) -> Dict[str, Any]:
         """Delete a collection (synchronous)"""
         try:
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            collection_id = str(collection.id)
             self.client.delete_collection(collection_name)
+            if isinstance(collection, ShardedCollection):
+                for client in self.shard_clients[1:len(collection.shards)]:
+                    client.delete_collection(collection_name)
+            if self.lexical_index is not None:
+                self.lexical_index.drop(collection_id)
+            if isinstance(collection, CompressedCollection):
+                self.projections.drop(collection_id)
             return {
                 "success": True,
                 "message": f"Successfully deleted collection '{collection_name}'"
@@ -228,7 +1031,8 @@ class MCPChromaServer:
     def get_collection_info_sync(self, collection_name: str) -> Dict[str, Any]:
         """Get collection information (synchronous)"""
         try:
-            collection = self.client.get_collection(collection_name)
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
             count = collection.count()
             metadata = collection.metadata or {}
             
@@ -247,33 +1051,662 @@ class MCPChromaServer:
                 "message": f"Error getting collection info: {str(e)}"
             }
     
+    def _batch_size(self) -> int:
+        """Rows per Chroma call, capped by the client's own maximum batch size"""
+        try:
+            return min(self.config.batch_size, self.client.get_max_batch_size())
+        except Exception:
+            return self.config.batch_size
+    
+    def _batches(self, items: List[Any]):
+        """Yield consecutive slices of at most _batch_size() items"""
+        size = self._batch_size()
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
+    
+    def _matching_ids(self, collection, where: Dict[str, Any]) -> List[str]:
+        """Collect the IDs of every row matching a where filter, one page at a time"""
+        ids: List[str] = []
+        size = self._batch_size()
+        offset = 0
+        while True:
+            page = collection.get(where=where, limit=size, offset=offset, include=[])
+            ids.extend(page["ids"])
+            if len(page["ids"]) < size:
+                return ids
+            offset += size
+    
+    def _chunk_rows(self, collection, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+        """Stored rows of each requested ID, resolving the ID of a chunked document to its chunks"""
+        stored = collection.get(ids=ids, where=where, include=[])["ids"]
+        chunk_ids, chunk_metas = [], []
+        if len(set(stored)) < len(set(ids)):
+            parent_filter = {PARENT_ID_KEY: {"$in": ids}}
+            chunks = collection.get(where={"$and": [parent_filter, where]} if where else parent_filter, include=["metadatas"])
+            chunk_ids, chunk_metas = chunks["ids"], chunks["metadatas"] or []
+        return group_chunk_rows(ids, stored, zip(chunk_ids, chunk_metas))
+    
+    def _get_by_ids(self, collection, ids: List[str], where: Optional[Dict[str, Any]],
+                    include: List[str]) -> List[Dict[str, Any]]:
+        """Rows of the requested documents in request order, with a chunked document's chunks in chunk order"""
+        rows = [row_id for doc_rows in self._chunk_rows(collection, ids, where).values() for row_id in doc_rows]
+        if not rows:
+            return []
+        items = {item["id"]: item for item in self._document_items(collection.get(ids=rows, include=include), "embeddings" in include)}
+        return [items[row_id] for row_id in rows if row_id in items]
+    
+    def get_documents_sync(self, collection_name: str, ids: List[str] = None,
+                           where: Dict[str, Any] = None, limit: int = None,
+                           offset: int = None, include_embeddings: bool = False,
+                           emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Get documents by ID or metadata filter (synchronous); with emit, rows are streamed a page at a time"""
+        try:
+            if not ids and not where and limit is None:
+                return {
+                    "success": False,
+                    "message": "Error getting documents: provide ids, where or limit"
+                }
+            if ids and (limit is not None or offset is not None):
+                return {
+                    "success": False,
+                    "message": "Error getting documents: limit and offset apply to where filters, not to ids"
+                }
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            
+            include = ["documents", "metadatas"]
+            if include_embeddings:
+                include.append("embeddings")
+            
+            if emit is not None:
+                return self._stream_documents(collection, ids, where, limit, offset, include, emit)
+            
+            documents = []
+            if ids:
+                for batch in self._batches(ids):
+                    documents.extend(self._get_by_ids(collection, batch, where, include))
+            else:
+                for page in self._document_pages(collection, where, limit, offset, include, self._batch_size()):
+                    documents.extend(page)
+            
+            return {
+                "success": True,
+                "count": len(documents),
+                "documents": documents
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error getting documents: {str(e)}"
+            }
+    
+    def _document_items(self, page: Dict[str, Any], include_embeddings: bool) -> List[Dict[str, Any]]:
+        """Format the rows of a get() page"""
+        items = []
+        for k, doc_id in enumerate(page["ids"]):
+            item = {
+                "id": doc_id,
+                "document": page["documents"][k] if page.get("documents") is not None else None,
+                "metadata": page["metadatas"][k] if page.get("metadatas") is not None else None
+            }
+            if include_embeddings and page.get("embeddings") is not None:
+                item["embedding"] = page["embeddings"][k]
+            items.append(item)
+        return items
+    
+    def _document_pages(self, collection, where: Optional[Dict[str, Any]], limit: Optional[int],
+                        offset: Optional[int], include: List[str], size: int):
+        """Yield the rows matching a filter a page of at most size rows at a time, honouring limit and offset"""
+        position = offset or 0
+        count = 0
+        while limit is None or count < limit:
+            page_size = size if limit is None else min(size, limit - count)
+            documents = self._document_items(
+                collection.get(where=where, limit=page_size, offset=position, include=include),
+                "embeddings" in include
+            )
+            yield documents
+            count += len(documents)
+            position += len(documents)
+            if len(documents) < page_size:
+                return
+    
+    def _stream_documents(self, collection, ids: Optional[List[str]], where: Optional[Dict[str, Any]],
+                          limit: Optional[int], offset: Optional[int], include: List[str],
+                          emit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """Fetch and emit one page of rows at a time, so only a page is ever held in memory"""
+        size = min(self._batch_size(), self.config.stream_batch_size)
+        chunks = 0
+        count = 0
+        if ids:
+            for batch in batched(ids, size):
+                documents = self._get_by_ids(collection, batch, where, include)
+                emit(partial_message(documents=documents))
+                chunks += 1
+                count += len(documents)
+        else:
+            for documents in self._document_pages(collection, where, limit, offset, include, size):
+                if documents or chunks == 0:
+                    emit(partial_message(documents=documents))
+                    chunks += 1
+                count += len(documents)
+        return {
+            "success": True,
+            "streamed": True,
+            "chunks": chunks,
+            "count": count
+        }
+    
+    def update_documents_sync(self, collection_name: str, ids: List[str] = None,
+                              documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+                              where: Dict[str, Any] = None, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Update documents by ID, or apply one metadata patch to every row matching a filter (synchronous)"""
+        try:
+            if ids and where:
+                return {"success": False, "message": "Error updating documents: pass either ids or where, not both"}
+            if where:
+                if not metadata:
+                    return {"success": False, "message": "Error updating documents: a where update requires metadata"}
+            elif not ids or (documents is None and metadatas is None):
+                return {"success": False, "message": "Error updating documents: ids and documents or metadatas are required"}
+            if ids and documents is not None and len(documents) != len(ids):
+                return {"success": False, "message": "Error updating documents: documents must align with ids"}
+            if ids and metadatas is not None and len(metadatas) != len(ids):
+                return {"success": False, "message": "Error updating documents: metadatas must align with ids"}
+            
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            
+            if where:
+                ids = self._matching_ids(collection, where)
+                metadatas = [metadata] * len(ids)
+            
+            reembedded = 0
+            metadata_only = 0
+            unchanged = 0
+            not_found: List[str] = []
+            size = self._batch_size()
+            for start in range(0, len(ids), size):
+                batch_ids = ids[start:start + size]
+                batch_docs = documents[start:start + size] if documents is not None else None
+                batch_metas = metadatas[start:start + size] if metadatas is not None else None
+                
+                resolved = self._chunk_rows(collection, batch_ids)
+                rows = [row_id for doc_rows in resolved.values() for row_id in doc_rows]
+                existing = collection.get(ids=rows, include=["documents", "metadatas"]) if rows else {"ids": []}
+                current = {
+                    row_id: (existing["documents"][k] if existing.get("documents") is not None else None,
+                             existing["metadatas"][k] if existing.get("metadatas") is not None else None)
+                    for k, row_id in enumerate(existing["ids"])
+                }
+                
+                # Only rows whose text changed go through the embedding function
+                text_ids, text_docs, text_metas = [], [], []
+                meta_ids, meta_metas = [], []
+                for k, doc_id in enumerate(batch_ids):
+                    doc_rows = resolved.get(doc_id, [])
+                    if not doc_rows or any(row_id not in current for row_id in doc_rows):
+                        not_found.append(doc_id)
+                        continue
+                    new_doc = batch_docs[k] if batch_docs is not None else None
+                    new_meta = batch_metas[k] if batch_metas is not None else None
+                    if (current[doc_rows[0]][1] or {}).get(PARENT_ID_KEY) == doc_id:
+                        # A chunked document is re-chunked as a whole when its text changes
+                        outcome = self._update_chunked(
+                            collection, doc_id, [(row_id, *current[row_id]) for row_id in doc_rows], new_doc, new_meta
+                        )
+                        reembedded += outcome == "reembedded"
+                        metadata_only += outcome == "metadata_only"
+                        unchanged += outcome == "unchanged"
+                        continue
+                    if new_doc is not None and new_doc != current[doc_id][0]:
+                        text_ids.append(doc_id)
+                        text_docs.append(new_doc)
+                        text_metas.append(new_meta)
+                    elif new_meta is not None:
+                        meta_ids.append(doc_id)
+                        meta_metas.append(new_meta)
+                    else:
+                        unchanged += 1
+                
+                if text_ids:
+                    update_kwargs = {"ids": text_ids, "documents": text_docs}
+                    if any(m is not None for m in text_metas):
+                        update_kwargs["metadatas"] = text_metas
+                    collection.update(**update_kwargs)
+                    self._index_documents(collection, text_ids, text_docs)
+                    reembedded += len(text_ids)
+                if meta_ids:
+                    collection.update(ids=meta_ids, metadatas=meta_metas)
+                    metadata_only += len(meta_ids)
+            
+            return {
+                "success": True,
+                "message": f"Updated {reembedded + metadata_only} documents in collection '{collection_name}'",
+                "reembedded": reembedded,
+                "metadata_only": metadata_only,
+                "unchanged": unchanged,
+                "not_found": not_found
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error updating documents: {str(e)}"
+            }
+    
+    def _update_chunked(self, collection, doc_id: str, rows: List[Tuple[str, Optional[str], Optional[Dict[str, Any]]]],
+                        new_doc: Optional[str], new_meta: Optional[Dict[str, Any]]) -> str:
+        """Update a chunked document given its (row_id, document, metadata) rows; returns what changed"""
+        if new_doc is not None:
+            # Metadata patches merge into the stored metadata, as Chroma's update does for unchunked rows
+            base = dict(strip_chunk_keys(rows[0][2]), **(new_meta or {}))
+            chunks = list(iter_document_chunks([new_doc], [doc_id], [base], self._chunking_config(True)))
+            if [(chunk_id, chunk) for chunk_id, chunk, _ in chunks] != [(row_id, document) for row_id, document, _ in rows]:
+                old = {row_id: (document, metadata) for row_id, document, metadata in rows}
+                # Chunks that come out the same keep their embedding
+                kept = [chunk for chunk in chunks if chunk[0] in old and old[chunk[0]] != (chunk[1], chunk[2])]
+                added = [chunk for chunk in chunks if chunk[0] not in old]
+                stale = sorted(set(old) - {chunk_id for chunk_id, _, _ in chunks})
+                # Update and add the new chunks before deleting stale ones, so the document never disappears
+                for batch in self._batches(kept):
+                    collection.update(ids=[c[0] for c in batch], documents=[c[1] for c in batch], metadatas=[c[2] for c in batch])
+                for batch in self._batches(added):
+                    collection.add(ids=[c[0] for c in batch], documents=[c[1] for c in batch], metadatas=[c[2] for c in batch])
+                for batch in self._batches(stale):
+                    collection.delete(ids=batch)
+                    self._unindex_documents(collection, batch)
+                self._index_documents(collection, [c[0] for c in kept + added], [c[1] for c in kept + added])
+                return "reembedded"
+        if new_meta is None:
+            return "unchanged"
+        collection.update(
+            ids=[row_id for row_id, _, _ in rows],
+            metadatas=[dict(new_meta, **{key: (metadata or {})[key] for key in CHUNK_KEYS if key in (metadata or {})})
+                       for _, _, metadata in rows]
+        )
+        return "metadata_only"
+    
+    def delete_documents_sync(self, collection_name: str, ids: List[str] = None,
+                              where: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Delete documents by ID or metadata filter (synchronous)"""
+        try:
+            if not ids and not where:
+                return {"success": False, "message": "Error deleting documents: ids or where is required"}
+            
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            
+            if not ids:
+                ids = self._matching_ids(collection, where)
+                where = None
+            
+            deleted = 0
+            for batch in self._batches(ids):
+                existing = list(dict.fromkeys(
+                    row_id for doc_rows in self._chunk_rows(collection, batch, where).values() for row_id in doc_rows
+                ))
+                if existing:
+                    collection.delete(ids=existing)
+                    self._unindex_documents(collection, existing)
+                    deleted += len(existing)
+            
+            return {
+                "success": True,
+                "message": f"Deleted {deleted} documents from collection '{collection_name}'",
+                "deleted": deleted
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error deleting documents: {str(e)}"
+            }
+    
+    def _resolve_export_path(self, path: str) -> str:
+        """Resolve a snapshot path, refusing anything outside the export directory"""
+        root = Path(self.config.export_directory).resolve()
+        tenant = current_tenant.get()
+        if tenant is not None:
+            # Tenants only see their own snapshots and embedding files
+            root = root / tenant.tenant_id
+        resolved = (root / path).resolve()
+        if resolved != root and root not in resolved.parents:
+            raise ValueError(f"Path must be inside the export directory {root}")
+        return str(resolved)
+    
+    def export_collection_sync(self, collection_name: str, path: str = None,
+                               include_embeddings: bool = True) -> Dict[str, Any]:
+        """Export a collection to a snapshot directory (synchronous)"""
+        try:
+            self._flush_pending_writes(collection_name)
+            collection = self._get_collection(collection_name)
+            output_dir = self._resolve_export_path(path or collection_name)
+            os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+            
+            stats = export_collection(
+                collection,
+                output_dir,
+                page_size=self._batch_size(),
+                include_embeddings=include_embeddings
+            )
+            return {
+                "success": True,
+                "message": f"Exported {stats['count']} documents from collection '{collection_name}'",
+                **stats
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error exporting collection: {str(e)}"
+            }
+    
+    def import_collection_sync(self, path: str, collection_name: str = None) -> Dict[str, Any]:
+        """Create a collection from a snapshot directory (synchronous)"""
+        try:
+            if not path:
+                return {"success": False, "message": "Error importing collection: path is required"}
+            
+            snapshot_dir = self._resolve_export_path(path)
+            # Snapshots of sharded or compressed collections are restored into a single full-precision collection
+            metadata = dict(read_manifest(snapshot_dir).get("metadata") or {})
+            for key in (SHARD_COUNT_KEY,) + COMPRESSION_KEYS:
+                metadata.pop(key, None)
+            stats = import_collection(
+                self.client,
+                snapshot_dir,
+                collection_name=collection_name,
+                batch_size=self._batch_size(),
+                metadata=metadata
+            )
+            return {
+                "success": True,
+                "message": f"Imported {stats['count']} documents into collection '{stats['collection']}'",
+                **stats
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error importing collection: {str(e)}"
+            }
+    
+    def maintain_sync(self, rebuild_threshold: float = None, dry_run: bool = False,
+                      rebuild: bool = False) -> Dict[str, Any]:
+        """Drop orphaned segments and vacuum SQLite, rebuilding fragmented indexes only with exclusive use of the directories (synchronous)"""
+        try:
+            if rebuild and not self.exclusive:
+                # Writes landing between a rebuild's copy and its swap would be lost
+                return {
+                    "success": False,
+                    "message": "Error running maintenance: rebuilds only run offline (python mcp_chroma_server.py maintain)"
+                }
+            if self.write_queue is not None:
+                self.write_queue.flush()
+            tenant = current_tenant.get()
+            if tenant is not None:
+                targets = [(tenant.client, self.tenants.path_for(tenant.tenant_id))]
+            else:
+                targets = list(zip(self.shard_clients, [self.config.persist_directory] + self.config.shard_directories))
+            
+            reports = []
+            for client, directory in targets:
+                # Keep processes that are opening or recovering the directory out of the way
+                with _directory_lock(directory):
+                    report = maintain(
+                        client,
+                        directory,
+                        rebuild_threshold=self.config.rebuild_threshold if rebuild_threshold is None else rebuild_threshold,
+                        batch_size=self._batch_size(),
+                        dry_run=dry_run,
+                        rebuild=rebuild
+                    )
+                # Rebuilt collections have new IDs; keep their BM25 index and projection
+                for entry in report["rebuilt"]:
+                    if "new_id" in entry:
+                        self.lexical_index.rename(entry["old_id"], entry["new_id"])
+                        self.projections.rename(entry["old_id"], entry["new_id"])
+                reports.append(report)
+            
+            reclaimed = sum(report["reclaimed_bytes"] for report in reports)
+            return {
+                "success": True,
+                "message": f"Maintenance reclaimed {reclaimed} bytes",
+                "reclaimed_bytes": reclaimed,
+                "reports": reports
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error running maintenance: {str(e)}"
+            }
+    
+    def _handle_line(self, line: bytes, serializer, emit_encoded: Optional[Callable[[bytes], None]] = None) -> Dict[str, Any]:
+        """Parse and handle a single request line, passing partial messages of a streamed response to emit_encoded"""
+        try:
+            request = serializer.loads(line)
+            emit = None
+            if emit_encoded is not None and is_streamed(request):
+                emit = lambda message: emit_encoded(encode_response(serializer, message))
+            return self.handle_request(request, emit)
+        except json.JSONDecodeError as e:
+            return {"error": f"Invalid JSON: {str(e)}"}
+        except Exception as e:
+            return {"error": str(e)}
+    
+    def _route_key(self, request: Any) -> Optional[str]:
+        """Worker routing key: the tenant and collection a request touches, if any"""
+        if not isinstance(request, dict):
+            return None
+        params = request.get("params") or {}
+        tenant_id = request.get("tenant") or params.get("tenant") or ""
+        name = params.get("collection_name")
+        if name is None and request.get("method") == "create_collection":
+            name = params.get("name")
+        if name is None and request.get("method") == "import_collection" and params.get("path"):
+            # Imports without a target name restore under the snapshot's own name
+            try:
+                root = Path(self.config.export_directory) / tenant_id
+                name = read_manifest(str(root / params["path"])).get("collection")
+            except Exception:
+                name = None
+        if name is None:
+            return None
+        return f"{tenant_id}/{name}"
+    
+    def _coalesce_key(self, request: Any) -> Optional[str]:
+        """Key under which identical in-flight reads share one execution (None for anything else)"""
+        if not isinstance(request, dict) or request.get("method") not in COALESCED_METHODS:
+            return None
+        # The request id differs between callers and is not part of the result
+        return json.dumps([request.get("tenant"), request.get("method"), request.get("params")], sort_keys=True, default=str)
+    
+    def _dispatch_line(self, line: bytes, serializer, executor: ThreadPoolExecutor) -> asyncio.Future:
+        """Start handling a request line in the executor or on the worker that owns its collection"""
+        loop = asyncio.get_running_loop()
+        try:
+            request = serializer.loads(line)
+        except json.JSONDecodeError as e:
+            future = loop.create_future()
+            future.set_result({"error": f"Invalid JSON: {str(e)}"})
+            return future
+        
+        stream = ResponseStream(loop) if is_streamed(request) else None
+        emit = stream.send if stream is not None else None
+        if self.worker_pool is not None:
+            start = lambda: asyncio.wrap_future(self.worker_pool.submit(line, self._route_key(request), emit))
+        else:
+            start = lambda: loop.run_in_executor(executor, self.handle_request, request, emit)
+        if stream is not None:
+            # A stream can only be written once, so streamed reads are never coalesced
+            stream.follow(start())
+            future = loop.create_future()
+            future.set_result(stream)
+            return future
+        if not self.config.coalesce_requests:
+            return start()
+        key = self._coalesce_key(request)
+        if key is None:
+            # Reads that arrive after a write must see it, so they never join a read started before it
+            self.single_flight.reset()
+            return start()
+        return self.single_flight.submit(key, start)
+    
+    def _send(self, transport: StdioTransport, response: Any):
+        if isinstance(response, bytes):
+            # Already encoded by a worker process
+            transport.send_encoded(response)
+        else:
+            transport.send_encoded(encode_response(transport.serializer, response))
+    
+    async def _write_stream(self, stream: ResponseStream, transport: StdioTransport):
+        """Write a streamed response's messages as they arrive, flushing whenever the next one isn't ready"""
+        transport.flush()
+        try:
+            async for message in stream.messages():
+                self._send(transport, message)
+                if not stream.ready():
+                    transport.flush()
+        finally:
+            stream.close()
+    
+    async def _write_responses(self, responses: asyncio.Queue, transport: StdioTransport):
+        """Write responses in request order, flushing whenever no further response is ready"""
+        while True:
+            future = await responses.get()
+            if future is None:
+                break
+            if not future.done():
+                transport.flush()
+            try:
+                response = await future
+            except Exception as e:
+                response = {"error": str(e)}
+            if isinstance(response, ResponseStream):
+                await self._write_stream(response, transport)
+            else:
+                self._send(transport, response)
+            if responses.empty() and not transport.input_pending():
+                transport.flush()
+        transport.flush()
+    
     async def run_stdio_server(self):
         """Run the server using stdio for MCP communication"""
-        await self.initialize_chroma()
+        if self.config.startup_quick_check:
+            # Only here, not on every open: workers and tenants are opened far more often than the server starts
+            self._quick_check()
+        if self.config.workers > 0:
+            self.worker_pool = WorkerPool(
+                run_worker,
+                # Each worker runs one request at a time
+                (self.config.model_copy(update={"workers": 0, "max_concurrent_requests": 1}),),
+                workers=self.config.workers,
+                max_requests=self.config.worker_max_requests,
+                stop_timeout=self.config.shutdown_timeout
+            )
+            self.worker_pool.start()
+            logger.info(f"Dispatching requests to {self.config.workers} worker processes")
+        else:
+            await self.initialize_chroma()
         
-        # Simple stdio-based MCP server
-        while True:
+        transport = StdioTransport(
+            serializer=get_serializer(self.config.json_backend),
+            max_batch=self.config.max_flush_batch
+        )
+        logger.info(f"Using {transport.serializer.name} for response serialization")
+        
+        # Requests are handled concurrently (so queued adds can share a group commit),
+        # but responses are still written in the order the requests arrived
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.config.max_concurrent_requests)
+        # Workers each run one request at a time, so keep enough in flight that a slow one doesn't idle the rest
+        in_flight = self.config.workers * 8 if self.worker_pool is not None else self.config.max_concurrent_requests * 2
+        responses: asyncio.Queue = asyncio.Queue(maxsize=in_flight)
+        writer = asyncio.create_task(self._write_responses(responses, transport))
+        if self.worker_pool is not None and hasattr(signal, "SIGHUP"):
+            # SIGHUP replaces the workers one at a time, e.g. to pick up a new embedding model
+            loop.add_signal_handler(signal.SIGHUP, self.worker_pool.restart)
+        # SIGTERM and SIGINT stop intake; requests already read are still answered
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
             try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows, or not the main thread
+                pass
+        stopping = asyncio.ensure_future(stop.wait())
+        # A daemon thread, so a read blocked on stdin never holds up shutdown
+        lines: asyncio.Queue = asyncio.Queue(maxsize=1)
+        threading.Thread(target=self._read_requests, args=(transport, lines, loop), name="chroma-stdin", daemon=True).start()
+        
+        try:
+            while True:
                 # Read request from stdin
-                line = sys.stdin.readline()
+                next_line = asyncio.ensure_future(lines.get())
+                await asyncio.wait({next_line, stopping}, return_when=asyncio.FIRST_COMPLETED)
+                if stop.is_set():
+                    next_line.cancel()
+                    logger.info("Shutdown requested, no longer accepting requests")
+                    break
+                line = next_line.result()
                 if not line:
                     break
                 
-                request = json.loads(line.strip())
-                response = self.handle_request(request)
-                
-                # Write response to stdout
-                print(json.dumps(response))
-                sys.stdout.flush()
-                
-            except json.JSONDecodeError as e:
-                error_response = {"error": f"Invalid JSON: {str(e)}"}
-                print(json.dumps(error_response))
-                sys.stdout.flush()
-            except Exception as e:
-                error_response = {"error": str(e)}
-                print(json.dumps(error_response))
-                sys.stdout.flush()
+                await responses.put(self._dispatch_line(line, transport.serializer, executor))
+        finally:
+            stopping.cancel()
+            # On a signal, in-flight requests get shutdown_timeout to finish; at EOF they always run to completion
+            drained = await self._drain(responses, writer, self.config.shutdown_timeout if stop.is_set() else None)
+            if not drained:
+                # Handler threads are still using the clients, and executor threads would hold up exit until they
+                # finish. Exit now; queued adds are journaled and replayed on the next start.
+                transport.flush()
+                logger.warning("Exiting with requests still in flight")
+                os._exit(1)
+            executor.shutdown(wait=True)
+            if self.worker_pool is not None:
+                self.worker_pool.close()
+            self.close(self.config.shutdown_timeout)
+            logger.info("Server stopped")
+    
+    def _read_requests(self, transport: StdioTransport, lines: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        """Reader thread: pass request lines to the event loop one at a time, ending with b"" at EOF"""
+        while True:
+            line = transport.readline()
+            try:
+                asyncio.run_coroutine_threadsafe(lines.put(line), loop).result()
+            except (RuntimeError, CancelledError):
+                # The event loop has stopped
+                return
+            if not line:
+                return
+    
+    async def _drain(self, responses: asyncio.Queue, writer: asyncio.Task, timeout: Optional[float]) -> bool:
+        """Let the writer answer every request already read; False if that took longer than timeout"""
+        async def finish():
+            await responses.put(None)
+            await writer
+        
+        try:
+            await asyncio.wait_for(finish(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"In-flight requests did not finish within {timeout}s, dropping their responses")
+            writer.cancel()
+            return False
+
+def run_worker(conn, config: ChromaConfig):
+    """Worker process entry point: serve requests forwarded by the front-end"""
+    # stdout belongs to the front-end's transport
+    os.dup2(sys.stderr.fileno(), 1)
+    sys.stdout = sys.stderr
+    # The front-end drains and stops its workers; a signal sent to the whole process group must not cut them short
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    server = MCPChromaServer(config)
+    asyncio.run(server.initialize_chroma())
+    server.warm_up()
+    serializer = get_serializer(config.json_backend)
+    try:
+        serve_worker(conn, lambda line, send_partial: encode_response(serializer, server._handle_line(line, serializer, send_partial)))
+    finally:
+        server.close(config.shutdown_timeout)
 
 async def main():
     """Main entry point"""
@@ -282,9 +1715,59 @@ async def main():
         persist_directory=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"),
         host=os.getenv("CHROMA_HOST", "localhost"),
         port=int(os.getenv("CHROMA_PORT", "8000")),
-        collection_name=os.getenv("CHROMA_COLLECTION", "default_collection")
+        collection_name=os.getenv("CHROMA_COLLECTION", "default_collection"),
+        json_backend=os.getenv("CHROMA_JSON_BACKEND", "auto"),
+        max_flush_batch=int(os.getenv("CHROMA_MAX_FLUSH_BATCH", "64")),
+        max_concurrent_requests=int(os.getenv("CHROMA_MAX_CONCURRENT_REQUESTS", "1")),
+        write_batch_window_ms=int(os.getenv("CHROMA_WRITE_BATCH_WINDOW_MS", "0")),
+        write_batch_max_docs=int(os.getenv("CHROMA_WRITE_BATCH_MAX_DOCS", "256")),
+        write_durability=os.getenv("CHROMA_WRITE_DURABILITY", "committed"),
+        batch_size=int(os.getenv("CHROMA_BATCH_SIZE", "1000")),
+        export_directory=os.getenv("CHROMA_EXPORT_DIR", "./exports"),
+        lexical_index_directory=os.getenv("CHROMA_LEXICAL_INDEX_DIR", "./lexical_index"),
+        rrf_k=int(os.getenv("CHROMA_RRF_K", "60")),
+        chunk_size=int(os.getenv("CHROMA_CHUNK_SIZE", "0")),
+        chunk_overlap=int(os.getenv("CHROMA_CHUNK_OVERLAP", "200")),
+        chunk_unit=os.getenv("CHROMA_CHUNK_UNIT", "char"),
+        chunk_sentence_aware=os.getenv("CHROMA_CHUNK_SENTENCE_AWARE", "true").lower() == "true",
+        chunk_overfetch=int(os.getenv("CHROMA_CHUNK_OVERFETCH", "3")),
+        tenants_directory=os.getenv("CHROMA_TENANTS_DIR", "./tenants"),
+        tenant_max_concurrent=int(os.getenv("CHROMA_TENANT_MAX_CONCURRENT", "4")),
+        tenant_rate_limit=float(os.getenv("CHROMA_TENANT_RATE_LIMIT", "0")),
+        tenant_burst=int(os.getenv("CHROMA_TENANT_BURST", "20")),
+        tenant_cache_bytes=int(os.getenv("CHROMA_TENANT_CACHE_BYTES", "0")),
+        tenant_idle_seconds=float(os.getenv("CHROMA_TENANT_IDLE_SECONDS", "600")),
+        shard_directories=[d for d in os.getenv("CHROMA_SHARD_DIRS", "").split(",") if d],
+        compression_directory=os.getenv("CHROMA_COMPRESSION_DIR", "./compression"),
+        rerank=os.getenv("CHROMA_RERANK", "false").lower() == "true",
+        rerank_model=os.getenv("CHROMA_RERANK_MODEL", DEFAULT_RERANK_MODEL),
+        rerank_candidates=int(os.getenv("CHROMA_RERANK_CANDIDATES", "50")),
+        rerank_batch_size=int(os.getenv("CHROMA_RERANK_BATCH_SIZE", "32")),
+        rerank_budget_ms=int(os.getenv("CHROMA_RERANK_BUDGET_MS", "500")),
+        rebuild_threshold=float(os.getenv("CHROMA_REBUILD_THRESHOLD", "0.2")),
+        workers=int(os.getenv("CHROMA_WORKERS", "0")),
+        worker_max_requests=int(os.getenv("CHROMA_WORKER_MAX_REQUESTS", "0")),
+        coalesce_requests=os.getenv("CHROMA_COALESCE_REQUESTS", "true").lower() == "true",
+        stream_batch_size=int(os.getenv("CHROMA_STREAM_BATCH_SIZE", "100")),
+        shutdown_timeout=float(os.getenv("CHROMA_SHUTDOWN_TIMEOUT", "30")),
+        startup_check=os.getenv("CHROMA_STARTUP_CHECK", "true").lower() == "true",
+        startup_quick_check=os.getenv("CHROMA_STARTUP_QUICK_CHECK", "false").lower() == "true"
     )
     
+    if sys.argv[1:2] == ["maintain"]:
+        # Offline maintenance, including rebuilds: python mcp_chroma_server.py maintain [--dry-run]
+        server = MCPChromaServer(config, exclusive=True)
+        try:
+            await server.initialize_chroma()
+        except RuntimeError as e:
+            print(json.dumps({"success": False, "message": f"Error running maintenance: {str(e)}"}, indent=2))
+            sys.exit(1)
+        try:
+            result = server.maintain_sync(dry_run="--dry-run" in sys.argv[2:], rebuild=True)
+        finally:
+            server.close()
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["success"] else 1)
     server = MCPChromaServer(config)
     await server.run_stdio_server()
 
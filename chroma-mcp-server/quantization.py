@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Reduced-precision vector storage for the MCP Chroma Server.
+A compressed collection keeps PCA-reduced vectors in its HNSW index and a
+scalar-quantized copy of each full vector in the row's metadata (SQLite, on disk).
+Queries search the reduced index for a wider candidate set and rerank it
+against the full-precision vectors. A projection first fitted on fewer vectors
+than it has dimensions is refitted, and the index re-projected, once the
+collection holds enough vectors.
+"""
+
+import base64
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Collection metadata keys recording the compression settings
+PCA_DIMENSIONS_KEY = "mcp:pca_dimensions"
+RERANK_FACTOR_KEY = "mcp:rerank_factor"
+RERANK_DTYPE_KEY = "mcp:rerank_dtype"
+COMPRESSION_KEYS = (PCA_DIMENSIONS_KEY, RERANK_FACTOR_KEY, RERANK_DTYPE_KEY)
+# Row metadata key holding the encoded full-precision vector
+VECTOR_KEY = "mcp:vector"
+
+_DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "i1"}
+RERANK_DTYPES = tuple(_DTYPES)
+# Stored vectors sampled when a projection is refitted, and rows re-projected per update
+REFIT_SAMPLE = 10000
+_REFIT_BATCH = 1000
+
+class CompressionConfig(BaseModel):
+    """How a collection's vectors are reduced and stored for reranking"""
+    dimensions: int
+    # The reduced index is searched for rerank_factor * n_results candidates
+    rerank_factor: int = 4
+    # Precision of the full vectors kept for reranking. "float32" reranks at full precision;
+    # "float16" and "int8" store less per row but make the rerank lossy too
+    rerank_dtype: str = "float32"
+    
+    def validate_settings(self):
+        if self.dimensions <= 0:
+            raise ValueError("Compression dimensions must be positive")
+        if self.rerank_factor < 1:
+            raise ValueError("Compression rerank_factor must be at least 1")
+        if self.rerank_dtype not in _DTYPES:
+            raise ValueError(f"Unknown rerank_dtype '{self.rerank_dtype}', expected one of {', '.join(RERANK_DTYPES)}")
+    
+    def to_metadata(self) -> Dict[str, Any]:
+        return {
+            PCA_DIMENSIONS_KEY: self.dimensions,
+            RERANK_FACTOR_KEY: self.rerank_factor,
+            RERANK_DTYPE_KEY: self.rerank_dtype
+        }
+    
+    @classmethod
+    def from_metadata(cls, metadata: Optional[Dict[str, Any]]) -> Optional["CompressionConfig"]:
+        if not metadata or PCA_DIMENSIONS_KEY not in metadata:
+            return None
+        return cls(
+            dimensions=metadata[PCA_DIMENSIONS_KEY],
+            rerank_factor=metadata.get(RERANK_FACTOR_KEY, 4),
+            rerank_dtype=metadata.get(RERANK_DTYPE_KEY, "float32")
+        )
+
+def encode_vector(vector: np.ndarray, dtype: str) -> str:
+    """Pack a vector as base64; int8 vectors carry their own float32 scale"""
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127.0 or 1.0
+        payload = np.float32(scale).tobytes() + np.round(vector / scale).astype(np.int8).tobytes()
+    else:
+        payload = np.asarray(vector, dtype=_DTYPES[dtype]).tobytes()
+    return base64.b64encode(payload).decode("ascii")
+
+def decode_vector(value: str, dtype: str) -> np.ndarray:
+    payload = base64.b64decode(value)
+    if dtype == "int8":
+        scale = np.frombuffer(payload[:4], dtype=np.float32)[0]
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(payload, dtype=_DTYPES[dtype]).astype(np.float32)
+
+def exact_distances(vectors: np.ndarray, query: np.ndarray, space: str) -> np.ndarray:
+    """Distances as Chroma defines them for the collection's space"""
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        return 1.0 - (vectors @ query) / np.where(norms == 0, 1.0, norms)
+    if space == "ip":
+        return 1.0 - vectors @ query
+    return np.sum((vectors - query) ** 2, axis=1)
+
+class PCAProjection:
+    """Linear map from the embedding space onto its top principal components"""
+    
+    def __init__(self, mean: np.ndarray, components: np.ndarray, samples: Optional[int] = None):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        # Vectors the projection was fitted on
+        self.samples = len(components) if samples is None else samples
+    
+    @property
+    def complete(self) -> bool:
+        """Whether the fit had enough vectors to determine every component"""
+        return self.samples >= len(self.components)
+    
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimensions: int, center: bool = True) -> "PCAProjection":
+        """Fit on a sample; angular spaces are not centered so directions are preserved.
+        With fewer vectors than dimensions, the components the sample cannot determine are zero."""
+        if dimensions >= vectors.shape[1]:
+            raise ValueError(f"Compression dimensions must be below the embedding dimension {vectors.shape[1]}")
+        mean = vectors.mean(axis=0) if center else np.zeros(vectors.shape[1], dtype=np.float32)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        components = np.zeros((dimensions, vectors.shape[1]), dtype=np.float32)
+        components[:min(dimensions, len(vt))] = vt[:dimensions]
+        return cls(mean, components, samples=len(vectors))
+    
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        return (vectors - self.mean) @ self.components.T
+
+class ProjectionStore:
+    """Loads and persists one fitted projection per collection (keyed by collection ID)"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._projections: Dict[str, PCAProjection] = {}
+        self._collection_locks: Dict[str, threading.Lock] = {}
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, collection_id: str) -> str:
+        return os.path.join(self.directory, f"{collection_id}.npz")
+    
+    def get(self, collection_id: str) -> Optional[PCAProjection]:
+        with self._lock:
+            projection = self._projections.get(collection_id)
+            if projection is None and os.path.exists(self._path(collection_id)):
+                with np.load(self._path(collection_id)) as data:
+                    samples = int(data["samples"]) if "samples" in data.files else None
+                    projection = PCAProjection(data["mean"], data["components"], samples)
+                self._projections[collection_id] = projection
+            return projection
+    
+    def lock(self, collection_id: str) -> threading.Lock:
+        """Held while vectors are projected and written, so a refit never misses rows written meanwhile"""
+        with self._lock:
+            return self._collection_locks.setdefault(collection_id, threading.Lock())
+    
+    def _save(self, collection_id: str, projection: PCAProjection):
+        """Persist a projection (caller holds the store lock)"""
+        tmp_path = self._path(collection_id) + ".tmp.npz"
+        np.savez(tmp_path, mean=projection.mean, components=projection.components, samples=projection.samples)
+        os.replace(tmp_path, self._path(collection_id))
+        self._projections[collection_id] = projection
+    
+    def get_or_fit(self, collection_id: str, vectors: np.ndarray, dimensions: int, center: bool) -> PCAProjection:
+        """Return the collection's projection, fitting it on these vectors if it has none yet"""
+        projection = self.get(collection_id)
+        if projection is not None:
+            return projection
+        with self._lock:
+            projection = self._projections.get(collection_id)
+            if projection is None:
+                projection = PCAProjection.fit(vectors, dimensions, center)
+                self._save(collection_id, projection)
+                logger.info(f"Fitted {dimensions}-dimension projection for collection {collection_id} on {len(vectors)} vectors")
+            return projection
+    
+    def replace(self, collection_id: str, projection: PCAProjection):
+        """Store a refitted projection"""
+        with self._lock:
+            self._save(collection_id, projection)
+    
+    def rename(self, old_id: str, new_id: str):
+        """Carry a collection's projection over to its new ID (after a rebuild)"""
+        with self._lock:
+            projection = self._projections.pop(old_id, None)
+            if projection is not None:
+                self._projections[new_id] = projection
+            if os.path.exists(self._path(old_id)):
+                os.replace(self._path(old_id), self._path(new_id))
+    
+    def drop(self, collection_id: str):
+        """Forget a deleted collection's projection"""
+        with self._lock:
+            self._projections.pop(collection_id, None)
+            self._collection_locks.pop(collection_id, None)
+            if os.path.exists(self._path(collection_id)):
+                os.remove(self._path(collection_id))
+
+class CompressedCollection:
+    """Presents a compressed collection through the chromadb Collection API at full dimension"""
+    
+    def __init__(self, collection: Any, config: CompressionConfig, projections: ProjectionStore):
+        self.collection = collection
+        self.config = config
+        self._projections = projections
+        self._embedding_function = getattr(collection, "_embedding_function", None)
+    
+    @property
+    def name(self) -> str:
+        return self.collection.name
+    
+    @property
+    def id(self):
+        return self.collection.id
+    
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        return self.collection.metadata
+    
+    @property
+    def space(self) -> str:
+        configuration = getattr(self.collection, "configuration_json", None) or {}
+        space = (configuration.get("hnsw") or {}).get("space")
+        return space or (self.collection.metadata or {}).get("hnsw:space", "l2")
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self._embedding_function is None:
+            raise ValueError("Compressed collection has no embedding function")
+        return np.asarray(self._embedding_function(texts), dtype=np.float32)
+    
+    def _reduce(self, vectors: np.ndarray) -> np.ndarray:
+        projection = self._projections.get_or_fit(
+            str(self.collection.id), vectors, self.config.dimensions, center=self.space == "l2"
+        )
+        return np.ascontiguousarray(projection.project(vectors), dtype=np.float32)
+    
+    def _with_vectors(self, vectors: np.ndarray, metadatas: Optional[List[Any]], count: int) -> List[Dict[str, Any]]:
+        metadatas = metadatas if metadatas is not None else [None] * count
+        return [
+            dict(metadata or {}, **{VECTOR_KEY: encode_vector(vector, self.config.rerank_dtype)})
+            for vector, metadata in zip(vectors, metadatas)
+        ]
+    
+    def _strip(self, metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not metadata:
+            return metadata
+        stripped = {key: value for key, value in metadata.items() if key != VECTOR_KEY}
+        return stripped or None
+    
+    def count(self) -> int:
+        return self.collection.count()
+    
+    def add(self, ids: List[str], documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Any]] = None, embeddings: Any = None, **kwargs):
+        vectors = self._embed(documents) if embeddings is None else np.asarray(embeddings, dtype=np.float32)
+        with self._projections.lock(str(self.collection.id)):
+            self.collection.add(
+                ids=ids,
+                documents=documents,
+                metadatas=self._with_vectors(vectors, metadatas, len(ids)),
+                embeddings=self._reduce(vectors)
+            )
+        self._refit_if_incomplete()
+    
+    def update(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Any]] = None, embeddings: Any = None, **kwargs):
+        if documents is None and embeddings is None:
+            # Metadata updates merge, so the stored vector is kept
+            self.collection.update(ids=ids, metadatas=metadatas)
+            return
+        vectors = self._embed(documents) if embeddings is None else np.asarray(embeddings, dtype=np.float32)
+        with self._projections.lock(str(self.collection.id)):
+            self.collection.update(
+                ids=ids,
+                documents=documents,
+                metadatas=self._with_vectors(vectors, metadatas, len(ids)),
+                embeddings=self._reduce(vectors)
+            )
+    
+    def _stored_vectors(self, limit: int, offset: int):
+        """IDs and full-precision vectors of a page of rows"""
+        page = self.collection.get(limit=limit, offset=offset, include=["metadatas"])
+        vectors = [decode_vector(m[VECTOR_KEY], self.config.rerank_dtype) for m in page["metadatas"] or []]
+        return page["ids"], vectors
+    
+    def _refit_if_incomplete(self):
+        """Refit a projection fitted on too few vectors once the collection holds enough, re-projecting every row"""
+        collection_id = str(self.collection.id)
+        projection = self._projections.get(collection_id)
+        if projection is None or projection.complete or self.collection.count() < self.config.dimensions:
+            return
+        with self._projections.lock(collection_id):
+            if self._projections.get(collection_id).complete:
+                # Another thread refitted it meanwhile
+                return
+            sample: List[np.ndarray] = []
+            while len(sample) < REFIT_SAMPLE:
+                ids, vectors = self._stored_vectors(min(_REFIT_BATCH, REFIT_SAMPLE - len(sample)), len(sample))
+                sample.extend(vectors)
+                if not ids:
+                    break
+            projection = PCAProjection.fit(np.stack(sample), self.config.dimensions, center=self.space == "l2")
+            self._projections.replace(collection_id, projection)
+            offset = 0
+            while True:
+                ids, vectors = self._stored_vectors(_REFIT_BATCH, offset)
+                if not ids:
+                    break
+                self.collection.update(ids=ids, embeddings=np.ascontiguousarray(projection.project(np.stack(vectors)), dtype=np.float32))
+                offset += len(ids)
+        logger.info(f"Refitted the projection of collection {collection_id} on {len(sample)} vectors and re-projected {offset} rows")
+    
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, **kwargs):
+        self.collection.delete(ids=ids, where=where)
+    
+    def modify(self, **kwargs):
+        self.collection.modify(**kwargs)
+    
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        include = list(include) if include is not None else ["documents", "metadatas"]
+        # Full-precision embeddings are decoded from the metadata, not read from the reduced index
+        inner = [key for key in include if key != "embeddings"]
+        if "embeddings" in include and "metadatas" not in inner:
+            inner.append("metadatas")
+        page = self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=inner)
+        result = {"ids": page["ids"]}
+        metadatas = page.get("metadatas") or []
+        if "embeddings" in include:
+            result["embeddings"] = [decode_vector(m[VECTOR_KEY], self.config.rerank_dtype) for m in metadatas]
+        for key in include:
+            if key == "metadatas":
+                result[key] = [self._strip(m) for m in metadatas]
+            elif key != "embeddings":
+                result[key] = page.get(key)
+        return result
+    
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Any = None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        include = list(include) if include is not None else ["documents", "metadatas", "distances"]
+        queries = self._embed(query_texts) if query_embeddings is None else np.asarray(query_embeddings, dtype=np.float32)
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "embeddings", "distances") if key in include]
+        merged: Dict[str, Any] = {key: [] for key in keys}
+        
+        projection = self._projections.get(str(self.collection.id))
+        if projection is None:
+            # Nothing has been added yet
+            for key in keys:
+                merged[key] = [[] for _ in queries]
+            return merged
+        
+        query_kwargs = {
+            "query_embeddings": np.ascontiguousarray(projection.project(queries), dtype=np.float32),
+            "n_results": n_results * self.config.rerank_factor,
+            "include": [key for key in ("documents", "metadatas") if key in include or key == "metadatas"]
+        }
+        if where:
+            query_kwargs["where"] = where
+        candidates = self.collection.query(**query_kwargs)
+        
+        space = self.space
+        for q, query in enumerate(queries):
+            metadatas = candidates["metadatas"][q]
+            if not metadatas:
+                for key in keys:
+                    merged[key].append([])
+                continue
+            vectors = np.stack([decode_vector(m[VECTOR_KEY], self.config.rerank_dtype) for m in metadatas])
+            distances = exact_distances(vectors, query, space)
+            order = np.argsort(distances, kind="stable")[:n_results]
+            merged["ids"].append([candidates["ids"][q][j] for j in order])
+            if "documents" in merged:
+                merged["documents"].append([candidates["documents"][q][j] for j in order])
+            if "metadatas" in merged:
+                merged["metadatas"].append([self._strip(metadatas[j]) for j in order])
+            if "embeddings" in merged:
+                merged["embeddings"].append([vectors[j] for j in order])
+            if "distances" in merged:
+                merged["distances"].append([float(distances[j]) for j in order])
+        return merged
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Cross-encoder reranking for the MCP Chroma Server.
+A query first fetches a wide candidate pool from the vector index; a local
+cross-encoder then scores each (query, document) pair on CPU and only the
+top results are returned. Uses sentence-transformers when it is installed.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, List, Optional
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # sentence-transformers is optional
+    CrossEncoder = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class CrossEncoderReranker:
+    """Scores candidates with a cross-encoder loaded on first use, within a latency budget"""
+    
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, batch_size: int = 32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model: Any = None
+        self._lock = threading.Lock()
+        # Running estimate of seconds per scored pair, used to skip reranks that cannot finish in time
+        self._seconds_per_pair: Optional[float] = None
+    
+    def load(self):
+        """Load the model (idempotent)"""
+        if self._model is not None:
+            return self._model
+        if CrossEncoder is None:
+            raise RuntimeError("Reranking requires the sentence-transformers package")
+        with self._lock:
+            if self._model is None:
+                started = time.perf_counter()
+                self._model = CrossEncoder(self.model_name, device="cpu")
+                logger.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - started:.2f}s")
+        return self._model
+    
+    def score(self, query: str, documents: List[str], deadline: Optional[float] = None) -> Optional[List[float]]:
+        """Relevance scores for each document, or None if the deadline would be missed"""
+        model = self.load()
+        if deadline is not None and self._seconds_per_pair is not None:
+            if time.perf_counter() + self._seconds_per_pair * len(documents) > deadline:
+                return None
+        
+        scores: List[float] = []
+        for start in range(0, len(documents), self.batch_size):
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            batch_started = time.perf_counter()
+            batch = documents[start:start + self.batch_size]
+            predictions = model.predict([(query, doc or "") for doc in batch], batch_size=self.batch_size)
+            scores.extend(float(p) for p in predictions)
+            per_pair = (time.perf_counter() - batch_started) / len(batch)
+            self._seconds_per_pair = per_pair if self._seconds_per_pair is None else 0.8 * self._seconds_per_pair + 0.2 * per_pair
+        return scores
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Serialization helpers for the MCP Chroma Server.
+Uses orjson when it is installed and falls back to the standard library json module.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def _default(obj: Any) -> Any:
+    """Convert values that neither backend handles natively (numpy arrays and scalars, sets)"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class JSONSerializer:
+    """Encodes responses to UTF-8 JSON bytes and decodes request lines"""
+    
+    name = "json"
+    
+    def dumps(self, obj: Any) -> bytes:
+        """Serialize an object to compact JSON bytes"""
+        text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default)
+        # Lone surrogates (which json.loads accepts) can't be UTF-8 encoded; they become \uXXXX escapes instead
+        return text.encode("utf-8", errors="backslashreplace")
+    
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Parse a JSON document"""
+        return json.loads(data)
+
+class OrjsonSerializer(JSONSerializer):
+    """orjson-backed serializer; numpy arrays are encoded without a Python round trip"""
+    
+    name = "orjson"
+    
+    def __init__(self):
+        self._option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, default=_default, option=self._option)
+        except orjson.JSONEncodeError:
+            # orjson rejects strings with lone surrogates, which the json module escapes
+            return super().dumps(obj)
+    
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers need no special casing
+        return orjson.loads(data)
+
+_BACKENDS: dict = {
+    "json": JSONSerializer,
+    "orjson": OrjsonSerializer,
+}
+
+def register_serializer(name: str, factory: Callable[[], JSONSerializer]):
+    """Register an additional serializer backend under the given name"""
+    _BACKENDS[name] = factory
+
+def get_serializer(backend: str = "auto") -> JSONSerializer:
+    """Return a serializer for the requested backend ("auto" prefers orjson)"""
+    if backend == "auto":
+        backend = "orjson" if orjson is not None else "json"
+    if backend == "orjson" and orjson is None:
+        logger.warning("orjson is not installed, falling back to the json module")
+        backend = "json"
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend}")
+    return _BACKENDS[backend]()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Collection sharding for the MCP Chroma Server.
+A sharded collection is hash-partitioned by document ID across collections of
+the same name in several persist directories. Writes are routed by ID, reads
+fan out to every shard in parallel and per-shard top-k lists are merged.
+"""
+
+import heapq
+import json
+import logging
+import zlib
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Collection metadata key recording how many shards a collection is split across
+SHARD_COUNT_KEY = "mcp:shards"
+
+def shard_for(doc_id: str, shard_count: int) -> int:
+    """Stable shard index for a document ID (the same in every process)"""
+    return zlib.crc32(doc_id.encode("utf-8")) % shard_count
+
+class ShardedCollection:
+    """Presents the shards of one logical collection through the chromadb Collection API"""
+    
+    def __init__(self, shards: List[Any], executor: Executor, embedding_function: Optional[Callable]):
+        self.shards = shards
+        self._executor = executor
+        # Embed once here instead of once per shard
+        self._embedding_function = embedding_function
+        # Where the last filtered get() stopped: (filter, logical offset, shard index, offset within that shard)
+        self._cursor: Optional[Tuple[str, int, int, int]] = None
+    
+    @property
+    def name(self) -> str:
+        return self.shards[0].name
+    
+    @property
+    def id(self):
+        return self.shards[0].id
+    
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        return self.shards[0].metadata
+    
+    def _fan_out(self, call: Callable[[Any], Any]) -> List[Any]:
+        """Run call(shard) on every shard in parallel, preserving shard order"""
+        futures = [self._executor.submit(call, shard) for shard in self.shards]
+        return [future.result() for future in futures]
+    
+    def _partition(self, ids: List[str]) -> Dict[int, List[int]]:
+        """Positions of ids grouped by the shard that owns them"""
+        groups: Dict[int, List[int]] = {}
+        for position, doc_id in enumerate(ids):
+            groups.setdefault(shard_for(doc_id, len(self.shards)), []).append(position)
+        return groups
+    
+    def _embed(self, texts: List[str]):
+        if self._embedding_function is None:
+            raise ValueError("Sharded collection has no embedding function")
+        return np.asarray(self._embedding_function(texts), dtype=np.float32)
+    
+    def count(self) -> int:
+        return sum(self._fan_out(lambda shard: shard.count()))
+    
+    def add(self, ids: List[str], documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Any]] = None, embeddings: Any = None, **kwargs):
+        if embeddings is None and documents is not None:
+            embeddings = self._embed(documents)
+        groups = self._partition(ids)
+        
+        def add_to(shard_index: int):
+            positions = groups[shard_index]
+            shard_kwargs = {"ids": [ids[p] for p in positions]}
+            if documents is not None:
+                shard_kwargs["documents"] = [documents[p] for p in positions]
+            if metadatas is not None:
+                shard_kwargs["metadatas"] = [metadatas[p] for p in positions]
+            if embeddings is not None:
+                shard_kwargs["embeddings"] = np.asarray(embeddings, dtype=np.float32)[positions]
+            self.shards[shard_index].add(**shard_kwargs)
+        
+        futures = [self._executor.submit(add_to, shard_index) for shard_index in groups]
+        for future in futures:
+            future.result()
+    
+    def update(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Any]] = None, **kwargs):
+        embeddings = self._embed(documents) if documents is not None else None
+        for shard_index, positions in self._partition(ids).items():
+            shard_kwargs = {"ids": [ids[p] for p in positions]}
+            if documents is not None:
+                shard_kwargs["documents"] = [documents[p] for p in positions]
+                shard_kwargs["embeddings"] = embeddings[positions]
+            if metadatas is not None:
+                shard_kwargs["metadatas"] = [metadatas[p] for p in positions]
+            self.shards[shard_index].update(**shard_kwargs)
+    
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, **kwargs):
+        if ids:
+            for shard_index, positions in self._partition(ids).items():
+                self.shards[shard_index].delete(ids=[ids[p] for p in positions], where=where)
+        else:
+            self._fan_out(lambda shard: shard.delete(where=where))
+    
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        include = include if include is not None else ["documents", "metadatas"]
+        if ids:
+            groups = self._partition(ids)
+            futures = [
+                self._executor.submit(self.shards[i].get, ids=[ids[p] for p in positions],
+                                      where=where, include=include)
+                for i, positions in groups.items()
+            ]
+            return self._concat([future.result() for future in futures], include)
+        
+        if where is None:
+            # Page through the shards in order, using their counts to place the offset
+            pages = []
+            skip = offset or 0
+            remaining = limit
+            for shard in self.shards:
+                if remaining is not None and remaining <= 0:
+                    break
+                shard_count = shard.count()
+                if skip >= shard_count:
+                    skip -= shard_count
+                    continue
+                page = shard.get(limit=remaining, offset=skip, include=include)
+                pages.append(page)
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(page["ids"])
+            return self._concat(pages, include)
+        
+        return self._get_filtered(where, limit, offset or 0, include)
+    
+    def _get_filtered(self, where: Dict[str, Any], limit: Optional[int], offset: int,
+                      include: List[str]) -> Dict[str, Any]:
+        """Rows matching a filter in shard order; a page that follows the previous one resumes from a per-shard cursor"""
+        key = json.dumps(where, sort_keys=True, default=str)
+        shard_index, skip = 0, offset
+        if self._cursor is not None and self._cursor[:2] == (key, offset):
+            shard_index, skip = self._cursor[2:]
+        
+        pages = []
+        remaining = limit
+        returned = 0
+        while shard_index < len(self.shards) and (remaining is None or remaining > 0):
+            shard = self.shards[shard_index]
+            page = shard.get(where=where, limit=remaining, offset=skip, include=include)
+            rows = len(page["ids"])
+            if rows:
+                pages.append(page)
+                returned += rows
+                if remaining is not None:
+                    remaining -= rows
+                    if remaining == 0:
+                        # The shard may have more matches; the next page starts after these
+                        skip += rows
+                        break
+            elif skip:
+                # The offset lies beyond this shard's matches. Counting them means reading their IDs, so jumping to
+                # a deep offset costs a scan of the shards before it; paging forward from the cursor never does this
+                skip -= min(skip, len(shard.get(where=where, include=[])["ids"]))
+                shard_index += 1
+                continue
+            shard_index, skip = shard_index + 1, 0
+        self._cursor = (key, offset + returned, shard_index, skip)
+        return self._concat(pages, include)
+    
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Any = None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None, **kwargs) -> Dict[str, Any]:
+        include = list(include) if include is not None else ["documents", "metadatas", "distances"]
+        if "distances" not in include:
+            include.append("distances")
+        if query_embeddings is None:
+            query_embeddings = self._embed(query_texts)
+        
+        def query_shard(shard):
+            shard_kwargs = {
+                "query_embeddings": query_embeddings,
+                "n_results": n_results,
+                "include": include
+            }
+            if where:
+                shard_kwargs["where"] = where
+            return shard.query(**shard_kwargs)
+        
+        shard_results = self._fan_out(query_shard)
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "embeddings", "distances") if key in include]
+        merged: Dict[str, Any] = {key: [] for key in keys}
+        for q in range(len(query_embeddings)):
+            # Each shard's hits are already sorted by distance, so a k-way merge yields the global top-k
+            streams = []
+            for r in shard_results:
+                hits = []
+                for j, doc_id in enumerate(r["ids"][q]):
+                    hit = {key: r[key][q][j] for key in keys if r.get(key) is not None}
+                    hits.append((r["distances"][q][j], doc_id, hit))
+                streams.append(hits)
+            top = [hit for _, _, hit in heapq.merge(*streams, key=lambda h: (h[0], h[1]))][:n_results]
+            for key in keys:
+                merged[key].append([hit.get(key) for hit in top])
+        return merged
+    
+    def modify(self, **kwargs):
+        self._fan_out(lambda shard: shard.modify(**kwargs))
+    
+    @staticmethod
+    def _concat(pages: List[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        merged: Dict[str, Any] = {"ids": []}
+        for key in include:
+            merged[key] = []
+        for page in pages:
+            merged["ids"].extend(page["ids"])
+            for key in include:
+                values = page.get(key)
+                merged[key].extend(values if values is not None else [None] * len(page["ids"]))
+        return merged
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Single-flight request coalescing for the MCP Chroma Server.
+Identical read requests that arrive while one of them is still running share
+that one execution instead of each embedding the query and searching again.
+Every caller gets its own future, so cancelling one caller never cancels the
+shared execution while others are still waiting on it.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """One shared execution and the number of callers still waiting on it"""
+    
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+    
+    def attach(self) -> asyncio.Future:
+        """A new future that settles like the shared one"""
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters += 1
+        
+        def relay(shared: asyncio.Future):
+            if waiter.done():
+                return
+            if shared.cancelled():
+                waiter.cancel()
+            elif shared.exception() is not None:
+                waiter.set_exception(shared.exception())
+            else:
+                waiter.set_result(shared.result())
+        
+        def detach(done: asyncio.Future):
+            if not done.cancelled():
+                return
+            self.waiters -= 1
+            # Only stop the shared execution once nobody is left to receive its result
+            if self.waiters == 0 and not self.future.done():
+                self.future.cancel()
+        
+        self.future.add_done_callback(relay)
+        waiter.add_done_callback(detach)
+        return waiter
+
+class SingleFlight:
+    """Shares one execution among identical requests that are in flight at the same time"""
+    
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+    
+    def submit(self, key: Hashable, start: Callable[[], Any]) -> asyncio.Future:
+        """Join the in-flight execution for key, or start one with start()"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(start()))
+            self._flights[key] = flight
+            flight.future.add_done_callback(lambda _: self._finish(key, flight))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalesced request onto an in-flight execution ({self.coalesced} so far)")
+        return flight.attach()
+    
+    def reset(self):
+        """Make later requests start fresh executions (called when a write is dispatched)"""
+        self._flights.clear()
+    
+    def _finish(self, key: Hashable, flight: _Flight):
+        # Results are never reused once the execution is over; this is not a cache
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Collection export and import for the MCP Chroma Server.
+A snapshot is a directory holding manifest.json, records.jsonl (one id/document/metadata
+object per line) and embeddings.npy (float32 matrix, row i belongs to line i).
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from serialization import JSONSerializer, get_serializer
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "chroma-mcp-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+RECORDS_FILE = "records.jsonl"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+def export_collection(collection, output_dir: str, page_size: int = 1000,
+                      include_embeddings: bool = True,
+                      serializer: Optional[JSONSerializer] = None) -> Dict[str, Any]:
+    """Stream a collection to a snapshot directory one page at a time"""
+    serializer = serializer or get_serializer()
+    target = Path(output_dir)
+    if target.exists():
+        raise FileExistsError(f"Export path already exists: {target}")
+    
+    # Write into a scratch directory and rename at the end so a partial export is never mistaken for a snapshot
+    partial = target.with_name(f"{target.name}.partial-{os.getpid()}")
+    partial.mkdir(parents=True)
+    started = time.perf_counter()
+    
+    try:
+        total = collection.count()
+        include = ["documents", "metadatas"]
+        if include_embeddings:
+            include.append("embeddings")
+        
+        vectors = None
+        written = 0
+        with open(partial / RECORDS_FILE, "wb") as records:
+            while written < total:
+                page = collection.get(limit=min(page_size, total - written), offset=written, include=include)
+                ids = page["ids"]
+                if not ids:
+                    # Rows were deleted while exporting
+                    break
+                documents = page.get("documents")
+                metadatas = page.get("metadatas")
+                records.write(b"".join(
+                    serializer.dumps({
+                        "id": doc_id,
+                        "document": documents[k] if documents is not None else None,
+                        "metadata": metadatas[k] if metadatas is not None else None
+                    }) + b"\n"
+                    for k, doc_id in enumerate(ids)
+                ))
+                
+                if include_embeddings:
+                    embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                    if vectors is None:
+                        vectors = open_memmap(partial / EMBEDDINGS_FILE, mode="w+",
+                                              dtype=np.float32, shape=(total, embeddings.shape[1]))
+                    vectors[written:written + len(ids)] = embeddings
+                written += len(ids)
+        
+        dimension = None
+        if vectors is not None:
+            dimension = int(vectors.shape[1])
+            vectors.flush()
+            del vectors
+        
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "collection": collection.name,
+            "metadata": collection.metadata,
+            # embeddings.npy may have trailing unused rows if the collection shrank mid-export
+            "count": written,
+            "dimension": dimension,
+            "embeddings": EMBEDDINGS_FILE if dimension is not None else None,
+            "exported_at": time.time()
+        }
+        with open(partial / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, indent=2)
+        
+        os.replace(partial, target)
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    
+    return {
+        "path": str(target),
+        "count": written,
+        "dimension": dimension,
+        "bytes": _directory_size(target),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def open_embedding_file(path: str, dimension: Optional[int] = None) -> np.ndarray:
+    """Memory-map an embedding matrix from a .npy file or a raw little-endian float32 file"""
+    if str(path).endswith(".npy"):
+        vectors = np.load(path, mmap_mode="r")
+    else:
+        if not dimension:
+            raise ValueError("A dimension is required to read a raw float32 embedding file")
+        vectors = np.memmap(path, dtype="<f4", mode="r")
+        if vectors.size % dimension:
+            raise ValueError(f"File size of {path} is not a multiple of {dimension} float32 values")
+        vectors = vectors.reshape(-1, dimension)
+    if vectors.ndim != 2:
+        raise ValueError(f"Expected a 2-D embedding matrix in {path}, got shape {vectors.shape}")
+    if dimension and vectors.shape[1] != dimension:
+        raise ValueError(f"Expected {dimension}-dimensional embeddings in {path}, got {vectors.shape[1]}")
+    return vectors
+
+def read_manifest(snapshot_dir: str) -> Dict[str, Any]:
+    """Load and validate a snapshot manifest"""
+    with open(Path(snapshot_dir) / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a collection snapshot: {snapshot_dir}")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest['version']}")
+    return manifest
+
+def import_collection(client, snapshot_dir: str, collection_name: Optional[str] = None,
+                      batch_size: int = 1000, metadata: Optional[Dict[str, Any]] = None,
+                      serializer: Optional[JSONSerializer] = None) -> Dict[str, Any]:
+    """Bulk-load a snapshot into a new collection, reusing the stored embeddings"""
+    serializer = serializer or get_serializer()
+    source = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+    name = collection_name or manifest["collection"]
+    started = time.perf_counter()
+    
+    vectors = None
+    if manifest.get("embeddings"):
+        # Memory-mapped, so only the rows of the current batch are paged in
+        vectors = open_embedding_file(source / manifest["embeddings"])
+    
+    if metadata is None:
+        metadata = manifest.get("metadata")
+    collection = client.create_collection(name=name, metadata=metadata or None)
+    count = manifest["count"]
+    loaded = 0
+    
+    def add_batch(rows: List[Dict[str, Any]]):
+        documents = [row.get("document") for row in rows]
+        add_kwargs = {
+            "ids": [row["id"] for row in rows],
+            "metadatas": [row.get("metadata") or None for row in rows]
+        }
+        if any(doc is not None for doc in documents):
+            add_kwargs["documents"] = documents
+        if vectors is not None:
+            add_kwargs["embeddings"] = np.ascontiguousarray(vectors[loaded:loaded + len(rows)], dtype=np.float32)
+        collection.add(**add_kwargs)
+    
+    try:
+        rows: List[Dict[str, Any]] = []
+        with open(source / RECORDS_FILE, "rb") as records:
+            for line in records:
+                if loaded + len(rows) >= count:
+                    break
+                rows.append(serializer.loads(line))
+                if len(rows) >= batch_size:
+                    add_batch(rows)
+                    loaded += len(rows)
+                    rows = []
+        if rows:
+            add_batch(rows)
+            loaded += len(rows)
+    except Exception:
+        # Leave no half-imported collection behind
+        logger.error(f"Import into '{name}' failed after {loaded} rows, dropping the collection")
+        client.delete_collection(name)
+        raise
+    
+    return {
+        "collection": name,
+        "collection_id": str(collection.id),
+        "count": loaded,
+        "reembedded": vectors is None,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
@@ -5,22 +5,23 @@ Startup script for Chroma MCP Server
 
 import asyncio
 import sys
-import os
 from pathlib import Path
 
 # Add the current directory to Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from chroma_mcp_server import main
+from mcp_chroma_server import main
 
 if __name__ == "__main__":
-    print("Starting Chroma MCP Server...")
-    print("Press Ctrl+C to stop the server")
+    # stdout carries the MCP responses, so status messages go to stderr
+    print("Starting Chroma MCP Server...", file=sys.stderr)
+    print("Press Ctrl+C or send SIGTERM to stop the server", file=sys.stderr)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\nShutting down Chroma MCP Server...")
+        # Only reached where signal handlers are unavailable (e.g. Windows); the server drains on its own elsewhere
+        print("\nShutting down Chroma MCP Server...", file=sys.stderr)
     except Exception as e:
-        print(f"Error starting server: {e}")
+        print(f"Error starting server: {e}", file=sys.stderr)
         sys.exit(1)
 
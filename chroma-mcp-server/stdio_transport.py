@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Stdio transport for the MCP Chroma Server.
+Reads newline-delimited requests from stdin and writes serialized responses as
+bytes to a buffered stdout, flushing once per batch of ready responses.
+"""
+
+import os
+import select
+import sys
+import threading
+from typing import BinaryIO, List, Optional
+
+from serialization import JSONSerializer, get_serializer
+
+class StdioTransport:
+    """Line-oriented stdio transport with batched response flushing"""
+    
+    def __init__(self, serializer: Optional[JSONSerializer] = None,
+                 stdin: Optional[BinaryIO] = None, stdout: Optional[BinaryIO] = None,
+                 max_batch: int = 64, read_size: int = 65536):
+        self.serializer = serializer or get_serializer()
+        self._stdin_fd = (stdin or sys.stdin.buffer).fileno()
+        self._stdout = stdout or sys.stdout.buffer
+        self._max_batch = max_batch
+        self._read_size = read_size
+        # The reader thread fills the input buffer while the event loop polls it through input_pending()
+        self._in_lock = threading.Lock()
+        self._in_buffer = bytearray()
+        self._eof = False
+        self._out_buffer: List[bytes] = []
+    
+    def readline(self) -> bytes:
+        """Read the next request line; returns b"" at EOF"""
+        while True:
+            with self._in_lock:
+                newline = self._in_buffer.find(b"\n")
+                if newline >= 0:
+                    line = bytes(self._in_buffer[:newline + 1])
+                    del self._in_buffer[:newline + 1]
+                    return line
+                if self._eof:
+                    line = bytes(self._in_buffer)
+                    self._in_buffer.clear()
+                    return line
+            # Not under the lock, so input_pending() never waits on a blocked read
+            chunk = os.read(self._stdin_fd, self._read_size)
+            with self._in_lock:
+                if not chunk:
+                    self._eof = True
+                else:
+                    self._in_buffer += chunk
+    
+    def input_pending(self) -> bool:
+        """Whether another request can be read without blocking"""
+        with self._in_lock:
+            if b"\n" in self._in_buffer or self._eof:
+                return True
+        try:
+            readable, _, _ = select.select([self._stdin_fd], [], [], 0)
+        except (OSError, ValueError):
+            # select() does not support pipes on every platform; flush eagerly instead
+            return False
+        return bool(readable)
+    
+    def send_encoded(self, data: bytes):
+        """Queue a response that has already been serialized (without its newline)"""
+        self._out_buffer.append(data + b"\n")
+        if len(self._out_buffer) >= self._max_batch:
+            self.flush()
+    
+    def flush(self):
+        """Write all queued responses to stdout in a single call"""
+        if not self._out_buffer:
+            return
+        data = b"".join(self._out_buffer)
+        self._out_buffer.clear()
+        self._stdout.write(data)
+        self._stdout.flush()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Streamed responses for the MCP Chroma Server.
+A request with "stream": true is answered with a series of partial messages,
+one per query and batch of hits or page of documents, followed by the usual
+final response. The thread handling the request hands each message to the
+response writer as soon as it is built, and blocks while a few are still
+unwritten, so a large result never has to be held in memory at once.
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+# Partial messages a producer may get ahead of stdout before it blocks
+MAX_PENDING_MESSAGES = 4
+# Methods that accept "stream": true
+STREAMED_METHODS = frozenset({"query_collection", "get_documents"})
+
+_END = object()
+
+def is_streamed(request: Any) -> bool:
+    """Whether a request asks for a streamed response"""
+    if not isinstance(request, dict) or request.get("method") not in STREAMED_METHODS:
+        return False
+    params = request.get("params") or {}
+    return bool(params.get("stream"))
+
+def partial_message(**fields: Any) -> Dict[str, Any]:
+    """A partial message of a streamed response; the final message has no "partial" key"""
+    return {"success": True, "partial": True, **fields}
+
+def batched(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Consecutive slices of at most size items; an empty list still yields one empty slice"""
+    if not items:
+        yield []
+        return
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class ResponseStream:
+    """Messages of one streamed response, passed from the thread producing them to the response writer"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int = MAX_PENDING_MESSAGES):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.max_pending = max_pending
+        self._unwritten = 0
+        self._closed = False
+        self._space = threading.Condition()
+    
+    def send(self, message: Any):
+        """Queue a partial message (a dict, or bytes already encoded by a worker); called from the producing thread"""
+        with self._space:
+            self._space.wait_for(lambda: self._unwritten < self.max_pending or self._closed)
+            if self._closed:
+                # Nobody is writing this response any more
+                return
+            self._unwritten += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (message, True))
+    
+    def follow(self, future: asyncio.Future):
+        """End the stream with the final response of the request producing it"""
+        future.add_done_callback(self._finish)
+    
+    def _finish(self, future: asyncio.Future):
+        if future.cancelled():
+            final = {"error": "Request cancelled"}
+        elif future.exception() is not None:
+            final = {"error": str(future.exception())}
+        else:
+            final = future.result()
+        self._queue.put_nowait((final, False))
+        self._queue.put_nowait((_END, False))
+    
+    def ready(self) -> bool:
+        """Whether another message can be written without waiting"""
+        return not self._queue.empty()
+    
+    async def messages(self) -> AsyncIterator[Any]:
+        """Yield each message as it is produced, ending with the final response"""
+        while True:
+            message, partial = await self._queue.get()
+            if message is _END:
+                return
+            yield message
+            if partial:
+                with self._space:
+                    self._unwritten -= 1
+                    self._space.notify()
+    
+    def close(self):
+        """Release a producer that is still blocked, e.g. when the writer stops early"""
+        with self._space:
+            self._closed = True
+            self._space.notify_all()
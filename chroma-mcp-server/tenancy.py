@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Multi-tenant routing for the MCP Chroma Server.
+Each tenant gets its own persist directory (and so its own SQLite file and HNSW
+segments), a concurrency quota, a request rate limit and a segment cache budget.
+Idle tenants are closed lazily the next time the registry is consulted, which
+releases their client's segments and in-memory indexes.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+class TenantLimits(BaseModel):
+    """Per-tenant resource limits"""
+    max_concurrent: int = 4
+    # Sustained requests per second; 0 disables rate limiting
+    rate_per_second: float = 0.0
+    burst: int = 20
+    # Chroma segment cache budget in bytes; 0 keeps Chroma's default (unbounded) cache
+    cache_bytes: int = 0
+
+class TenantLimitError(Exception):
+    """Raised when a tenant exceeds its concurrency quota or rate limit"""
+    
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket refilled at rate_per_second up to burst tokens"""
+    
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> float:
+        """Take a token; returns 0 on success or the seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+class Tenant:
+    """A tenant's Chroma client, write queue, index stores and limits"""
+    
+    def __init__(self, tenant_id: str, client: Any, write_queue: Any, limits: TenantLimits,
+                 lexical_index: Any = None, projections: Any = None):
+        self.tenant_id = tenant_id
+        self.client = client
+        self.write_queue = write_queue
+        self.limits = limits
+        self.lexical_index = lexical_index
+        self.projections = projections
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self._semaphore = threading.BoundedSemaphore(limits.max_concurrent)
+        self._limiter = RateLimiter(limits.rate_per_second, limits.burst) if limits.rate_per_second > 0 else None
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def slot(self):
+        """Admit one request under the tenant's rate limit and concurrency quota"""
+        if self._limiter is not None:
+            wait = self._limiter.try_acquire()
+            if wait > 0:
+                raise TenantLimitError(f"Rate limit exceeded for tenant '{self.tenant_id}'", retry_after=round(wait, 3))
+        # Never wait for a slot: the wait would hold a shared executor thread that other tenants need
+        if not self._semaphore.acquire(blocking=False):
+            raise TenantLimitError(f"Tenant '{self.tenant_id}' has too many requests in flight", retry_after=0.1)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.last_used = time.monotonic()
+            self._semaphore.release()
+
+# Tenant of the request being handled on the current thread (None for the default tenant)
+current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+class TenantRegistry:
+    """Opens tenants on first use and closes the ones that have gone idle"""
+    
+    def __init__(self, root_directory: str,
+                 open_tenant: Callable[[str, str, TenantLimits], Dict[str, Any]],
+                 close_client: Callable[[Any], None],
+                 limits: TenantLimits, idle_seconds: float = 600.0):
+        self.root_directory = root_directory
+        # open_tenant returns the Tenant's resources (client, write_queue, lexical_index, projections)
+        self._open_tenant = open_tenant
+        self._close_client = close_client
+        self.limits = limits
+        self.idle_seconds = idle_seconds
+        self._tenants: Dict[str, Tenant] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root_directory, exist_ok=True)
+    
+    def path_for(self, tenant_id: str) -> str:
+        return os.path.join(self.root_directory, tenant_id)
+    
+    def get(self, tenant_id: str) -> Tenant:
+        """Return the tenant, opening its client on first use"""
+        if not _TENANT_ID_RE.match(tenant_id or ""):
+            raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+        self.evict_idle()
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                resources = self._open_tenant(tenant_id, self.path_for(tenant_id), self.limits)
+                tenant = Tenant(tenant_id, limits=self.limits, **resources)
+                self._tenants[tenant_id] = tenant
+                logger.info(f"Opened tenant '{tenant_id}' ({len(self._tenants)} active)")
+            tenant.last_used = time.monotonic()
+            return tenant
+    
+    def evict_idle(self):
+        """Close tenants with no requests in flight that have been idle for idle_seconds"""
+        if self.idle_seconds <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [t for t in self._tenants.values() if t.in_flight == 0 and t.last_used < cutoff]
+            for tenant in idle:
+                del self._tenants[tenant.tenant_id]
+        for tenant in idle:
+            logger.info(f"Evicting idle tenant '{tenant.tenant_id}'")
+            self._close(tenant)
+    
+    def active(self) -> Dict[str, Tenant]:
+        with self._lock:
+            return dict(self._tenants)
+    
+    def close_all(self, timeout: Optional[float] = None):
+        """Close every open tenant (used on shutdown), waiting up to timeout for each one's queued writes"""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for tenant in tenants:
+            self._close(tenant, timeout)
+    
+    def _close(self, tenant: Tenant, timeout: Optional[float] = None):
+        if tenant.write_queue is not None:
+            tenant.write_queue.close(timeout)
+        try:
+            self._close_client(tenant.client)
+        except Exception as e:
+            logger.warning(f"Error closing client for tenant '{tenant.tenant_id}': {e}")
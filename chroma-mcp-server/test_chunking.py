@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Unit tests for document chunking
+"""
+
+import unittest
+
+from chunking import (CHUNK_INDEX_KEY, PARENT_ID_KEY, ChunkingConfig, collapse_chunk_hits,
+                      group_chunk_rows, iter_chunks, iter_document_chunks)
+
+TEXT = " ".join(f"Sentence number {n} says something." for n in range(40))
+
+class ChunkSpanTest(unittest.TestCase):
+    """Chunk windows cover the whole document, overlap and respect the size limit"""
+    
+    def assert_covers(self, text, chunks, config):
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(text))
+        for start, end, chunk in chunks:
+            self.assertEqual(chunk, text[start:end])
+        for (_, previous_end, _), (start, _, _) in zip(chunks, chunks[1:]):
+            # Consecutive chunks overlap or are separated only by whitespace
+            self.assertTrue(start < previous_end or not text[previous_end:start].strip())
+    
+    def test_char_chunks(self):
+        config = ChunkingConfig(size=100, overlap=20)
+        chunks = list(iter_chunks(TEXT, config))
+        self.assertGreater(len(chunks), 1)
+        self.assert_covers(TEXT, chunks, config)
+        for start, end, _ in chunks:
+            self.assertLessEqual(end - start, config.size)
+            # Never cut in the first half of a window
+            if end < len(TEXT):
+                self.assertGreaterEqual(end - start, config.size // 2)
+    
+    def test_char_chunks_overlap(self):
+        chunks = list(iter_chunks(TEXT, ChunkingConfig(size=100, overlap=20)))
+        for (_, previous_end, _), (start, _, _) in zip(chunks, chunks[1:]):
+            self.assertLess(start, previous_end)
+        no_overlap = list(iter_chunks(TEXT, ChunkingConfig(size=100, overlap=0)))
+        for (_, previous_end, _), (start, _, _) in zip(no_overlap, no_overlap[1:]):
+            self.assertGreaterEqual(start, previous_end)
+    
+    def test_sentence_aware_cuts(self):
+        chunks = list(iter_chunks(TEXT, ChunkingConfig(size=100, overlap=0)))
+        for _, end, chunk in chunks[:-1]:
+            self.assertTrue(chunk.endswith("."), chunk)
+    
+    def test_token_chunks(self):
+        config = ChunkingConfig(size=12, overlap=3, unit="token", sentence_aware=False)
+        chunks = list(iter_chunks(TEXT, config))
+        self.assert_covers(TEXT, chunks, config)
+        for (_, _, previous), (_, _, chunk) in zip(chunks, chunks[1:]):
+            self.assertEqual(len(previous.split()), 12)
+            self.assertEqual(previous.split()[-3:], chunk.split()[:3])
+    
+    def test_invalid_config(self):
+        for config in (ChunkingConfig(size=0), ChunkingConfig(size=10, overlap=10), ChunkingConfig(unit="line")):
+            with self.subTest(config=config), self.assertRaises(ValueError):
+                list(iter_chunks(TEXT, config))
+
+class DocumentChunkTest(unittest.TestCase):
+    """Chunk IDs and metadata of whole documents"""
+    
+    def test_single_chunk_keeps_id(self):
+        rows = list(iter_document_chunks(["short"], ["doc"], [{"k": 1}], ChunkingConfig(size=100, overlap=10)))
+        self.assertEqual(len(rows), 1)
+        chunk_id, chunk, metadata = rows[0]
+        self.assertEqual((chunk_id, chunk), ("doc", "short"))
+        self.assertEqual(metadata[PARENT_ID_KEY], "doc")
+        self.assertEqual(metadata["k"], 1)
+    
+    def test_long_document_is_split(self):
+        rows = list(iter_document_chunks([TEXT], ["doc"], None, ChunkingConfig(size=100, overlap=10)))
+        self.assertGreater(len(rows), 1)
+        self.assertEqual([chunk_id for chunk_id, _, _ in rows], [f"doc#chunk-{n}" for n in range(len(rows))])
+        self.assertEqual([metadata[CHUNK_INDEX_KEY] for _, _, metadata in rows], list(range(len(rows))))
+    
+    def test_empty_document_is_one_chunk(self):
+        config = ChunkingConfig(size=10, overlap=2, unit="token")
+        rows = list(iter_document_chunks(["", "   "], ["empty", "blank"], None, config))
+        self.assertEqual([(chunk_id, chunk) for chunk_id, chunk, _ in rows], [("empty", ""), ("blank", "   ")])
+    
+    def test_group_chunk_rows(self):
+        chunk_rows = [
+            ("long#chunk-1", {PARENT_ID_KEY: "long", CHUNK_INDEX_KEY: 1}),
+            ("long#chunk-0", {PARENT_ID_KEY: "long", CHUNK_INDEX_KEY: 0}),
+            ("short", {PARENT_ID_KEY: "short", CHUNK_INDEX_KEY: 0}),
+            ("other#chunk-0", {PARENT_ID_KEY: "other", CHUNK_INDEX_KEY: 0})
+        ]
+        rows = group_chunk_rows(["short", "long", "missing", "plain"], ["short", "plain"], chunk_rows)
+        self.assertEqual(rows, {"short": ["short"], "long": ["long#chunk-0", "long#chunk-1"], "plain": ["plain"]})
+        self.assertEqual(list(rows), ["short", "long", "plain"])
+    
+    def test_collapse_chunk_hits(self):
+        hits = [
+            {"id": "a#chunk-2", "metadata": {PARENT_ID_KEY: "a", CHUNK_INDEX_KEY: 2}},
+            {"id": "plain", "metadata": None},
+            {"id": "a#chunk-0", "metadata": {PARENT_ID_KEY: "a", CHUNK_INDEX_KEY: 0}},
+            {"id": "b", "metadata": {PARENT_ID_KEY: "b", CHUNK_INDEX_KEY: 0}}
+        ]
+        collapsed = collapse_chunk_hits(hits, 10)
+        self.assertEqual([item["id"] for item in collapsed], ["a#chunk-2", "plain", "b"])
+        self.assertEqual(collapsed[0]["matched_chunks"], 2)
+        self.assertEqual(collapsed[0]["chunk_index"], 2)
+        self.assertEqual(len(collapse_chunk_hits(hits, 1)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
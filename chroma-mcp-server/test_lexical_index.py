@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the BM25 lexical index and reciprocal rank fusion
+"""
+
+import os
+import tempfile
+import unittest
+
+from lexical_index import BM25Index, LexicalIndexStore, is_exact_term, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    "a": "the quick brown fox jumps over the lazy dog",
+    "b": "the lazy dog sleeps all day",
+    "c": "contact alice@example.com about parseHeader_v2",
+    "d": "fox fox fox"
+}
+
+class TokenizeTest(unittest.TestCase):
+    """Compound words are kept whole and split into their parts"""
+    
+    def test_compound_words(self):
+        self.assertEqual(tokenize("Mail alice@example.com."), ["mail", "alice@example.com", "alice", "example", "com"])
+        self.assertEqual(tokenize("see src/main.py:"), ["see", "src/main.py", "src", "main", "py"])
+    
+    def test_bare_punctuation_is_dropped(self):
+        self.assertEqual(tokenize("a -- b @ c"), ["a", "b", "c"])
+    
+    def test_exact_terms(self):
+        for query in ("alice@example.com", "parseHeader_v2", "TICKET-42", "sha256", "fooBar", '"src/main.py"', "(ID-7),"):
+            with self.subTest(query=query):
+                self.assertTrue(is_exact_term(query))
+        for query in ("Hello.", "2024", "hello", "2024-01-01", "two words", "...", ""):
+            with self.subTest(query=query):
+                self.assertFalse(is_exact_term(query))
+
+class BM25IndexTest(unittest.TestCase):
+    """Okapi BM25 ranking and incremental maintenance"""
+    
+    def setUp(self):
+        self.index = BM25Index()
+        for doc_id, text in DOCUMENTS.items():
+            self.index.add(doc_id, text)
+    
+    def test_term_frequency_and_length(self):
+        # "d" repeats the term in a short document; "a" mentions it once in a long one
+        self.assertEqual([doc_id for doc_id, _ in self.index.search("fox")], ["d", "a"])
+    
+    def test_rare_terms_weigh_more(self):
+        scores = dict(self.index.search("lazy sleeps"))
+        self.assertGreater(scores["b"], scores["a"])
+    
+    def test_score_matches_formula(self):
+        index = BM25Index(k1=1.2, b=0.75)
+        index.add("x", "cat cat dog")
+        index.add("y", "dog")
+        # n=2, df(cat)=1: idf = ln(1 + 1.5 / 1.5); tf=2, |x|=3, avgdl=2
+        idf = 0.6931471805599453
+        expected = idf * 2 * 2.2 / (2 + 1.2 * (0.25 + 0.75 * 3 / 2))
+        self.assertAlmostEqual(dict(index.search("cat"))["x"], expected)
+    
+    def test_exact_identifier_lookup(self):
+        self.assertTrue(self.index.has_term("alice@example.com"))
+        self.assertEqual(self.index.search("alice@example.com", 1)[0][0], "c")
+    
+    def test_update_and_remove(self):
+        self.index.add("d", "a cat")
+        self.assertNotIn("d", dict(self.index.search("fox")))
+        self.index.remove("a")
+        self.index.remove("missing")
+        self.assertEqual(self.index.search("fox"), [])
+        self.assertEqual(len(self.index), 3)
+    
+    def test_search_filters_before_ranking(self):
+        index = BM25Index()
+        for n in range(40):
+            index.add(f"top-{n}", "apple apple")
+        index.add("filtered", "apple " + " ".join(f"filler{n}" for n in range(50)))
+        # The only allowed match ranks last, far below the requested limit
+        self.assertNotIn("filtered", dict(index.search("apple", 20)))
+        self.assertEqual([doc_id for doc_id, _ in index.search("apple", 20, {"filtered"})], ["filtered"])
+        self.assertEqual(index.search("apple", 20, set()), [])
+    
+    def test_round_trip(self):
+        copy = BM25Index.from_dict(self.index.to_dict())
+        self.assertEqual(copy.search("lazy dog"), self.index.search("lazy dog"))
+
+class ReciprocalRankFusionTest(unittest.TestCase):
+    """Documents ranked well by both lists come first"""
+    
+    def test_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+        self.assertEqual([doc_id for doc_id, _ in fused], ["b", "a", "d", "c"])
+        self.assertAlmostEqual(dict(fused)["b"], 1 / 62 + 1 / 61)
+    
+    def test_empty_rankings(self):
+        self.assertEqual(reciprocal_rank_fusion([[], []]), [])
+
+class LexicalIndexStoreTest(unittest.TestCase):
+    """Indexes persist as a snapshot plus a log, and stale ones are rebuilt"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+    
+    def store(self, **kwargs) -> LexicalIndexStore:
+        return LexicalIndexStore(self.directory.name, **kwargs)
+    
+    def log_lines(self, collection_id: str) -> int:
+        path = os.path.join(self.directory.name, f"{collection_id}.log")
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return len(f.readlines())
+    
+    def test_log_replay(self):
+        store = self.store()
+        store.build("c1", DOCUMENTS.items())
+        store.upsert("c1", ["e"], ["a fox in a box"])
+        store.remove("c1", ["d"])
+        self.assertEqual(self.log_lines("c1"), 2)
+        loaded = self.store().get("c1")
+        self.assertEqual(sorted(loaded.to_dict()), ["a", "b", "c", "e"])
+        self.assertEqual(loaded.search("box")[0][0], "e")
+    
+    def test_torn_log_entry(self):
+        store = self.store()
+        store.build("c1", DOCUMENTS.items())
+        store.upsert("c1", ["e"], ["box"])
+        with open(os.path.join(self.directory.name, "c1.log"), "a") as f:
+            f.write('{"op":"add","id":"f","ter')
+        self.assertEqual(sorted(self.store().get("c1").to_dict()), ["a", "b", "c", "d", "e"])
+    
+    def test_compaction(self):
+        store = self.store(compact_after=3)
+        store.build("c1", [("a", "fox"), ("b", "dog")])
+        store.upsert("c1", ["c", "d"], ["box", "cat"])
+        self.assertEqual(self.log_lines("c1"), 2)
+        # The log reaches both compact_after and the size of the index, so it is folded into the snapshot
+        store.upsert("c1", ["a", "b"], ["ox", "hog"])
+        self.assertEqual(self.log_lines("c1"), 0)
+        loaded = self.store().get("c1")
+        self.assertEqual(len(loaded), 4)
+        self.assertEqual(loaded.search("ox")[0][0], "a")
+    
+    def test_stale_index_is_discarded(self):
+        store = self.store()
+        store.build("c1", DOCUMENTS.items())
+        # An add that reached Chroma but crashed before its log entry leaves the collection one row ahead
+        self.assertIsNone(self.store().get("c1", count=lambda: len(DOCUMENTS) + 1))
+        self.assertIsNotNone(self.store().get("c1", count=lambda: len(DOCUMENTS)))
+    
+    def test_count_checked_once_per_load(self):
+        store = self.store()
+        store.build("c1", DOCUMENTS.items())
+        calls = []
+        store = self.store()
+        store.upsert("c1", ["e"], ["box"])
+        count = lambda: calls.append(1) or len(DOCUMENTS) + 1
+        self.assertIsNotNone(store.get("c1", count))
+        self.assertIsNotNone(store.get("c1", count))
+        self.assertEqual(len(calls), 1)
+        # An index built in this process is not checked at all
+        store.build("c2", DOCUMENTS.items())
+        self.assertIsNotNone(store.get("c2", lambda: 0))
+    
+    def test_rename_and_drop(self):
+        store = self.store()
+        store.build("c1", DOCUMENTS.items())
+        store.upsert("c1", ["e"], ["box"])
+        store.rename("c1", "c2")
+        self.assertIsNone(self.store().get("c1"))
+        self.assertEqual(len(self.store().get("c2")), 5)
+        store.drop("c2")
+        self.assertIsNone(store.get("c2"))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+if __name__ == "__main__":
+    unittest.main()
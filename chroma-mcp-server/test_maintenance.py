@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unit tests for storage maintenance: orphaned segments, vacuum and offline rebuilds
+"""
+
+import sqlite3
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+from maintenance import (HNSW_HEADER_FILE, REBUILD_SUFFIX, SQLITE_FILE, _HNSW_HEADER, check_integrity,
+                         find_orphaned_segments, maintain, rebuild_collection, recover_interrupted_rebuilds)
+
+class FakeCollection:
+    """The parts of a chromadb Collection that maintenance uses"""
+    
+    def __init__(self, client, name, metadata=None, configuration=None):
+        self.client = client
+        self.name = name
+        self.id = uuid.uuid4()
+        self.metadata = metadata
+        self.configuration = configuration
+        self.rows = []
+    
+    def count(self):
+        return len(self.rows)
+    
+    def add(self, ids, embeddings, documents, metadatas):
+        self.rows.extend(zip(ids, embeddings, documents, metadatas))
+    
+    def get(self, limit, offset, include):
+        page = self.rows[offset:offset + limit]
+        return {
+            "ids": [row[0] for row in page],
+            "embeddings": [row[1] for row in page],
+            "documents": [row[2] for row in page],
+            "metadatas": [row[3] for row in page]
+        }
+    
+    def modify(self, name):
+        del self.client.collections[self.name]
+        self.name = name
+        self.client.collections[name] = self
+
+class FakeClient:
+    """Collections by name, created with whatever metadata and configuration they are given"""
+    
+    def __init__(self):
+        self.collections = {}
+    
+    def create_collection(self, name, metadata=None, configuration=None):
+        if name in self.collections:
+            raise ValueError(f"Collection {name} already exists")
+        self.collections[name] = FakeCollection(self, name, metadata, configuration)
+        return self.collections[name]
+    
+    def get_collection(self, name):
+        return self.collections[name]
+    
+    def delete_collection(self, name):
+        del self.collections[name]
+    
+    def list_collections(self):
+        return list(self.collections.values())
+
+class PersistDirectoryTest(unittest.TestCase):
+    """Orphaned segment directories are removed; everything else is left alone"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.client = FakeClient()
+        self.collection = self.client.create_collection("docs")
+        self.live = self.segment(str(uuid.uuid4()))
+        self.metadata_segment = str(uuid.uuid4())
+        with sqlite3.connect(self.root / SQLITE_FILE) as db:
+            db.execute("CREATE TABLE segments (id TEXT PRIMARY KEY, scope TEXT, collection TEXT)")
+            db.execute("INSERT INTO segments VALUES (?, 'VECTOR', ?)", (self.live.name, str(self.collection.id)))
+            db.execute("INSERT INTO segments VALUES (?, 'METADATA', ?)", (self.metadata_segment, str(self.collection.id)))
+            # Free pages for VACUUM to reclaim
+            db.execute("CREATE TABLE scratch (value BLOB)")
+            db.executemany("INSERT INTO scratch VALUES (?)", [(b"x" * 4096,) for _ in range(64)])
+            db.execute("DROP TABLE scratch")
+        db.close()
+        self.orphan = self.segment(str(uuid.uuid4()))
+        # A UUID-named directory holding something other than segment files, and an unrelated directory
+        self.foreign = self.segment(str(uuid.uuid4()), "notes.txt")
+        self.unrelated = self.segment("backups")
+    
+    def segment(self, name, filename="data_level0.bin"):
+        path = self.root / name
+        path.mkdir()
+        (path / filename).write_bytes(b"\0" * 1024)
+        (path / HNSW_HEADER_FILE).write_bytes(_HNSW_HEADER.pack(0, 0, 0, 0, 0))
+        return path
+    
+    def test_find_orphaned_segments(self):
+        self.assertEqual(find_orphaned_segments(str(self.root)), [self.orphan])
+    
+    def test_dry_run_touches_nothing(self):
+        before = {path: path.stat().st_mtime_ns for path in self.root.rglob("*")}
+        report = maintain(self.client, str(self.root), dry_run=True)
+        self.assertEqual([entry["segment"] for entry in report["orphaned_segments"]], [self.orphan.name])
+        self.assertNotIn("vacuum", report)
+        self.assertEqual(report["reclaimed_bytes"], 0)
+        self.assertEqual({path: path.stat().st_mtime_ns for path in self.root.rglob("*")}, before)
+    
+    def test_orphans_removed_and_live_segments_kept(self):
+        report = maintain(self.client, str(self.root))
+        self.assertFalse(self.orphan.exists())
+        for path in (self.live, self.foreign, self.unrelated, self.root / SQLITE_FILE):
+            self.assertTrue(path.exists(), path)
+        self.assertEqual(report["orphaned_segments"][0]["bytes"], 1024 + _HNSW_HEADER.size)
+        self.assertLess(report["vacuum"]["bytes_after"], report["vacuum"]["bytes_before"])
+        self.assertGreater(report["reclaimed_bytes"], 0)
+    
+    def test_fragmented_collection_is_rebuilt(self):
+        (self.live / HNSW_HEADER_FILE).write_bytes(_HNSW_HEADER.pack(0, 0, 10, 10, 0))
+        self.collection.add(["a", "b"], [[1.0], [2.0]], ["A", "B"], [None, None])
+        report = maintain(self.client, str(self.root), rebuild_threshold=0.5, rebuild=False)
+        self.assertEqual(report["fragmented"][0]["fragmentation"], 0.8)
+        self.assertEqual(report["rebuilt"], [])
+        report = maintain(self.client, str(self.root), rebuild_threshold=0.5)
+        self.assertEqual(report["rebuilt"][0]["new_id"], str(self.client.get_collection("docs").id))
+        self.assertNotEqual(report["rebuilt"][0]["new_id"], str(self.collection.id))
+    
+    def test_check_integrity(self):
+        self.assertEqual(check_integrity(str(self.root), thorough=True), [])
+        (self.live / HNSW_HEADER_FILE).write_bytes(b"\0" * 4)
+        self.assertEqual(check_integrity(str(self.root)), [f"segment {self.live.name}: unreadable {HNSW_HEADER_FILE}"])
+
+class RebuildTest(unittest.TestCase):
+    """A rebuilt collection keeps its rows, metadata and configuration under the same name"""
+    
+    def setUp(self):
+        self.client = FakeClient()
+        self.configuration = {"hnsw": {"space": "cosine", "max_neighbors": 32}}
+        self.source = self.client.create_collection("docs", {"topic": "x"}, self.configuration)
+        self.source.add([f"id{n}" for n in range(25)], [[float(n)] for n in range(25)],
+                        [f"doc {n}" for n in range(25)], [{"n": n} for n in range(25)])
+    
+    def test_rebuild_collection(self):
+        rebuilt = rebuild_collection(self.client, "docs", batch_size=10)
+        self.assertEqual(list(self.client.collections), ["docs"])
+        self.assertIs(self.client.get_collection("docs"), rebuilt)
+        self.assertNotEqual(rebuilt.id, self.source.id)
+        self.assertEqual(rebuilt.metadata, {"topic": "x"})
+        self.assertEqual(rebuilt.configuration, self.configuration)
+        self.assertEqual(rebuilt.rows, self.source.rows)
+    
+    def test_interrupted_copy_is_discarded(self):
+        self.client.create_collection("docs" + REBUILD_SUFFIX)
+        self.assertEqual(recover_interrupted_rebuilds(self.client), ["docs"])
+        self.assertEqual(list(self.client.collections), ["docs"])
+        self.assertIs(self.client.get_collection("docs"), self.source)
+    
+    def test_complete_copy_is_renamed(self):
+        self.source.modify(name="docs" + REBUILD_SUFFIX)
+        self.assertEqual(recover_interrupted_rebuilds(self.client), ["docs"])
+        self.assertIs(self.client.get_collection("docs"), self.source)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -64,6 +64,29 @@ async def test_mcp_server():
                 "params": {
                     "collection_name": "test_collection"
                 }
+            },
+            {
+                "method": "update_documents",
+                "params": {
+                    "collection_name": "test_collection",
+                    "ids": ["doc2"],
+                    "documents": ["Another document about deep learning"],
+                    "metadatas": [{"topic": "dl"}]
+                }
+            },
+            {
+                "method": "get_documents",
+                "params": {
+                    "collection_name": "test_collection",
+                    "ids": ["doc1", "doc2"]
+                }
+            },
+            {
+                "method": "delete_documents",
+                "params": {
+                    "collection_name": "test_collection",
+                    "where": {"topic": "dl"}
+                }
             }
         ]
         
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Unit tests for adding documents with precomputed embeddings
+"""
+
+import os
+import tempfile
+import unittest
+import uuid
+
+import numpy as np
+
+from mcp_chroma_server import ChromaConfig, MCPChromaServer
+
+class FakeCollection:
+    """Records each add, rejecting vectors whose width differs from the first batch like Chroma does"""
+    
+    def __init__(self):
+        self.id = uuid.uuid4()
+        self.name = "docs"
+        self.metadata = None
+        self.batches = []
+        self.dimension = None
+    
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        dimension = embeddings.shape[1]
+        if self.dimension is not None and dimension != self.dimension:
+            raise ValueError(f"Collection expecting embedding with dimension of {self.dimension}, got {dimension}")
+        self.dimension = dimension
+        self.batches.append({"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas})
+
+class FakeClient:
+    """One collection, and a small maximum batch size so adds are split"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def get_collection(self, name):
+        if name != self.collection.name:
+            raise ValueError(f"Collection {name} does not exist")
+        return self.collection
+    
+    def get_max_batch_size(self):
+        return 4
+
+class PrecomputedEmbeddingsTest(unittest.TestCase):
+    """Rows come from inline vectors or a memory-mapped file inside the export directory"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.exports = os.path.join(self.root, "exports")
+        os.mkdir(self.exports)
+        self.vectors = np.arange(40, dtype=np.float32).reshape(10, 4)
+        np.save(os.path.join(self.exports, "vectors.npy"), self.vectors)
+        self.vectors.astype("<f4").tofile(os.path.join(self.exports, "vectors.f32"))
+        self.collection = FakeCollection()
+        self.server = MCPChromaServer(ChromaConfig(export_directory=self.exports))
+        self.server.default_client = FakeClient(self.collection)
+    
+    def add(self, count, **kwargs):
+        return self.server.add_documents_sync(
+            "docs", [f"doc {n}" for n in range(count)], ids=[f"id{n}" for n in range(count)], **kwargs
+        )
+    
+    def added(self):
+        return np.concatenate([batch["embeddings"] for batch in self.collection.batches])
+    
+    def test_inline_embeddings(self):
+        result = self.add(3, embeddings=self.vectors[:3].tolist())
+        self.assertTrue(result["success"], result["message"])
+        np.testing.assert_array_equal(self.added(), self.vectors[:3])
+    
+    def test_file_rows_start_at_the_offset(self):
+        result = self.add(6, embeddings_path="vectors.npy", embeddings_offset=3)
+        self.assertTrue(result["success"], result["message"])
+        # Added in batches of the client's maximum size, each row paired with its document
+        self.assertEqual([len(batch["ids"]) for batch in self.collection.batches], [4, 2])
+        self.assertEqual(self.collection.batches[1]["documents"], ["doc 4", "doc 5"])
+        np.testing.assert_array_equal(self.added(), self.vectors[3:9])
+    
+    def test_raw_file(self):
+        result = self.add(2, embeddings_path="vectors.f32", embeddings_dim=4, embeddings_offset=8)
+        self.assertTrue(result["success"], result["message"])
+        np.testing.assert_array_equal(self.added(), self.vectors[8:])
+    
+    def test_rows_beyond_the_file_are_rejected(self):
+        for offset in (5, -1):
+            result = self.add(6, embeddings_path="vectors.npy", embeddings_offset=offset)
+            self.assertFalse(result["success"])
+            self.assertIn("exceed the 10 available embeddings", result["message"])
+        self.assertEqual(self.collection.batches, [])
+    
+    def test_dimension_mismatch(self):
+        # The file's width disagrees with embeddings_dim
+        for path, dim in (("vectors.npy", 3), ("vectors.f32", 3)):
+            result = self.add(2, embeddings_path=path, embeddings_dim=dim)
+            self.assertFalse(result["success"])
+        # Ragged or flat inline vectors
+        self.assertFalse(self.add(2, embeddings=[[1.0, 2.0], [3.0]])["success"])
+        self.assertFalse(self.add(2, embeddings=[1.0, 2.0])["success"])
+        # The collection's own dimension
+        self.assertTrue(self.add(2, embeddings_path="vectors.npy")["success"])
+        result = self.add(2, embeddings=[[1.0, 2.0], [3.0, 4.0]])
+        self.assertFalse(result["success"])
+        self.assertIn("dimension", result["message"])
+        self.assertEqual(len(self.collection.batches), 1)
+    
+    def test_path_must_be_inside_the_export_directory(self):
+        np.save(os.path.join(self.root, "outside.npy"), self.vectors)
+        for path in ("../outside.npy", os.path.join(self.root, "outside.npy")):
+            result = self.add(2, embeddings_path=path)
+            self.assertFalse(result["success"])
+            self.assertIn("inside the export directory", result["message"])
+        os.symlink(os.path.join(self.root, "outside.npy"), os.path.join(self.exports, "link.npy"))
+        self.assertFalse(self.add(2, embeddings_path="link.npy")["success"])
+        self.assertEqual(self.collection.batches, [])
+    
+    def test_inline_and_file_embeddings_are_exclusive(self):
+        result = self.add(2, embeddings=self.vectors[:2].tolist(), embeddings_path="vectors.npy")
+        self.assertFalse(result["success"])
+        self.assertEqual(self.collection.batches, [])
+
+if __name__ == "__main__":
+    unittest.main()
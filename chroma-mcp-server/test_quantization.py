@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit tests for PCA projections and reduced-precision vector storage
+"""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from quantization import (VECTOR_KEY, CompressedCollection, CompressionConfig, PCAProjection, ProjectionStore,
+                          decode_vector, encode_vector, exact_distances)
+
+def random_vectors(count: int, dimension: int = 32, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+class VectorEncodingTest(unittest.TestCase):
+    """Stored vectors decode to within the precision of their dtype"""
+    
+    def test_round_trip(self):
+        vector = random_vectors(1, 384)[0]
+        for dtype, tolerance in (("float32", 0.0), ("float16", 1e-2), ("int8", np.abs(vector).max() / 127.0)):
+            with self.subTest(dtype=dtype):
+                decoded = decode_vector(encode_vector(vector, dtype), dtype)
+                self.assertEqual(decoded.dtype, np.float32)
+                self.assertEqual(decoded.shape, vector.shape)
+                np.testing.assert_allclose(decoded, vector, atol=tolerance, rtol=0)
+    
+    def test_full_precision_by_default(self):
+        self.assertEqual(CompressionConfig(dimensions=8).rerank_dtype, "float32")
+        self.assertEqual(CompressionConfig.from_metadata(CompressionConfig(dimensions=8).to_metadata()).rerank_dtype, "float32")
+    
+    def test_int8_zero_vector(self):
+        zero = np.zeros(8, dtype=np.float32)
+        np.testing.assert_array_equal(decode_vector(encode_vector(zero, "int8"), "int8"), zero)
+    
+    def test_int8_keeps_ranking(self):
+        vectors = random_vectors(50, 64)
+        query = random_vectors(1, 64, seed=1)[0]
+        decoded = np.stack([decode_vector(encode_vector(v, "int8"), "int8") for v in vectors])
+        exact = np.argsort(exact_distances(vectors, query, "cosine"))[:5]
+        approximate = np.argsort(exact_distances(decoded, query, "cosine"))[:5]
+        self.assertEqual(set(exact[:3]), set(approximate[:3]))
+    
+    def test_exact_distances(self):
+        vectors = np.array([[1.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+        query = np.array([1.0, 0.0], dtype=np.float32)
+        np.testing.assert_allclose(exact_distances(vectors, query, "l2"), [0.0, 5.0])
+        np.testing.assert_allclose(exact_distances(vectors, query, "cosine"), [0.0, 1.0])
+        np.testing.assert_allclose(exact_distances(vectors, query, "ip"), [0.0, 1.0])
+
+class PCAProjectionTest(unittest.TestCase):
+    """Projections onto the top principal components"""
+    
+    def test_fit_captures_the_subspace(self):
+        # Vectors lying in a 4-dimensional subspace project without loss onto 4 components
+        basis = np.linalg.qr(random_vectors(32, 32))[0][:4]
+        vectors = random_vectors(200, 4) @ basis
+        projection = PCAProjection.fit(vectors, 4, center=False)
+        self.assertTrue(projection.complete)
+        reduced = projection.project(vectors)
+        self.assertEqual(reduced.shape, (200, 4))
+        np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), np.linalg.norm(vectors, axis=1), rtol=1e-4)
+    
+    def test_fit_on_too_few_vectors(self):
+        projection = PCAProjection.fit(random_vectors(3), 8)
+        self.assertFalse(projection.complete)
+        self.assertEqual(projection.project(random_vectors(5)).shape, (5, 8))
+        # Components the sample could not determine are zero
+        self.assertFalse(np.any(projection.components[3:]))
+    
+    def test_dimensions_must_shrink(self):
+        with self.assertRaises(ValueError):
+            PCAProjection.fit(random_vectors(10, 8), 8)
+    
+    def test_store_persists_projections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProjectionStore(directory)
+            fitted = store.get_or_fit("c1", random_vectors(3), 8, center=True)
+            self.assertIs(store.get_or_fit("c1", random_vectors(20), 8, center=True), fitted)
+            loaded = ProjectionStore(directory).get("c1")
+            np.testing.assert_array_equal(loaded.components, fitted.components)
+            self.assertEqual(loaded.samples, 3)
+            store.rename("c1", "c2")
+            self.assertIsNone(ProjectionStore(directory).get("c1"))
+            self.assertIsNotNone(ProjectionStore(directory).get("c2"))
+            store.drop("c2")
+            self.assertIsNone(ProjectionStore(directory).get("c2"))
+
+class FakeCollection:
+    """The parts of a chromadb Collection a CompressedCollection uses, with an exact index"""
+    
+    def __init__(self):
+        self.id = "fake-collection"
+        self.name = "fake"
+        self.metadata = {"hnsw:space": "l2"}
+        self.rows = {}
+    
+    def count(self):
+        return len(self.rows)
+    
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        for k, doc_id in enumerate(ids):
+            self.rows[doc_id] = {"metadata": metadatas[k], "embedding": np.asarray(embeddings[k])}
+    
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        for k, doc_id in enumerate(ids):
+            if embeddings is not None:
+                self.rows[doc_id]["embedding"] = np.asarray(embeddings[k])
+    
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        keys = list(ids) if ids is not None else list(self.rows)[offset or 0:][:limit]
+        return {"ids": keys, "metadatas": [self.rows[key]["metadata"] for key in keys]}
+    
+    def query(self, query_embeddings, n_results, include=None, where=None):
+        keys = list(self.rows)
+        result = {"ids": [], "metadatas": [], "documents": []}
+        for query in query_embeddings:
+            stored = np.stack([self.rows[key]["embedding"] for key in keys])
+            order = np.argsort(np.sum((stored - query) ** 2, axis=1))[:n_results]
+            result["ids"].append([keys[j] for j in order])
+            result["metadatas"].append([self.rows[keys[j]]["metadata"] for j in order])
+            result["documents"].append([None for _ in order])
+        return result
+
+class CompressedCollectionTest(unittest.TestCase):
+    """A first add smaller than the projection is refitted once the collection is large enough"""
+    
+    def test_refit_after_small_first_add(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProjectionStore(directory)
+            collection = CompressedCollection(
+                FakeCollection(), CompressionConfig(dimensions=8, rerank_dtype="float32"), store
+            )
+            vectors = random_vectors(40)
+            collection.add(ids=["v0", "v1"], embeddings=vectors[:2])
+            self.assertFalse(store.get("fake-collection").complete)
+            collection.add(ids=[f"v{k}" for k in range(2, 40)], embeddings=vectors[2:])
+            projection = store.get("fake-collection")
+            self.assertTrue(projection.complete)
+            self.assertEqual(projection.samples, 40)
+            # Every row, including the first two, is indexed under the refitted projection
+            for k in range(40):
+                np.testing.assert_allclose(
+                    collection.collection.rows[f"v{k}"]["embedding"], projection.project(vectors[k:k + 1])[0], atol=1e-5
+                )
+            result = collection.query(query_embeddings=vectors[5:6], n_results=1, include=["distances"])
+            self.assertEqual(result["ids"], [["v5"]])
+            self.assertNotIn(VECTOR_KEY, collection.get(ids=["v5"])["metadatas"][0] or {})
+
+if __name__ == "__main__":
+    unittest.main()
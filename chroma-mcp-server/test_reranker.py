@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Unit tests for cross-encoder reranking, using a stub model in place of sentence-transformers
+"""
+
+import time
+import unittest
+import uuid
+from unittest import mock
+
+import reranker
+from mcp_chroma_server import ChromaConfig, MCPChromaServer
+from reranker import CrossEncoderReranker
+
+class StubCrossEncoder:
+    """Scores a pair by the document's length, taking `delay` seconds per predict call"""
+    
+    delay = 0.0
+    
+    def __init__(self, model_name, device=None):
+        self.model_name = model_name
+        self.calls = []
+    
+    def predict(self, pairs, batch_size):
+        self.calls.append(len(pairs))
+        time.sleep(self.delay)
+        return [float(len(document)) for _, document in pairs]
+
+class SlowCrossEncoder(StubCrossEncoder):
+    """A model too slow for the latency budgets below"""
+    
+    delay = 0.05
+
+class FakeCollection:
+    """Returns the same candidates, nearest first, for every query"""
+    
+    def __init__(self, documents):
+        self.id = uuid.uuid4()
+        self.name = "docs"
+        self.metadata = None
+        self.documents = documents
+    
+    def query(self, query_texts, n_results, where=None):
+        documents = self.documents[:n_results]
+        return {
+            "documents": [documents for _ in query_texts],
+            "distances": [[float(n) for n in range(len(documents))] for _ in query_texts],
+            "metadatas": [[None] * len(documents) for _ in query_texts]
+        }
+
+class FakeClient:
+    """Hands out its one collection under any name"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def get_collection(self, name):
+        return self.collection
+
+class CrossEncoderRerankerTest(unittest.TestCase):
+    """Scores come back in document order, or not at all once the deadline would be missed"""
+    
+    def reranker(self, model=StubCrossEncoder, batch_size=2):
+        patcher = mock.patch.object(reranker, "CrossEncoder", model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return CrossEncoderReranker("stub-model", batch_size)
+    
+    def test_scores_in_batches(self):
+        scorer = self.reranker()
+        self.assertEqual(scorer.score("q", ["a", "bbb", None, "cc", "dddd"]), [1.0, 3.0, 0.0, 2.0, 4.0])
+        self.assertEqual(scorer.load().calls, [2, 2, 1])
+        # Loaded once
+        self.assertIs(scorer.load(), scorer.load())
+    
+    def test_missed_deadline_stops_scoring(self):
+        scorer = self.reranker(SlowCrossEncoder)
+        self.assertIsNone(scorer.score("q", ["a"] * 10, deadline=time.perf_counter() + 0.07))
+        self.assertLess(len(scorer.load().calls), 5)
+    
+    def test_estimate_skips_a_rerank_that_cannot_finish(self):
+        scorer = self.reranker(SlowCrossEncoder)
+        self.assertEqual(len(scorer.score("q", ["a", "b"])), 2)
+        calls = len(scorer.load().calls)
+        # About 25ms per pair was measured, so 20 pairs cannot fit in 100ms
+        self.assertIsNone(scorer.score("q", ["a"] * 20, deadline=time.perf_counter() + 0.1))
+        self.assertEqual(len(scorer.load().calls), calls)
+    
+    def test_without_sentence_transformers(self):
+        scorer = self.reranker(None)
+        with self.assertRaisesRegex(RuntimeError, "sentence-transformers"):
+            scorer.score("q", ["a"])
+
+class QueryRerankTest(unittest.TestCase):
+    """query_collection reorders hits by cross-encoder score within rerank_budget_ms"""
+    
+    documents = ["aa", "a", "aaaa", "aaa"]
+    
+    def query(self, model, budget_ms=500):
+        server = MCPChromaServer(ChromaConfig(rerank_budget_ms=budget_ms, rerank_batch_size=1))
+        server.default_client = FakeClient(FakeCollection(self.documents))
+        with mock.patch.object(reranker, "CrossEncoder", model):
+            return server.query_collection_sync("docs", ["q"], n_results=3, rerank=True)
+    
+    def test_reranked(self):
+        result = self.query(StubCrossEncoder)
+        hits = result["results"][0]
+        self.assertTrue(hits["reranked"])
+        self.assertEqual([hit["document"] for hit in hits["results"]], ["aaaa", "aaa", "aa"])
+    
+    def test_budget_exceeded_keeps_vector_order(self):
+        result = self.query(SlowCrossEncoder, budget_ms=60)
+        hits = result["results"][0]
+        self.assertFalse(hits["reranked"])
+        self.assertEqual([hit["document"] for hit in hits["results"]], ["aa", "a", "aaaa"])
+        self.assertTrue(all("rerank_score" not in hit for hit in hits["results"]))
+    
+    def test_without_sentence_transformers(self):
+        result = self.query(None)
+        self.assertFalse(result["success"])
+        self.assertIn("sentence-transformers", result["message"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the response serializers
+"""
+
+import json
+import unittest
+
+import numpy as np
+
+from serialization import JSONSerializer, get_serializer, orjson
+
+BACKENDS = ["json"] + (["orjson"] if orjson is not None else [])
+
+class SerializerTest(unittest.TestCase):
+    """Every backend must produce UTF-8 JSON that json.loads reads back unchanged"""
+    
+    def test_round_trip(self):
+        response = {"success": True, "results": [{"document": "héllo ✓ 😀", "distance": 0.5}]}
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                data = get_serializer(backend).dumps(response)
+                self.assertEqual(json.loads(data.decode("utf-8")), response)
+    
+    def test_lone_surrogates(self):
+        # json.loads accepts these in requests, so they can come back in responses
+        request = json.loads('{"query_texts": ["\\ud800", "a\\udfffb"]}')
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                data = get_serializer(backend).dumps(request)
+                self.assertEqual(json.loads(data.decode("utf-8")), request)
+    
+    def test_numpy_values(self):
+        response = {"embedding": np.array([0.5, 1.5], dtype=np.float32), "count": np.int64(3)}
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(json.loads(get_serializer(backend).dumps(response)), {"embedding": [0.5, 1.5], "count": 3})
+    
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_serializer("yaml")
+    
+    def test_loads(self):
+        self.assertEqual(JSONSerializer().loads(b'{"method": "list_collections"}'), {"method": "list_collections"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Unit tests for hash-partitioned collections
+"""
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from sharding import ShardedCollection, shard_for
+
+def embed(texts):
+    """Deterministic 8-dimensional vectors, one per text"""
+    return [np.random.default_rng(sum(map(ord, text))).standard_normal(8).astype(np.float32) for text in texts]
+
+class FakeShard:
+    """One shard: an in-memory collection with an exact L2 index and equality-only where filters"""
+    
+    def __init__(self, index: int):
+        self.id = f"shard-{index}"
+        self.name = "docs"
+        self.metadata = {"mcp:shards": 3}
+        self.rows = {}
+        # Rows each get() call returned
+        self.reads = []
+    
+    def matches(self, doc_id, where):
+        return not where or all(self.rows[doc_id]["metadata"].get(key) == value for key, value in where.items())
+    
+    def count(self):
+        return len(self.rows)
+    
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        for k, doc_id in enumerate(ids):
+            self.rows[doc_id] = {
+                "document": documents[k] if documents is not None else None,
+                "metadata": metadatas[k] if metadatas is not None else {},
+                "embedding": np.asarray(embeddings[k])
+            }
+    
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        for k, doc_id in enumerate(ids):
+            if documents is not None:
+                self.rows[doc_id].update(document=documents[k], embedding=np.asarray(embeddings[k]))
+            if metadatas is not None:
+                self.rows[doc_id]["metadata"] = metadatas[k]
+    
+    def delete(self, ids=None, where=None):
+        for doc_id in [doc_id for doc_id in (ids or list(self.rows)) if doc_id in self.rows]:
+            if self.matches(doc_id, where):
+                del self.rows[doc_id]
+    
+    def page(self, keys, include):
+        page = {"ids": keys}
+        for key in include:
+            page[key] = [self.rows[doc_id][key[:-1]] for doc_id in keys]
+        return page
+    
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        keys = [doc_id for doc_id in (ids or self.rows) if doc_id in self.rows and self.matches(doc_id, where)]
+        start = offset or 0
+        keys = keys[start:None if limit is None else start + limit]
+        self.reads.append(len(keys))
+        return self.page(keys, include)
+    
+    def query(self, query_embeddings, n_results, include, where=None):
+        result = {key: [] for key in ["ids"] + include}
+        keys = [doc_id for doc_id in self.rows if self.matches(doc_id, where)]
+        for query in query_embeddings:
+            distances = {doc_id: float(np.sum((self.rows[doc_id]["embedding"] - query) ** 2)) for doc_id in keys}
+            top = sorted(keys, key=lambda doc_id: (distances[doc_id], doc_id))[:n_results]
+            page = self.page(top, [key for key in include if key != "distances"])
+            for key, values in page.items():
+                result[key].append(values)
+            if "distances" in include:
+                result["distances"].append([distances[doc_id] for doc_id in top])
+        return result
+
+class ShardForTest(unittest.TestCase):
+    """Routing is stable across processes and spreads IDs evenly"""
+    
+    def test_stable(self):
+        # CRC-32 rather than hash(), which is salted per process
+        self.assertEqual(shard_for("doc-1", 4), 1)
+        self.assertEqual(shard_for("doc-1", 4), shard_for("doc-1", 4))
+    
+    def test_spread(self):
+        counts = np.bincount([shard_for(f"doc-{n}", 4) for n in range(4000)], minlength=4)
+        self.assertTrue(all(800 < count < 1200 for count in counts), counts)
+
+class ShardedCollectionTest(unittest.TestCase):
+    """Writes are routed by ID and reads are merged across shards"""
+    
+    def setUp(self):
+        executor = ThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+        self.embed_calls = 0
+        
+        def embedding_function(texts):
+            self.embed_calls += 1
+            return embed(texts)
+        
+        self.shards = [FakeShard(index) for index in range(3)]
+        self.collection = ShardedCollection(self.shards, executor, embedding_function)
+        self.ids = [f"doc-{n}" for n in range(30)]
+        self.documents = [f"document {n}" for n in range(30)]
+        self.collection.add(
+            ids=self.ids, documents=self.documents, metadatas=[{"parity": n % 2} for n in range(30)]
+        )
+    
+    def test_add_routes_by_id(self):
+        self.assertEqual(self.embed_calls, 1)
+        self.assertEqual(self.collection.count(), 30)
+        for index, shard in enumerate(self.shards):
+            self.assertTrue(shard.rows)
+            self.assertTrue(all(shard_for(doc_id, 3) == index for doc_id in shard.rows))
+    
+    def test_get_by_ids(self):
+        result = self.collection.get(ids=["doc-3", "doc-17", "missing"])
+        self.assertEqual(sorted(result["ids"]), ["doc-17", "doc-3"])
+        self.assertEqual(dict(zip(result["ids"], result["documents"]))["doc-17"], "document 17")
+    
+    def test_unfiltered_pages_cover_every_row_once(self):
+        seen = []
+        for offset in range(0, 30, 7):
+            seen.extend(self.collection.get(limit=7, offset=offset)["ids"])
+        self.assertEqual(sorted(seen), sorted(self.ids))
+        self.assertEqual(self.collection.get(offset=30, limit=5)["ids"], [])
+    
+    def test_filtered_window(self):
+        even = self.collection.get(where={"parity": 0})["ids"]
+        self.assertEqual(len(even), 15)
+        self.assertEqual(self.collection.get(where={"parity": 0}, limit=4, offset=2)["ids"], even[2:6])
+        # Offsets that skip whole shards, and ones past the last match
+        for offset in range(0, 17, 3):
+            self.assertEqual(ShardedCollection(self.shards, None, embed).get(where={"parity": 0}, limit=3, offset=offset)["ids"],
+                             even[offset:offset + 3])
+    
+    def test_filtered_pages_resume_from_the_cursor(self):
+        even = self.collection.get(where={"parity": 0})["ids"]
+        for shard in self.shards:
+            shard.reads.clear()
+        pages = [self.collection.get(where={"parity": 0}, limit=2, offset=offset)["ids"] for offset in range(0, 16, 2)]
+        self.assertEqual(sum(pages, []), even)
+        # Each match was fetched once, rather than offset + limit rows from every shard for every page
+        self.assertLessEqual(sum(sum(shard.reads) for shard in self.shards), len(even))
+        # A different filter starts afresh
+        odd = self.collection.get(where={"parity": 1}, limit=2, offset=14)["ids"]
+        self.assertEqual(odd, self.collection.get(where={"parity": 1})["ids"][14:16])
+    
+    def test_query_merges_the_global_top_k(self):
+        query = embed(["query"])[0]
+        vectors = np.stack(embed(self.documents))
+        expected = [self.ids[k] for k in np.argsort(np.sum((vectors - query) ** 2, axis=1))[:5]]
+        result = self.collection.query(query_embeddings=[query], n_results=5, include=["documents"])
+        self.assertEqual(result["ids"], [expected])
+        self.assertEqual(result["distances"][0], sorted(result["distances"][0]))
+        self.assertEqual(result["documents"][0], [self.documents[self.ids.index(doc_id)] for doc_id in expected])
+    
+    def test_query_with_filter_and_texts(self):
+        result = self.collection.query(query_texts=["document 4", "document 9"], n_results=3, where={"parity": 1})
+        self.assertEqual(len(result["ids"]), 2)
+        self.assertEqual(result["ids"][1][0], "doc-9")
+        for ids in result["ids"]:
+            self.assertTrue(all(int(doc_id.split("-")[1]) % 2 == 1 for doc_id in ids))
+    
+    def test_update_and_delete(self):
+        self.collection.update(ids=["doc-1"], documents=["changed"])
+        self.assertEqual(self.collection.get(ids=["doc-1"])["documents"], ["changed"])
+        self.collection.delete(ids=["doc-1", "doc-2"])
+        self.collection.delete(where={"parity": 0})
+        self.assertEqual(self.collection.count(), 14)
+        self.assertNotIn("doc-1", self.collection.get(where={"parity": 1})["ids"])
+
+if __name__ == "__main__":
+    unittest.main()
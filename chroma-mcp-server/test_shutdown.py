@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for graceful shutdown: SIGTERM drains in-flight requests, or exits with status 1 after the timeout
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+# Runs start_server.py with Chroma left closed and list_collections replaced by a request that takes
+# argv[1] seconds, announcing on stderr when it starts
+SERVER = """
+import runpy, sys, time
+from mcp_chroma_server import MCPChromaServer
+
+async def initialize_chroma(self):
+    pass
+
+def list_collections_sync(self):
+    print("request started", file=sys.stderr, flush=True)
+    time.sleep(float(sys.argv[1]))
+    return {"success": True, "collections": []}
+
+MCPChromaServer.initialize_chroma = initialize_chroma
+MCPChromaServer.list_collections_sync = list_collections_sync
+runpy.run_path("start_server.py", run_name="__main__")
+"""
+
+class ShutdownTest(unittest.TestCase):
+    """SIGTERM stops intake; requests already read are answered within CHROMA_SHUTDOWN_TIMEOUT"""
+    
+    def start(self, request_seconds: float, shutdown_timeout: float) -> subprocess.Popen:
+        env = dict(os.environ, CHROMA_SHUTDOWN_TIMEOUT=str(shutdown_timeout))
+        process = subprocess.Popen(
+            [sys.executable, "-c", SERVER, str(request_seconds)], cwd=HERE, env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.addCleanup(process.kill)
+        self.stderr = []
+        self.started = threading.Event()
+        
+        def read_stderr():
+            for line in process.stderr:
+                self.stderr.append(line.decode(errors="replace"))
+                if b"request started" in line:
+                    self.started.set()
+        
+        threading.Thread(target=read_stderr, daemon=True).start()
+        return process
+    
+    def terminate_during_request(self, process: subprocess.Popen) -> int:
+        """Send one request, keep stdin open, and SIGTERM the server once the request is running"""
+        process.stdin.write(json.dumps({"method": "list_collections", "params": {}}).encode() + b"\n")
+        process.stdin.flush()
+        self.assertTrue(self.started.wait(30), "".join(self.stderr))
+        process.send_signal(signal.SIGTERM)
+        return process.wait(30)
+    
+    def test_sigterm_drains_in_flight_requests(self):
+        process = self.start(request_seconds=1, shutdown_timeout=30)
+        self.assertEqual(self.terminate_during_request(process), 0, "".join(self.stderr))
+        self.assertEqual(json.loads(process.stdout.read()), {"success": True, "collections": []})
+        self.assertTrue(any("Server stopped" in line for line in self.stderr))
+    
+    def test_drain_timeout_exits_with_status_1(self):
+        process = self.start(request_seconds=60, shutdown_timeout=0.5)
+        self.assertEqual(self.terminate_during_request(process), 1, "".join(self.stderr))
+        # The unfinished request gets no answer, and the clients are left for the next start to recover
+        self.assertEqual(process.stdout.read(), b"")
+        self.assertTrue(any("Exiting with requests still in flight" in line for line in self.stderr))
+        self.assertFalse(any("Server stopped" in line for line in self.stderr))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Unit tests for single-flight request coalescing
+"""
+
+import asyncio
+import unittest
+
+from single_flight import SingleFlight
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    """Identical in-flight requests share one execution; cancellation is per caller"""
+    
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+    
+    async def execute(self, value):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(value, Exception):
+            raise value
+        return value
+    
+    def submit(self, key, value=None):
+        return self.flights.submit(key, lambda: self.execute(key if value is None else value))
+    
+    async def test_identical_requests_share_one_execution(self):
+        first, second = self.submit("q"), self.submit("q")
+        other = self.submit("other")
+        self.release.set()
+        self.assertEqual(await asyncio.gather(first, second, other), ["q", "q", "other"])
+        self.assertEqual(self.started, 2)
+        self.assertEqual(self.flights.coalesced, 1)
+    
+    async def test_finished_results_are_not_reused(self):
+        self.release.set()
+        self.assertEqual(await self.submit("q"), "q")
+        self.assertEqual(await self.submit("q"), "q")
+        self.assertEqual(self.started, 2)
+    
+    async def test_one_caller_cancelling_leaves_the_others(self):
+        first, second = self.submit("q"), self.submit("q")
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await second, "q")
+        self.assertTrue(first.cancelled())
+        self.assertEqual(self.cancelled, 0)
+    
+    async def test_last_caller_cancelling_stops_the_execution(self):
+        first, second = self.submit("q"), self.submit("q")
+        await asyncio.sleep(0)
+        first.cancel()
+        second.cancel()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        self.assertEqual(self.cancelled, 1)
+        # The cancelled execution is forgotten, so the next request starts afresh
+        third = self.submit("q")
+        self.release.set()
+        self.assertEqual(await third, "q")
+        self.assertEqual(self.started, 2)
+    
+    async def test_errors_reach_every_caller(self):
+        first, second = self.submit("q", ValueError("boom")), self.submit("q")
+        self.release.set()
+        results = await asyncio.gather(first, second, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(self.started, 1)
+    
+    async def test_reset_starts_fresh_executions(self):
+        first = self.submit("q")
+        await asyncio.sleep(0)
+        # A write was dispatched: a later read must not see the result of one started before it
+        self.flights.reset()
+        second = self.submit("q")
+        self.release.set()
+        self.assertEqual(await asyncio.gather(first, second), ["q", "q"])
+        self.assertEqual(self.started, 2)
+        self.assertEqual(self.flights.coalesced, 0)
+
+if __name__ == "__main__":
+    unittest.main()
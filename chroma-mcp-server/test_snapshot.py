@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Unit tests for collection snapshots
+"""
+
+import json
+import os
+import tempfile
+import unittest
+import uuid
+
+import numpy as np
+
+from snapshot import (EMBEDDINGS_FILE, MANIFEST_FILE, RECORDS_FILE, export_collection, import_collection,
+                      open_embedding_file, read_manifest)
+
+class FakeCollection:
+    """Rows in insertion order, paged like a chromadb Collection"""
+    
+    def __init__(self, name, metadata=None, fail_on_add=None):
+        self.name = name
+        self.id = uuid.uuid4()
+        self.metadata = metadata
+        self.rows = []
+        self.fail_on_add = fail_on_add
+        self.adds = 0
+    
+    def count(self):
+        return len(self.rows)
+    
+    def add(self, ids, metadatas, documents=None, embeddings=None):
+        self.adds += 1
+        if self.adds == self.fail_on_add:
+            raise RuntimeError("disk full")
+        for k, doc_id in enumerate(ids):
+            self.rows.append({
+                "id": doc_id,
+                "document": documents[k] if documents is not None else None,
+                "metadata": metadatas[k],
+                "embedding": None if embeddings is None else np.asarray(embeddings[k])
+            })
+    
+    def get(self, limit, offset, include):
+        page = self.rows[offset:offset + limit]
+        result = {"ids": [row["id"] for row in page]}
+        for key in include:
+            result[key] = [row[key[:-1]] for row in page]
+        return result
+
+class FakeClient:
+    """Collections by name; each fails its fail_on_add-th add when that is set"""
+    
+    def __init__(self, fail_on_add=None):
+        self.collections = {}
+        self.fail_on_add = fail_on_add
+    
+    def create_collection(self, name, metadata=None):
+        if name in self.collections:
+            raise ValueError(f"Collection {name} already exists")
+        self.collections[name] = FakeCollection(name, metadata, self.fail_on_add)
+        return self.collections[name]
+    
+    def delete_collection(self, name):
+        del self.collections[name]
+
+def sample_collection(count=25, dimension=6):
+    collection = FakeCollection("docs", {"topic": "snapshots"})
+    vectors = np.random.default_rng(0).standard_normal((count, dimension)).astype(np.float32)
+    collection.add(
+        ids=[f"id{n}" for n in range(count)],
+        documents=[f"document {n}" for n in range(count)],
+        metadatas=[{"n": n} if n % 3 else None for n in range(count)],
+        embeddings=vectors
+    )
+    return collection
+
+class SnapshotTest(unittest.TestCase):
+    """Export streams a collection to a snapshot; import loads it back without re-embedding"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "docs-snapshot")
+    
+    def test_round_trip(self):
+        source = sample_collection()
+        report = export_collection(source, self.path, page_size=10)
+        self.assertEqual((report["count"], report["dimension"]), (25, 6))
+        # Only the finished snapshot is left, never the scratch directory it was written to
+        self.assertEqual(os.listdir(self.directory), ["docs-snapshot"])
+        self.assertEqual(sorted(os.listdir(self.path)), sorted([MANIFEST_FILE, RECORDS_FILE, EMBEDDINGS_FILE]))
+        manifest = read_manifest(self.path)
+        self.assertEqual((manifest["collection"], manifest["metadata"]), ("docs", {"topic": "snapshots"}))
+        # Import reads the vectors through a memory map rather than loading the file
+        self.assertIsInstance(open_embedding_file(os.path.join(self.path, EMBEDDINGS_FILE)), np.memmap)
+        
+        client = FakeClient()
+        result = import_collection(client, self.path, collection_name="copy", batch_size=7)
+        self.assertEqual((result["collection"], result["count"], result["reembedded"]), ("copy", 25, False))
+        copy = client.collections["copy"]
+        self.assertEqual(copy.metadata, {"topic": "snapshots"})
+        self.assertEqual(copy.adds, 4)
+        for original, imported in zip(source.rows, copy.rows):
+            self.assertEqual({key: original[key] for key in ("id", "document", "metadata")},
+                             {key: imported[key] for key in ("id", "document", "metadata")})
+            np.testing.assert_array_equal(original["embedding"], imported["embedding"])
+    
+    def test_export_without_embeddings_is_reembedded(self):
+        export_collection(sample_collection(), self.path, include_embeddings=False)
+        self.assertNotIn(EMBEDDINGS_FILE, os.listdir(self.path))
+        client = FakeClient()
+        self.assertTrue(import_collection(client, self.path)["reembedded"])
+        self.assertTrue(all(row["embedding"] is None for row in client.collections["docs"].rows))
+    
+    def test_export_never_overwrites(self):
+        os.mkdir(self.path)
+        with self.assertRaises(FileExistsError):
+            export_collection(sample_collection(), self.path)
+    
+    def test_failed_export_leaves_nothing(self):
+        source = sample_collection()
+        get = source.get
+        
+        def failing_get(limit, offset, include):
+            if offset:
+                raise RuntimeError("collection dropped")
+            return get(limit, offset, include)
+        
+        source.get = failing_get
+        with self.assertRaises(RuntimeError):
+            export_collection(source, self.path, page_size=10)
+        self.assertEqual(os.listdir(self.directory), [])
+    
+    def test_failed_import_drops_the_collection(self):
+        export_collection(sample_collection(), self.path)
+        client = FakeClient(fail_on_add=2)
+        with self.assertRaises(RuntimeError):
+            import_collection(client, self.path, batch_size=10)
+        self.assertEqual(client.collections, {})
+    
+    def test_corrupt_records_drop_the_collection(self):
+        export_collection(sample_collection(), self.path)
+        with open(os.path.join(self.path, RECORDS_FILE), "ab") as records:
+            records.write(b"{not json\n")
+        with open(os.path.join(self.path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        manifest["count"] += 1
+        with open(os.path.join(self.path, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+        client = FakeClient()
+        with self.assertRaises(Exception):
+            import_collection(client, self.path, batch_size=10)
+        self.assertEqual(client.collections, {})
+    
+    def test_read_manifest_rejects_other_directories(self):
+        os.mkdir(self.path)
+        with open(os.path.join(self.path, MANIFEST_FILE), "w") as f:
+            json.dump({"format": "something-else"}, f)
+        with self.assertRaises(ValueError):
+            read_manifest(self.path)
+
+class OpenEmbeddingFileTest(unittest.TestCase):
+    """Embedding files are memory-mapped as 2-D float32 matrices"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.vectors = np.arange(24, dtype=np.float32).reshape(6, 4)
+    
+    def path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def test_npy(self):
+        np.save(self.path("vectors.npy"), self.vectors)
+        vectors = open_embedding_file(self.path("vectors.npy"), 4)
+        self.assertIsInstance(vectors, np.memmap)
+        np.testing.assert_array_equal(vectors, self.vectors)
+    
+    def test_raw(self):
+        self.vectors.astype("<f4").tofile(self.path("vectors.f32"))
+        np.testing.assert_array_equal(open_embedding_file(self.path("vectors.f32"), 4), self.vectors)
+        np.testing.assert_array_equal(open_embedding_file(self.path("vectors.f32"), 8), self.vectors.reshape(3, 8))
+    
+    def test_raw_needs_a_dimension_that_divides_the_file(self):
+        self.vectors.astype("<f4").tofile(self.path("vectors.f32"))
+        with self.assertRaises(ValueError):
+            open_embedding_file(self.path("vectors.f32"))
+        with self.assertRaises(ValueError):
+            open_embedding_file(self.path("vectors.f32"), 5)
+    
+    def test_npy_shape_is_checked(self):
+        np.save(self.path("flat.npy"), self.vectors.ravel())
+        with self.assertRaises(ValueError):
+            open_embedding_file(self.path("flat.npy"))
+        np.save(self.path("vectors.npy"), self.vectors)
+        with self.assertRaises(ValueError):
+            open_embedding_file(self.path("vectors.npy"), 3)
+
+if __name__ == "__main__":
+    unittest.main()
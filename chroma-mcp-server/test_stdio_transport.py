@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the stdio transport
+"""
+
+import os
+import threading
+import unittest
+
+from stdio_transport import StdioTransport
+
+class RecordingStdout:
+    """A binary stdout that records what each flush wrote"""
+    
+    def __init__(self):
+        self.writes = []
+    
+    def write(self, data: bytes):
+        self.writes.append(data)
+    
+    def flush(self):
+        pass
+
+class StdioTransportTest(unittest.TestCase):
+    """Requests are read a line at a time; responses are written a batch at a time"""
+    
+    def setUp(self):
+        self.read_fd, self.write_fd = os.pipe()
+        self.addCleanup(os.close, self.read_fd)
+        self.stdout = RecordingStdout()
+        self.transport = StdioTransport(stdin=os.fdopen(self.read_fd, "rb", closefd=False), stdout=self.stdout,
+                                        max_batch=3, read_size=4)
+    
+    def close_stdin(self):
+        os.close(self.write_fd)
+    
+    def test_readline(self):
+        os.write(self.write_fd, b'{"a": 1}\n{"b": 2}\n{"c"')
+        self.close_stdin()
+        self.assertEqual(self.transport.readline(), b'{"a": 1}\n')
+        # The rest of the last read is buffered
+        self.assertTrue(self.transport.input_pending())
+        self.assertEqual(self.transport.readline(), b'{"b": 2}\n')
+        self.assertEqual(self.transport.readline(), b'{"c"')
+        self.assertEqual(self.transport.readline(), b"")
+        self.assertTrue(self.transport.input_pending())
+    
+    def test_input_pending(self):
+        self.addCleanup(os.close, self.write_fd)
+        self.assertFalse(self.transport.input_pending())
+        os.write(self.write_fd, b"{}\n")
+        self.assertTrue(self.transport.input_pending())
+    
+    def test_input_pending_while_a_read_blocks(self):
+        lines = []
+        reader = threading.Thread(target=lambda: lines.extend(iter(self.transport.readline, b"")))
+        reader.start()
+        # The reader thread is blocked in os.read; polling must neither wait for it nor see a half-filled buffer
+        for n in range(50):
+            self.transport.input_pending()
+            os.write(self.write_fd, b'{"n": %d}\n' % n)
+        self.close_stdin()
+        reader.join(5)
+        self.assertEqual(lines, [b'{"n": %d}\n' % n for n in range(50)])
+    
+    def test_responses_are_flushed_in_batches(self):
+        self.addCleanup(os.close, self.write_fd)
+        for n in range(4):
+            self.transport.send_encoded(b'{"n": %d}' % n)
+        self.assertEqual(self.stdout.writes, [b'{"n": 0}\n{"n": 1}\n{"n": 2}\n'])
+        self.transport.flush()
+        self.transport.flush()
+        self.assertEqual(self.stdout.writes[1:], [b'{"n": 3}\n'])
+
+if __name__ == "__main__":
+    unittest.main()
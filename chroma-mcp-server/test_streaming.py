@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Unit tests for streamed responses: backpressure, final messages and interleaving with other responses
+"""
+
+import asyncio
+import json
+import os
+import threading
+import unittest
+
+from mcp_chroma_server import ChromaConfig, MCPChromaServer
+from stdio_transport import StdioTransport
+from streaming import MAX_PENDING_MESSAGES, ResponseStream, batched, is_streamed, partial_message
+
+class RecordingStdout:
+    """A binary stdout that records what each flush wrote"""
+    
+    def __init__(self):
+        self.writes = []
+    
+    def write(self, data: bytes):
+        self.writes.append(data)
+    
+    def flush(self):
+        pass
+    
+    def lines(self):
+        return [json.loads(line) for line in b"".join(self.writes).splitlines()]
+
+class Producer:
+    """Sends numbered partial messages from its own thread, counting those that got through"""
+    
+    def __init__(self, stream: ResponseStream, count: int, fail_after: int = None):
+        self.stream = stream
+        self.count = count
+        self.fail_after = fail_after
+        self.sent = 0
+    
+    def __call__(self):
+        for n in range(self.count):
+            if n == self.fail_after:
+                raise RuntimeError("collection went away")
+            self.stream.send(partial_message(n=n))
+            self.sent += 1
+        return {"success": True, "count": self.count}
+
+class ResponseStreamTest(unittest.IsolatedAsyncioTestCase):
+    """A producer never gets more than max_pending messages ahead of the writer"""
+    
+    async def settle(self, producer: Producer, expected: int):
+        for _ in range(100):
+            if producer.sent >= expected:
+                break
+            await asyncio.sleep(0.01)
+        # Give a producer that should be blocked the chance to overrun
+        await asyncio.sleep(0.05)
+    
+    def start(self, stream: ResponseStream, producer: Producer) -> asyncio.Future:
+        future = asyncio.get_running_loop().run_in_executor(None, producer)
+        stream.follow(future)
+        return future
+    
+    async def test_slow_consumer_blocks_the_producer(self):
+        stream = ResponseStream(asyncio.get_running_loop())
+        producer = Producer(stream, 10)
+        self.start(stream, producer)
+        await self.settle(producer, MAX_PENDING_MESSAGES)
+        self.assertEqual(producer.sent, MAX_PENDING_MESSAGES)
+        messages = stream.messages()
+        self.assertEqual((await messages.__anext__())["n"], 0)
+        # Taking a message off the queue does not free its slot until the writer is done with it
+        await asyncio.sleep(0.05)
+        self.assertEqual(producer.sent, MAX_PENDING_MESSAGES)
+        self.assertEqual((await messages.__anext__())["n"], 1)
+        await self.settle(producer, MAX_PENDING_MESSAGES + 1)
+        self.assertEqual(producer.sent, MAX_PENDING_MESSAGES + 1)
+        rest = [message async for message in messages]
+        self.assertEqual([message.get("n") for message in rest], list(range(2, 10)) + [None])
+        self.assertEqual(rest[-1], {"success": True, "count": 10})
+    
+    async def test_producer_error_ends_the_stream(self):
+        stream = ResponseStream(asyncio.get_running_loop())
+        self.start(stream, Producer(stream, 10, fail_after=3))
+        messages = [message async for message in stream.messages()]
+        self.assertEqual([message.get("n") for message in messages[:-1]], [0, 1, 2])
+        self.assertEqual(messages[-1], {"error": "collection went away"})
+    
+    async def test_cancelled_request_ends_the_stream(self):
+        stream = ResponseStream(asyncio.get_running_loop())
+        future = asyncio.get_running_loop().create_future()
+        stream.follow(future)
+        future.cancel()
+        self.assertEqual([message async for message in stream.messages()], [{"error": "Request cancelled"}])
+    
+    async def test_close_releases_a_blocked_producer(self):
+        stream = ResponseStream(asyncio.get_running_loop(), max_pending=1)
+        producer = Producer(stream, 5)
+        future = self.start(stream, producer)
+        await self.settle(producer, 1)
+        self.assertEqual(producer.sent, 1)
+        stream.close()
+        # Further messages are dropped instead of blocking the request thread forever
+        self.assertEqual(await asyncio.wait_for(future, 5), {"success": True, "count": 5})
+
+class HelpersTest(unittest.TestCase):
+    """Which requests stream, and how results are sliced"""
+    
+    def test_is_streamed(self):
+        self.assertTrue(is_streamed({"method": "get_documents", "params": {"stream": True}}))
+        self.assertFalse(is_streamed({"method": "get_documents", "params": {}}))
+        self.assertFalse(is_streamed({"method": "add_documents", "params": {"stream": True}}))
+        self.assertFalse(is_streamed(["not", "a", "request"]))
+    
+    def test_batched(self):
+        self.assertEqual(list(batched([1, 2, 3, 4, 5], 2)), [[1, 2], [3, 4], [5]])
+        self.assertEqual(list(batched([], 2)), [[]])
+
+class WriteResponsesTest(unittest.IsolatedAsyncioTestCase):
+    """A streamed response is written in its request's place, while it is still being produced"""
+    
+    async def test_stream_between_neighbours(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        stdout = RecordingStdout()
+        transport = StdioTransport(stdin=os.fdopen(read_fd, "rb", closefd=False), stdout=stdout)
+        server = MCPChromaServer(ChromaConfig())
+        loop = asyncio.get_running_loop()
+        
+        stream = ResponseStream(loop, max_pending=2)
+        release = threading.Event()
+        
+        def produce():
+            for n in range(6):
+                if n == 3:
+                    # Hold the producer until the writer has shown the first messages
+                    release.wait(5)
+                stream.send(partial_message(n=n))
+            return {"success": True, "count": 6}
+        
+        first, streamed, last = loop.create_future(), loop.create_future(), loop.create_future()
+        responses: asyncio.Queue = asyncio.Queue()
+        for future in (first, streamed, last, None):
+            responses.put_nowait(future)
+        writer = asyncio.create_task(server._write_responses(responses, transport))
+        
+        # The response after the stream is ready first, but must wait its turn
+        last.set_result({"id": 3})
+        first.set_result({"id": 1})
+        streamed.set_result(stream)
+        stream.follow(loop.run_in_executor(None, produce))
+        for _ in range(100):
+            if len(stdout.lines()) >= 4:
+                break
+            await asyncio.sleep(0.01)
+        # The first messages reached stdout while the producer was still running
+        self.assertEqual(stdout.lines(), [{"id": 1}] + [partial_message(n=n) for n in range(3)])
+        release.set()
+        await asyncio.wait_for(writer, 5)
+        lines = stdout.lines()
+        self.assertEqual(lines[0], {"id": 1})
+        self.assertEqual([line.get("n") for line in lines[1:7]], list(range(6)))
+        self.assertEqual(lines[7:], [{"success": True, "count": 6}, {"id": 3}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit tests for tenant quotas and rate limits
+"""
+
+import tempfile
+import time
+import unittest
+
+from tenancy import RateLimiter, Tenant, TenantLimitError, TenantLimits, TenantRegistry
+
+class TenantSlotTest(unittest.TestCase):
+    """Requests over a tenant's limits are rejected immediately instead of waiting"""
+    
+    def test_concurrency_quota_rejects_without_waiting(self):
+        tenant = Tenant("acme", None, None, TenantLimits(max_concurrent=2))
+        with tenant.slot(), tenant.slot():
+            self.assertEqual(tenant.in_flight, 2)
+            with self.assertRaises(TenantLimitError) as raised:
+                with tenant.slot():
+                    pass
+            self.assertGreater(raised.exception.retry_after, 0)
+        self.assertEqual(tenant.in_flight, 0)
+        # Slots are released, so the tenant is admitted again
+        with tenant.slot():
+            pass
+    
+    def test_rate_limit(self):
+        tenant = Tenant("acme", None, None, TenantLimits(rate_per_second=1.0, burst=2))
+        for _ in range(2):
+            with tenant.slot():
+                pass
+        with self.assertRaises(TenantLimitError) as raised:
+            with tenant.slot():
+                pass
+        self.assertGreater(raised.exception.retry_after, 0)
+    
+    def test_rate_limiter_refills(self):
+        limiter = RateLimiter(rate_per_second=1000.0, burst=1)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertGreater(limiter.try_acquire(), 0.0)
+        limiter._updated -= 0.01
+        self.assertEqual(limiter.try_acquire(), 0.0)
+
+class TenantRegistryTest(unittest.TestCase):
+    """Tenants are opened on first use and release their client once idle"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.closed = []
+        self.registry = TenantRegistry(
+            self.directory.name,
+            lambda tenant_id, path, limits: {"client": path, "write_queue": None, "lexical_index": f"lexical:{tenant_id}"},
+            self.closed.append,
+            TenantLimits(),
+            idle_seconds=0.01
+        )
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_open_on_first_use(self):
+        tenant = self.registry.get("acme")
+        self.assertIs(self.registry.get("acme"), tenant)
+        self.assertEqual(tenant.client, self.registry.path_for("acme"))
+        self.assertEqual(tenant.lexical_index, "lexical:acme")
+        with self.assertRaises(ValueError):
+            self.registry.get("../escape")
+    
+    def test_idle_tenant_releases_its_client(self):
+        busy = self.registry.get("busy")
+        idle = self.registry.get("idle")
+        with busy.slot():
+            time.sleep(0.02)
+            self.registry.evict_idle()
+        self.assertEqual(self.closed, [idle.client])
+        self.assertEqual(list(self.registry.active()), ["busy"])
+
+if __name__ == "__main__":
+    unittest.main()
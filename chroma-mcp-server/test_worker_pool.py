@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the multi-process worker pool
+"""
+
+import json
+import os
+import threading
+import time
+import unittest
+
+from worker_pool import WorkerError, WorkerPool, serve_worker
+
+def handle_line(line: bytes, send_partial) -> bytes:
+    """Answer a test request with the worker's PID; "sleep", "crash" and "parts" change how"""
+    request = json.loads(line)
+    if request.get("crash"):
+        os._exit(1)
+    time.sleep(request.get("sleep", 0))
+    for part in range(request.get("parts", 0)):
+        send_partial(json.dumps({"part": part}).encode())
+    return json.dumps({"id": request["id"], "pid": os.getpid()}).encode()
+
+def run_test_worker(conn):
+    serve_worker(conn, handle_line)
+
+def request(request_id, **kwargs) -> bytes:
+    return json.dumps(dict(kwargs, id=request_id)).encode()
+
+class WorkerPoolTest(unittest.TestCase):
+    """Routing, barriers, recycling and crash recovery with real worker processes"""
+    
+    def pool(self, **kwargs) -> WorkerPool:
+        pool = WorkerPool(run_test_worker, workers=kwargs.pop("workers", 2), start_timeout=30, stop_timeout=10, **kwargs)
+        pool.start()
+        self.addCleanup(pool.close)
+        return pool
+    
+    def answer(self, future):
+        return json.loads(future.result(30))
+    
+    def route_keys(self, pool):
+        """One routing key per slot"""
+        keys = {}
+        for n in range(100):
+            keys.setdefault(pool.slot_for(f"collection-{n}"), f"collection-{n}")
+        return [keys[slot] for slot in range(pool.size)]
+    
+    def test_requests_are_routed_by_key(self):
+        pool = self.pool()
+        first, second = self.route_keys(pool)
+        pids = {}
+        for n in range(6):
+            key = (first, second)[n % 2]
+            pids.setdefault(key, set()).add(self.answer(pool.submit(request(n), key))["pid"])
+        self.assertEqual(len(pids[first]), 1)
+        self.assertEqual(len(pids[second]), 1)
+        self.assertNotEqual(pids[first], pids[second])
+    
+    def test_barrier_waits_for_earlier_requests_on_every_slot(self):
+        pool = self.pool()
+        first, second = self.route_keys(pool)
+        order = []
+        lock = threading.Lock()
+        
+        def record(name):
+            def done(_):
+                with lock:
+                    order.append(name)
+            return done
+        
+        # A slow request on slot 1 is queued before the barrier, and a fast one after it
+        futures = {
+            "slow": pool.submit(request("slow", sleep=0.5), second),
+            "barrier": pool.submit(request("barrier")),
+            "later": pool.submit(request("later"), second),
+            "later-0": pool.submit(request("later-0"), first)
+        }
+        for name, future in futures.items():
+            future.add_done_callback(record(name))
+        answers = {name: self.answer(future) for name, future in futures.items()}
+        self.assertEqual(order[:2], ["slow", "barrier"])
+        self.assertEqual(set(order[2:]), {"later", "later-0"})
+        # The barrier always runs on the first worker
+        self.assertEqual(answers["barrier"]["pid"], answers["later-0"]["pid"])
+    
+    def test_workers_are_recycled_after_max_requests(self):
+        pool = self.pool(workers=1, max_requests=2)
+        pids = [self.answer(pool.submit(request(n), "docs"))["pid"] for n in range(5)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertEqual(len(set(pids)), 3)
+    
+    def test_crashed_worker_is_replaced(self):
+        pool = self.pool(workers=1)
+        before = self.answer(pool.submit(request(0), "docs"))["pid"]
+        with self.assertRaises(WorkerError):
+            pool.submit(request(1, crash=True), "docs").result(30)
+        after = self.answer(pool.submit(request(2), "docs"))["pid"]
+        self.assertNotEqual(before, after)
+    
+    def test_partial_messages(self):
+        pool = self.pool(workers=1)
+        parts = []
+        final = self.answer(pool.submit(request(0, parts=3), "docs", on_partial=parts.append))
+        self.assertEqual([json.loads(part)["part"] for part in parts], [0, 1, 2])
+        self.assertEqual(final["id"], 0)
+    
+    def test_cancelled_request_is_skipped(self):
+        pool = self.pool(workers=1)
+        busy = pool.submit(request(0, sleep=0.3), "docs")
+        # Requests are pipelined to the worker; the barrier holds the next one back until busy is answered
+        pool.submit(request("barrier"))
+        cancelled = pool.submit(request(1), "docs")
+        self.assertTrue(cancelled.cancel())
+        self.assertEqual(self.answer(pool.submit(request(2), "docs"))["id"], 2)
+        self.assertEqual(self.answer(busy)["id"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
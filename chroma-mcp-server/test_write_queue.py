@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the write-behind queue and its journal
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from write_queue import WriteCoalescer, WriteJournal, recover_journals
+
+class FakeCollection:
+    """Records every add; rejects IDs it already holds, like Chroma"""
+    
+    def __init__(self):
+        self.adds = []
+        self.ids = set()
+        self.lock = threading.Lock()
+    
+    def add(self, ids, documents, metadatas=None):
+        with self.lock:
+            if self.ids.intersection(ids) or len(set(ids)) < len(ids):
+                raise ValueError("duplicate ids")
+            self.ids.update(ids)
+            self.adds.append(list(ids))
+
+class WriteCoalescerTest(unittest.TestCase):
+    """Concurrent adds to a collection share one collection.add"""
+    
+    def setUp(self):
+        self.collection = FakeCollection()
+    
+    def queue(self, **kwargs):
+        queue = WriteCoalescer(lambda name: self.collection, **kwargs)
+        self.addCleanup(queue.close, 5)
+        return queue
+    
+    def test_adds_within_a_window_are_coalesced(self):
+        queue = self.queue(window_ms=200)
+        futures = [queue.submit("docs", [f"doc {n}"], ids=[f"id{n}"]) for n in range(5)]
+        self.assertEqual([future.result(5) for future in futures], [1] * 5)
+        self.assertEqual(self.collection.adds, [[f"id{n}" for n in range(5)]])
+    
+    def test_full_batch_commits_before_the_window(self):
+        queue = self.queue(window_ms=60000, max_batch_docs=4)
+        futures = [queue.submit("docs", ["a", "b"], ids=[f"{n}a", f"{n}b"]) for n in range(2)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(len(self.collection.adds), 1)
+    
+    def test_waiting_callers_commit_at_once(self):
+        queue = self.queue(window_ms=60000, max_waiters=2)
+        first = queue.submit("docs", ["a"], ids=["a"], wait=True)
+        time.sleep(0.05)
+        self.assertFalse(first.done())
+        # The second waiter is the last caller that could join the batch
+        second = queue.submit("docs", ["b"], ids=["b"], wait=True)
+        self.assertEqual((first.result(5), second.result(5)), (1, 1))
+        self.assertEqual(self.collection.adds, [["a", "b"]])
+        # A single waiter is enough once the earlier callers have been released
+        queue._max_waiters = 1
+        self.assertEqual(queue.submit("docs", ["c"], ids=["c"], wait=True).result(5), 1)
+    
+    def test_bad_request_does_not_fail_its_neighbours(self):
+        self.collection.ids.add("taken")
+        queue = self.queue(window_ms=100)
+        good = queue.submit("docs", ["a"], ids=["a"])
+        bad = queue.submit("docs", ["b"], ids=["taken"])
+        self.assertEqual(good.result(5), 1)
+        with self.assertRaises(ValueError):
+            bad.result(5)
+    
+    def test_flush_and_pending_count(self):
+        queue = self.queue(window_ms=60000)
+        queue.submit("docs", ["a", "b"], ids=["a", "b"])
+        self.assertEqual(queue.pending_count("docs"), 2)
+        queue.flush("docs")
+        self.assertEqual(queue.pending_count(), 0)
+        self.assertEqual(self.collection.adds, [["a", "b"]])
+    
+    def test_close_commits_queued_adds(self):
+        queue = WriteCoalescer(lambda name: self.collection, window_ms=60000)
+        future = queue.submit("docs", ["a"], ids=["a"])
+        queue.close(5)
+        self.assertEqual(future.result(0), 1)
+        with self.assertRaises(RuntimeError):
+            queue.submit("docs", ["b"], ids=["b"])
+
+class WriteJournalTest(unittest.TestCase):
+    """Acknowledged but uncommitted adds are replayed after a crash, and only those"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.replayed = []
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def replay(self, collection_name, documents, metadatas, ids):
+        self.replayed.append((collection_name, documents, ids))
+    
+    def journals(self):
+        return [name for name in os.listdir(self.directory.name) if name.endswith(".jsonl")]
+    
+    def test_replays_uncommitted_adds(self):
+        journal = WriteJournal(self.directory.name)
+        committed = journal.append("docs", ["a"], None, ["a"])
+        journal.append("docs", ["b"], None, ["b"])
+        journal.mark_committed([committed])
+        # A crash: the journal is closed without being cleaned up
+        journal._file.close()
+        self.assertEqual(recover_journals(self.directory.name, self.replay), 1)
+        self.assertEqual(self.replayed, [("docs", ["b"], ["b"])])
+        self.assertEqual(self.journals(), [])
+    
+    def test_skips_torn_last_line(self):
+        journal = WriteJournal(self.directory.name)
+        journal.append("docs", ["a"], None, ["a"])
+        journal._file.write(b'{"seq": 1, "collection": "do')
+        journal._file.close()
+        self.assertEqual(recover_journals(self.directory.name, self.replay), 1)
+        self.assertEqual(self.replayed, [("docs", ["a"], ["a"])])
+    
+    def test_running_process_is_not_replayed(self):
+        journal = WriteJournal(self.directory.name)
+        journal.append("docs", ["a"], None, ["a"])
+        # The journal stays locked while its process runs
+        self.assertEqual(recover_journals(self.directory.name, self.replay), 0)
+        self.assertEqual(self.journals(), [os.path.basename(journal.path)])
+        journal.close()
+        self.assertEqual(recover_journals(self.directory.name, self.replay), 1)
+    
+    def test_clean_close_removes_the_journal(self):
+        journal = WriteJournal(self.directory.name)
+        seq = journal.append("docs", ["a"], None, ["a"])
+        journal.mark_committed([seq])
+        journal.clear()
+        self.assertEqual(os.path.getsize(journal.path), 0)
+        journal.close()
+        self.assertEqual(self.journals(), [])
+    
+    def test_queue_journals_only_acknowledged_adds(self):
+        collection = FakeCollection()
+        queue = WriteCoalescer(lambda name: collection, window_ms=60000, journal=WriteJournal(self.directory.name))
+        self.addCleanup(queue.close, 5)
+        queue.submit("docs", ["a"], ids=["a"], journaled=True)
+        queue.submit("docs", ["b"], ids=["b"])
+        queue._journal._file.close()
+        # Simulate a crash before the window expired: only the journaled add comes back
+        recover_journals(self.directory.name, self.replay)
+        self.assertEqual(self.replayed, [("docs", ["a"], ["a"])])
+
+if __name__ == "__main__":
+    unittest.main()
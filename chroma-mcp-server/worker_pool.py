@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Multi-process worker mode for the MCP Chroma Server.
+The front-end process keeps the stdio transport and forwards each request line to
+one of several worker processes, each with its own Chroma client and embedding
+model. Requests are routed by a key (tenant and collection) so a collection is
+always served by the same worker, which keeps its segments hot and its writes ordered.
+Requests without a key (list_collections, maintain) are barriers: they run on the
+first worker once every worker has answered the requests sent before them.
+Workers share one persist directory, which Chroma does not support across
+processes; the routing is what keeps every collection to a single process.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sharding import shard_for
+
+logger = logging.getLogger(__name__)
+
+# Sequence number a worker sends once it is initialized and ready for requests
+_READY = -1
+# Slot queue markers
+_RESTART = object()
+_STOP = object()
+
+class WorkerError(Exception):
+    """Raised for requests whose worker died or could not be started"""
+
+def serve_worker(conn, handle_line: Callable[[bytes, Callable[[bytes], None]], bytes]):
+    """Worker side of the pool: answer (seq, line) messages until told to stop"""
+    conn.send((_READY, None, True))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            # The front-end went away
+            return
+        if message is None:
+            # Drain marker: every request sent before it has been answered
+            return
+        seq, line = message
+        # Streamed responses send their partial messages ahead of the final one
+        final = handle_line(line, lambda partial: conn.send((seq, partial, False)))
+        conn.send((seq, final, True))
+
+class _Worker:
+    """A worker process, its pipe and the requests it has in flight"""
+    
+    def __init__(self, slot: int, process: Any, conn: Any):
+        self.slot = slot
+        self.process = process
+        self.conn = conn
+        self.alive = True
+        self.handled = 0
+        self.pending: Dict[int, Tuple[Future, Optional[Callable[[bytes], None]]]] = {}
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        # Notified when pending empties or the worker exits
+        self.idle = threading.Condition(self.lock)
+
+class _Barrier:
+    """A request that runs on one slot while every other slot holds back its later requests"""
+    
+    def __init__(self, parties: int, request: Tuple[Future, bytes, Optional[Callable[[bytes], None]]]):
+        self.parties = parties
+        self.request = request
+        self.released = threading.Event()
+        self._arrived = 0
+        self._cond = threading.Condition()
+    
+    def arrive(self):
+        with self._cond:
+            self._arrived += 1
+            self._cond.notify_all()
+    
+    def wait_for_all(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._arrived >= self.parties)
+
+class WorkerPool:
+    """Routes request lines to worker processes by key and replaces workers that exit"""
+    
+    def __init__(self, target: Callable, args: Tuple = (), workers: int = 2,
+                 max_requests: int = 0, start_timeout: float = 300.0, stop_timeout: float = 60.0):
+        self._target = target
+        self._args = args
+        self.size = workers
+        self.max_requests = max_requests
+        self.start_timeout = start_timeout
+        self.stop_timeout = stop_timeout
+        self._context = get_context("spawn")
+        self._seq = itertools.count()
+        self._queues: List[queue.Queue] = [queue.Queue() for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+    
+    def start(self):
+        """Start one dispatcher thread per slot; each spawns and warms its worker"""
+        for slot in range(self.size):
+            thread = threading.Thread(target=self._run_slot, args=(slot,), name=f"chroma-worker-{slot}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def slot_for(self, route_key: str) -> int:
+        """Worker slot for a routing key"""
+        return shard_for(route_key, self.size)
+    
+    def submit(self, line: bytes, route_key: Optional[str] = None,
+               on_partial: Optional[Callable[[bytes], None]] = None) -> Future:
+        """Queue a request line; the future resolves to the worker's encoded response, partial messages go to on_partial.
+        A request without a routing key runs on slot 0 after every request queued before it, on any slot."""
+        future: Future = Future()
+        if route_key is None:
+            barrier = _Barrier(self.size, (future, line, on_partial))
+            for slot_queue in self._queues:
+                slot_queue.put(barrier)
+        else:
+            self._queues[self.slot_for(route_key)].put((future, line, on_partial))
+        return future
+    
+    def restart(self):
+        """Replace every worker, one at a time, without dropping requests"""
+        for slot_queue in self._queues:
+            slot_queue.put(_RESTART)
+    
+    def close(self):
+        """Let every worker finish its queued requests, then stop it"""
+        for slot_queue in self._queues:
+            slot_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+    
+    def _run_slot(self, slot: int):
+        slot_queue = self._queues[slot]
+        try:
+            worker = self._spawn(slot)
+        except WorkerError as e:
+            # Retried when the slot's first request arrives
+            logger.error(str(e))
+            worker = None
+        while True:
+            item = slot_queue.get()
+            if item is _STOP:
+                if worker is not None:
+                    self._retire(worker)
+                return
+            if item is _RESTART:
+                if worker is not None and worker.alive:
+                    worker = self._replace(worker)
+                continue
+            if isinstance(item, _Barrier):
+                worker = self._pass_barrier(slot, worker, item)
+                continue
+            worker = self._dispatch(slot, worker, item)
+    
+    def _dispatch(self, slot: int, worker: Optional[_Worker],
+                  item: Tuple[Future, bytes, Optional[Callable[[bytes], None]]]) -> Optional[_Worker]:
+        """Send one request to the slot's worker, (re)starting it if needed; returns the slot's worker"""
+        future, line, on_partial = item
+        # A running future can no longer be cancelled, so resolving it below cannot fail
+        if not future.set_running_or_notify_cancel():
+            return worker
+        if worker is None or not worker.alive:
+            if worker is not None:
+                # Reap the worker that died
+                self._retire(worker)
+                worker = None
+            try:
+                worker = self._spawn(slot)
+            except WorkerError as e:
+                logger.error(str(e))
+                future.set_exception(e)
+                # Don't spin on a worker that cannot start
+                time.sleep(1.0)
+                return None
+        
+        seq = next(self._seq)
+        with worker.lock:
+            registered = worker.alive
+            if registered:
+                worker.pending[seq] = (future, on_partial)
+        if not registered:
+            future.set_exception(WorkerError(f"Worker {slot} exited before the request was sent"))
+            return worker
+        try:
+            worker.conn.send((seq, line))
+        except (OSError, ValueError) as e:
+            with worker.lock:
+                unsent = worker.pending.pop(seq, None)
+            # The receiver may already have failed it
+            if unsent is not None:
+                unsent[0].set_exception(WorkerError(f"Worker {slot} is unavailable: {e}"))
+            return worker
+        
+        worker.handled += 1
+        if self.max_requests and worker.handled >= self.max_requests:
+            logger.info(f"Worker {slot} handled {worker.handled} requests, recycling it")
+            worker = self._replace(worker)
+        return worker
+    
+    def _pass_barrier(self, slot: int, worker: Optional[_Worker], barrier: _Barrier) -> Optional[_Worker]:
+        """Wait until the slot's earlier requests are answered; slot 0 then runs the barrier's request, the others wait for it"""
+        if worker is not None:
+            with worker.lock:
+                worker.idle.wait_for(lambda: not worker.pending or not worker.alive)
+        barrier.arrive()
+        if slot != 0:
+            barrier.released.wait()
+            return worker
+        try:
+            barrier.wait_for_all()
+            worker = self._dispatch(slot, worker, barrier.request)
+            wait([barrier.request[0]])
+        finally:
+            barrier.released.set()
+        return worker
+    
+    def _spawn(self, slot: int) -> _Worker:
+        """Start a worker process and wait until it has initialized"""
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=self._target,
+            args=(child_conn,) + tuple(self._args),
+            name=f"chroma-worker-{slot}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(slot, process, parent_conn)
+        threading.Thread(target=self._receive, args=(worker,), name=f"chroma-worker-{slot}-recv", daemon=True).start()
+        
+        if not worker.ready.wait(self.start_timeout) or not worker.alive:
+            self._kill(worker)
+            raise WorkerError(f"Worker {slot} failed to start")
+        logger.info(f"Worker {slot} ready (pid {process.pid})")
+        return worker
+    
+    def _replace(self, worker: _Worker) -> _Worker:
+        """Warm up a successor while the old worker finishes its in-flight requests, then hand over"""
+        try:
+            successor = self._spawn(worker.slot)
+        except WorkerError as e:
+            logger.error(f"{e}; keeping the current worker")
+            return worker
+        # Nothing is sent to the successor until the old worker has drained, so per-collection order holds
+        self._retire(worker)
+        return successor
+    
+    def _retire(self, worker: _Worker):
+        """Ask a worker to exit once its in-flight requests are answered"""
+        with worker.lock:
+            alive = worker.alive
+        if alive:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        worker.process.join(self.stop_timeout)
+        if worker.process.is_alive():
+            logger.warning(f"Worker {worker.slot} did not stop within {self.stop_timeout}s, terminating it")
+            self._kill(worker)
+        else:
+            worker.conn.close()
+    
+    def _kill(self, worker: _Worker):
+        worker.process.terminate()
+        worker.process.join(5.0)
+        worker.conn.close()
+    
+    def _receive(self, worker: _Worker):
+        """Resolve a worker's responses; fail whatever is still in flight when it exits"""
+        while True:
+            try:
+                seq, payload, final = worker.conn.recv()
+            except (EOFError, OSError):
+                break
+            if seq == _READY:
+                worker.ready.set()
+                continue
+            with worker.lock:
+                entry = worker.pending.pop(seq, None) if final else worker.pending.get(seq)
+                if not worker.pending:
+                    worker.idle.notify_all()
+            if entry is None:
+                continue
+            future, on_partial = entry
+            if final:
+                future.set_result(payload)
+            elif on_partial is not None:
+                on_partial(payload)
+        
+        with worker.lock:
+            worker.alive = False
+            orphaned = [future for future, _ in worker.pending.values()]
+            worker.pending.clear()
+            worker.idle.notify_all()
+        worker.ready.set()
+        if orphaned:
+            logger.error(f"Worker {worker.slot} exited with {len(orphaned)} requests in flight; it will be restarted")
+        for future in orphaned:
+            future.set_exception(WorkerError(f"Worker {worker.slot} exited while handling the request"))
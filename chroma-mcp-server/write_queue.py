@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue for the MCP Chroma Server.
+Coalesces small add_documents calls per collection into a single batched
+collection.add (one embedding pass, one SQLite transaction, one HNSW update).
+Adds acknowledged before they are committed are journaled, so a crash or a
+shutdown that times out can replay them on the next start.
+A batch is committed before its window expires once every caller that could
+still join it is already blocked waiting for a committed add.
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Acknowledge once the batch containing the documents has been written
+DURABILITY_COMMITTED = "committed"
+# Acknowledge as soon as the documents are queued; they are written within the batch window
+DURABILITY_QUEUED = "queued"
+DURABILITY_MODES = (DURABILITY_COMMITTED, DURABILITY_QUEUED)
+
+# Each process journals to its own file in the persist directory
+JOURNAL_PREFIX = "mcp-write-journal-"
+JOURNAL_SUFFIX = ".jsonl"
+
+class WriteJournal:
+    """Append-only log of queued adds that were acknowledged before they were committed"""
+    
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, f"{JOURNAL_PREFIX}{uuid.uuid4().hex}{JOURNAL_SUFFIX}")
+        self._file = open(self.path, "ab")
+        if fcntl is not None:
+            # Held for the journal's lifetime so recovery never replays a running process's adds
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._seq = itertools.count()
+        self._open_entries = 0
+        self._lock = threading.Lock()
+    
+    def append(self, collection_name: str, documents: List[str],
+               metadatas: Optional[List[Dict[str, Any]]], ids: List[str]) -> int:
+        """Durably record an add before it is acknowledged; returns its sequence number"""
+        with self._lock:
+            seq = next(self._seq)
+            record = {"seq": seq, "collection": collection_name, "documents": documents, "metadatas": metadatas, "ids": ids}
+            self._write(record)
+            os.fsync(self._file.fileno())
+            self._open_entries += 1
+            return seq
+    
+    def mark_committed(self, seqs: List[int]):
+        """Record that adds have been written (or failed for good) and must not be replayed"""
+        if not seqs:
+            return
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write({"committed": seqs})
+            self._open_entries -= len(seqs)
+    
+    def clear(self):
+        """Drop every record once nothing in the journal is waiting to be committed"""
+        with self._lock:
+            if not self._file.closed and self._open_entries == 0 and self._file.tell() > 0:
+                self._file.truncate(0)
+                self._file.seek(0)
+    
+    def close(self):
+        """Close the journal, deleting it unless some add in it was never committed"""
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._open_entries == 0:
+                os.remove(self.path)
+            else:
+                logger.warning(f"{self._open_entries} queued adds were not committed; they will be replayed from {self.path}")
+            self._file.close()
+    
+    def _write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._file.flush()
+
+def recover_journals(directory: str, replay: Callable[[str, List[str], Optional[List[Dict[str, Any]]], List[str]], None]) -> int:
+    """Replay the uncommitted adds of journals left behind by processes that exited; returns the documents replayed"""
+    replayed = 0
+    for path in sorted(Path(directory).glob(f"{JOURNAL_PREFIX}*{JOURNAL_SUFFIX}")):
+        with open(path, "rb") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Its process is still running
+                    continue
+            adds: List[Dict[str, Any]] = []
+            committed: Set[int] = set()
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line: that add was never acknowledged
+                    continue
+                if "committed" in record:
+                    committed.update(record["committed"])
+                else:
+                    adds.append(record)
+            for record in adds:
+                if record["seq"] in committed:
+                    continue
+                try:
+                    replay(record["collection"], record["documents"], record.get("metadatas"), record["ids"])
+                    replayed += len(record["ids"])
+                except Exception as e:
+                    logger.error(f"Could not replay queued add to '{record['collection']}': {e}")
+            os.remove(path)
+    if replayed:
+        logger.warning(f"Replayed {replayed} queued documents that were not committed before the last shutdown")
+    return replayed
+
+class _PendingAdd:
+    """A single caller's add request waiting in the queue"""
+    
+    __slots__ = ("documents", "metadatas", "ids", "future", "seq", "wait")
+    
+    def __init__(self, documents: List[str], metadatas: Optional[List[Dict[str, Any]]], ids: List[str], wait: bool):
+        self.documents = documents
+        self.metadatas = metadatas
+        self.ids = ids
+        self.future: Future = Future()
+        # Whether the caller is blocked on the future until the add is committed
+        self.wait = wait
+        # Journal sequence number, for adds acknowledged before they are committed
+        self.seq: Optional[int] = None
+
+class WriteCoalescer:
+    """Group-commits queued adds once a collection's window expires or its batch is full"""
+    
+    def __init__(self, get_collection: Callable[[str], Any], window_ms: int = 20, max_batch_docs: int = 256,
+                 on_commit: Optional[Callable[[Any, List[str], List[str]], None]] = None,
+                 journal: Optional[WriteJournal] = None, max_waiters: int = 0):
+        self._get_collection = get_collection
+        # Callers that can be submitting at the same time (0 if unknown); once that many are
+        # waiting on committed adds, nobody is left to join a batch, so waiting out the window is pointless
+        self._max_waiters = max_waiters
+        self._waiting = 0
+        self._on_commit = on_commit
+        self._journal = journal
+        self._window = window_ms / 1000.0
+        self._max_batch_docs = max_batch_docs
+        self._cond = threading.Condition()
+        # Held while a batch is taken from the queue and written, so flush() also waits for in-flight commits
+        self._commit_lock = threading.Lock()
+        self._pending: Dict[str, List[_PendingAdd]] = {}
+        self._pending_docs: Dict[str, int] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chroma-write-coalescer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, collection_name: str, documents: List[str],
+               metadatas: Optional[List[Dict[str, Any]]] = None,
+               ids: Optional[List[str]] = None, journaled: bool = False, wait: bool = False) -> Future:
+        """Queue documents for the next group commit; the future resolves to the number of documents written.
+        Journaled adds survive a crash, for callers that acknowledge them before they are committed.
+        Callers that block on the future until the add is committed pass wait=True."""
+        if not ids:
+            # Batches are merged, so every request needs explicit IDs
+            ids = [str(uuid.uuid4()) for _ in documents]
+        pending = _PendingAdd(documents, metadatas, ids, wait)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            if journaled and self._journal is not None:
+                pending.seq = self._journal.append(collection_name, documents, metadatas, ids)
+            batch = self._pending.setdefault(collection_name, [])
+            if not batch:
+                self._deadlines[collection_name] = time.monotonic() + self._window
+            batch.append(pending)
+            self._pending_docs[collection_name] = self._pending_docs.get(collection_name, 0) + len(documents)
+            if wait:
+                self._waiting += 1
+                if self._max_waiters and self._waiting >= self._max_waiters:
+                    self._deadlines = dict.fromkeys(self._deadlines, 0.0)
+            self._cond.notify()
+        return pending.future
+    
+    def pending_count(self, collection_name: Optional[str] = None) -> int:
+        """Number of queued documents, for one collection or overall"""
+        with self._cond:
+            if collection_name is not None:
+                return self._pending_docs.get(collection_name, 0)
+            return sum(self._pending_docs.values())
+    
+    def flush(self, collection_name: Optional[str] = None):
+        """Commit queued adds now (for one collection or all) and wait until they are written"""
+        with self._commit_lock:
+            with self._cond:
+                names = [collection_name] if collection_name is not None else list(self._pending)
+                batches = [(name, self._take(name)) for name in names]
+            for name, batch in batches:
+                if batch:
+                    self._commit(name, batch)
+            self._clear_journal()
+    
+    def close(self, timeout: Optional[float] = None):
+        """Stop accepting writes, commit everything still queued and stop the flusher thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Write queue did not drain within {timeout}s, {self.pending_count()} documents still queued")
+        if self._journal is not None:
+            self._journal.close()
+    
+    def _clear_journal(self):
+        """Truncate the journal whenever the queue is empty (caller holds the commit lock)"""
+        if self._journal is None:
+            return
+        with self._cond:
+            if not self._pending:
+                self._journal.clear()
+    
+    def _take(self, collection_name: str) -> List[_PendingAdd]:
+        """Remove and return a collection's queued requests (caller holds the condition)"""
+        self._pending_docs.pop(collection_name, None)
+        self._deadlines.pop(collection_name, None)
+        return self._pending.pop(collection_name, [])
+    
+    def _ready(self, now: float) -> List[str]:
+        return [
+            name for name in self._pending
+            if self._closed
+            or self._pending_docs[name] >= self._max_batch_docs
+            or self._deadlines[name] <= now
+        ]
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed and not self._pending:
+                        return
+                    if self._ready(time.monotonic()):
+                        break
+                    timeout = None
+                    if self._deadlines:
+                        timeout = max(0.0, min(self._deadlines.values()) - time.monotonic())
+                    self._cond.wait(timeout)
+            with self._commit_lock:
+                with self._cond:
+                    # flush() may have taken some batches while we waited for the commit lock
+                    batches: List[Tuple[str, List[_PendingAdd]]] = [
+                        (name, self._take(name)) for name in self._ready(time.monotonic())
+                    ]
+                for name, batch in batches:
+                    self._commit(name, batch)
+                self._clear_journal()
+    
+    def _commit(self, collection_name: str, batch: List[_PendingAdd]):
+        """Write a batch with one collection.add, isolating failures to the requests that caused them"""
+        documents: List[str] = []
+        metadatas: List[Optional[Dict[str, Any]]] = []
+        ids: List[str] = []
+        for pending in batch:
+            documents.extend(pending.documents)
+            metadatas.extend(pending.metadatas or [None] * len(pending.documents))
+            ids.extend(pending.ids)
+        
+        try:
+            collection = self._get_collection(collection_name)
+            add_kwargs = {"documents": documents, "ids": ids}
+            if any(metadata is not None for metadata in metadatas):
+                add_kwargs["metadatas"] = metadatas
+            collection.add(**add_kwargs)
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad request (duplicate IDs, mismatched metadata) must not fail its neighbours
+                logger.warning(f"Batched add to '{collection_name}' failed, retrying requests individually: {e}")
+                for pending in batch:
+                    self._commit(collection_name, [pending])
+                return
+            logger.error(f"Queued add to '{collection_name}' failed: {e}")
+            self._resolved(batch)
+            batch[0].future.set_exception(e)
+            return
+        
+        logger.debug(f"Committed {len(documents)} documents from {len(batch)} requests to '{collection_name}'")
+        if self._on_commit is not None:
+            try:
+                self._on_commit(collection, ids, documents)
+            except Exception as e:
+                logger.error(f"Post-commit hook for '{collection_name}' failed: {e}")
+        self._resolved(batch)
+        for pending in batch:
+            pending.future.set_result(len(pending.documents))
+    
+    def _resolved(self, batch: List[_PendingAdd]):
+        """Stop counting the batch's callers as waiting and keep its adds from being replayed"""
+        # Before the futures resolve, so a released caller's next add never sees itself still waiting
+        with self._cond:
+            self._waiting -= sum(pending.wait for pending in batch)
+        if self._journal is not None:
+            self._journal.mark_committed([pending.seq for pending in batch if pending.seq is not None])